@@ -4,29 +4,118 @@ File Renamer Web Application - Backend
 Flask server with file upload and rename functionality
 """
 
-from flask import Flask, render_template, request, jsonify, send_file, session
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, session
 from werkzeug.utils import secure_filename
-import pandas as pd
 import os
-import zipfile
 import io
+import json
+import time
 from datetime import datetime
 from collections import Counter
 import secrets
 import shutil
 from pathlib import Path
 
+from batch_rename import EXECUTE_NOTES, execute_results
+from blob_store import BlobStore, blob_key, is_sha256
+from chunked_upload import ChunkedUpload, RunningHashes
+from hashing import save_stream_hashed
+from jobs import JobManager
+from manifest import MANIFEST_FILENAME, Manifest
+from mapping_cache import MappingCache
+from match_index import attach_suggestions
+from metrics import Metrics, RequestProfiler
+from mapping_reader import MAPPING_EXTENSIONS, MAPPING_FILENAME, MappingError, ingest_mapping, load_mapping
+from preview_model import PreviewModel, PreviewModels
+from rename_executor import EXECUTE_MODES, run_moves
+from rename_journal import JOURNAL_BATCH, UNDO_PREFIX, RenameJournal, revert
+from rename_plan import (
+    PLAN_FILENAME, ROOT_FOLDER, build_plan, load_plan, load_saved_plan,
+    load_suggestion_index, mapping_stat, name_key, query_plan
+)
+from responses import COMPRESSIBLE_MIMETYPES, choose_encoding, compact_payload, compress, dumps
+from reports import (
+    REPORT_FORMATS, RESULTS_FILENAME, iter_csv_report, iter_text_report, load_report_rows,
+    save_execute_results, write_xlsx_report
+)
+from session_gc import SessionIndex, SessionSweeper
+from storage import create_storage
+from zipstream import STORED_EXTENSIONS, CompressionPolicy, stream_zip_parallel
+
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')  # Same value on every instance; see local_secret_key
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max upload
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['TEMP_FOLDER'] = 'temp'
+app.config['RENAME_WORKERS'] = 8  # Parallel file moves during execute
+app.config['EXECUTE_MODE'] = 'move'  # move, link or virtual (see rename_executor)
+app.config['JOB_WORKERS'] = 2  # Background execute/download jobs
+app.config['MAPPING_CACHE_FOLDER'] = 'cache/mappings'
+app.config['MAPPING_CACHE_MAX_BYTES'] = 500 * 1024 * 1024  # Parsed mapping cache size
+app.config['ZIP_COMPRESSION_LEVEL'] = 6  # 0 stores every entry uncompressed
+app.config['ZIP_STORED_EXTENSIONS'] = STORED_EXTENSIONS  # Already-compressed types, never deflated
+app.config['ZIP_SAMPLE_BYTES'] = 64 * 1024  # Test-compress this much of other files; 0 to skip
+app.config['ZIP_WORKERS'] = os.cpu_count() or 1  # Entries compressed in parallel
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'local')  # local, shared or s3
+app.config['STORAGE_ROOT'] = os.environ.get('STORAGE_ROOT')  # Shared mount for 'shared'
+app.config['S3_BUCKET'] = os.environ.get('S3_BUCKET')
+app.config['S3_PREFIX'] = os.environ.get('S3_PREFIX', '')
+app.config['S3_ENDPOINT_URL'] = os.environ.get('S3_ENDPOINT_URL')  # e.g. a local MinIO
+app.config['UPLOAD_SKIP_KNOWN'] = True  # Let clients re-add their session's content by hash without resending it
+app.config['SESSION_TTL'] = 24 * 60 * 60  # Seconds an idle session is kept
+app.config['SESSION_QUOTA_BYTES'] = 5 * 1024 * 1024 * 1024  # Per session; None for no limit
+app.config['STORAGE_QUOTA_BYTES'] = None  # All sessions together; LRU idle sessions are evicted above it
+app.config['GC_INTERVAL'] = 5 * 60  # Seconds between sweeper passes
+app.config['GC_BLOBS'] = app.config['STORAGE_BACKEND'] == 'local'  # Only when this instance sees every session
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')  # Opt-in: keep cProfile output of slow requests here
+app.config['PROFILE_SLOW_SECONDS'] = float(os.environ.get('PROFILE_SLOW_SECONDS', 1.0))
+app.config['COMPRESS_RESPONSES'] = True  # gzip (or brotli, if installed) for clients that accept it
+app.config['COMPRESS_MIN_BYTES'] = 1024  # Smaller bodies are sent as they are
+app.config['COMPRESS_LEVEL'] = 6  # gzip level
+
+job_manager = JobManager(max_workers=app.config['JOB_WORKERS'])
+JOB_EVENT_INTERVAL = 0.5  # Seconds between progress events
+PREVIEW_PAGE_SIZE = 200
+VIRTUAL_OUTPUTS_FILENAME = 'virtual_outputs.json'  # Download entries recorded by a virtual execute
+MAX_PREVIEW_PAGE_SIZE = 1000
+QUOTA_ERROR = 'Session storage quota exceeded. Remove files or start over to upload more.'
+SECRET_KEY_FILENAME = 'secret_key'  # In TEMP_FOLDER, when SECRET_KEY is not set
+mapping_cache = MappingCache(app.config['MAPPING_CACHE_FOLDER'], app.config['MAPPING_CACHE_MAX_BYTES'])
+storage = create_storage(app.config)
+preview_models = PreviewModels()  # In-memory plans of recent sessions, updated from deltas
+running_hashes = RunningHashes()  # Hashes of chunked uploads, advanced as their chunks are written
 
 # Ensure folders exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['TEMP_FOLDER'], exist_ok=True)
 
-ALLOWED_EXCEL = {'xlsx', 'xls'}
+def local_secret_key(path):
+    """Session signing key shared by every worker process using this TEMP_FOLDER
+    
+    Created on first use. A key generated per process would make each
+    worker reject the session cookies of the others.
+    """
+    if not os.path.exists(path):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(secrets.token_hex(32))
+        os.chmod(tmp_path, 0o600)
+        try:
+            os.link(tmp_path, path)  # Never replaces a key another worker just created
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path) as f:
+        return f.read().strip()
+
+if not app.config['SECRET_KEY']:
+    app.secret_key = local_secret_key(os.path.join(app.config['TEMP_FOLDER'], SECRET_KEY_FILENAME))
+
+blob_store = BlobStore(storage, lock_path=os.path.join(app.config['TEMP_FOLDER'], 'blobs.lock'))
+session_index = SessionIndex(app.config['TEMP_FOLDER'])  # Sizes and activity for the sweeper
+metrics = Metrics()  # Request and phase timings served on /metrics
+profiler = RequestProfiler(app.config['PROFILE_DIR'], app.config['PROFILE_SLOW_SECONDS']) if app.config['PROFILE_DIR'] else None
 
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
@@ -40,15 +129,180 @@ def get_session_folder():
     os.makedirs(session_folder, exist_ok=True)
     return session_folder
 
+def get_manifest(session_id=None):
+    """Upload manifest of the given session, or of the current one"""
+    if session_id is None:
+        return Manifest.for_session(get_session_folder())
+    return Manifest.for_session(os.path.join(app.config['TEMP_FOLDER'], session_id))
+
+def session_key(session_id, *parts):
+    """Storage key for a file belonging to a session"""
+    return '/'.join((session_id,) + parts)
+
+def remove_session(session_id):
+    """Delete everything a session stored; its blobs go in the next blob sweep"""
+    preview_models.drop(session_id)
+    storage.delete_prefix(session_id)
+    session_folder = os.path.join(app.config['TEMP_FOLDER'], session_id)
+    if os.path.exists(session_folder):
+        shutil.rmtree(session_folder)
+    session_index.remove(session_id)
+
 def cleanup_session():
     """Clean up session folder"""
     if 'session_id' in session:
-        session_folder = os.path.join(app.config['TEMP_FOLDER'], session['session_id'])
-        if os.path.exists(session_folder):
-            shutil.rmtree(session_folder)
+        remove_session(session['session_id'])
+
+def measure_session(session_id):
+    """Bytes a session holds: its state files, outputs and uploads; None if gone"""
+    session_folder = os.path.join(app.config['TEMP_FOLDER'], session_id)
+    if not os.path.isdir(session_folder):
+        return None
+    
+    total = 0
+    for root, _, filenames in os.walk(session_folder):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    
+    # Outputs live in the session folder too unless storage is elsewhere
+    local_path = storage.local_path(session_id)
+    if local_path is None or os.path.abspath(local_path) != os.path.abspath(session_folder):
+        for prefix in ((), ('Active',), ('Terminated',), (UNDO_PREFIX, 'Active'), (UNDO_PREFIX, 'Terminated')):
+            total += sum(size for _, size, _ in storage.list(session_key(session_id, *prefix)))
+    
+    # Uploads count in full for every session holding them, even when shared
+    if os.path.exists(os.path.join(session_folder, MANIFEST_FILENAME)):
+        total += get_manifest(session_id).total_bytes()
+    return total
+
+def referenced_blobs():
+    """Hashes of every blob a session's manifest or undo journal names"""
+    referenced = set()
+    for entry in os.scandir(app.config['TEMP_FOLDER']):
+        if not os.path.exists(os.path.join(entry.path, MANIFEST_FILENAME)):
+            continue
+        referenced |= get_manifest(entry.name).blob_hashes()
+        for record in RenameJournal.for_session(entry.path).records():
+            if record['op'] == 'manifest':
+                referenced.update(sha256 for _, _, sha256, _ in record['restore'])
+    return referenced
+
+def within_quota(session_id, incoming_bytes):
+    """Whether a session may store incoming_bytes more"""
+    quota = app.config['SESSION_QUOTA_BYTES']
+    return quota is None or session_index.size(session_id) + incoming_bytes <= quota
+
+@app.before_request
+def start_request_metrics():
+    """Time the request and, in profiling mode, profile it"""
+    g.metrics_state = metrics.start_request(request.endpoint or 'unmatched')
+    g.profile = profiler.start() if profiler else None
+
+@app.after_request
+def finish_request_metrics(response):
+    """Record the request once its response, streamed or not, has been sent"""
+    state = g.pop('metrics_state', None)
+    if state is None:
+        return response
+    timing = metrics.server_timing()
+    if timing:
+        response.headers['Server-Timing'] = timing
+    
+    profile = g.pop('profile', None)
+    force_profile = request.headers.get('X-Profile') == '1'
+    method, request_bytes = request.method, request.content_length or 0
+    sent = [response.content_length or 0]
+    if response.is_streamed and not response.direct_passthrough:
+        response.response = count_chunks(response.response, sent)
+    
+    def finish():
+        elapsed = metrics.finish_request(state, method, response.status_code, request_bytes, sent[0])
+        if profile is not None and elapsed is not None:
+            profiler.stop(profile, state['endpoint'], elapsed, force=force_profile)
+    
+    response.call_on_close(finish)
+    return response
+
+@app.teardown_request
+def discard_request_profile(error=None):
+    # A request that failed before after_request still has to stop its profiler
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.stop(profile, 'failed', 0)
+
+def count_chunks(chunks, sent):
+    """Pass a streamed body through, adding its size to sent[0]"""
+    try:
+        for chunk in chunks:
+            sent[0] += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def instrumented_job(endpoint, fn):
+    """Wrap a job function so its phases are recorded under endpoint"""
+    def run(*args, **kwargs):
+        with metrics.context(endpoint), metrics.phase('job'):
+            return fn(*args, **kwargs)
+    return run
+
+@app.after_request
+def note_session_activity(response):
+    """Keep the sweeper's index of session activity current"""
+    if 'session_id' in session:
+        # Anything but a read may have changed what the session stores
+        session_index.touch(session['session_id'], dirty=request.method != 'GET')
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Compress sizeable JSON, HTML and text responses with the best encoding the client accepts"""
+    if (not app.config['COMPRESS_RESPONSES'] or response.is_streamed or response.direct_passthrough
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None or (response.content_length or 0) < app.config['COMPRESS_MIN_BYTES']:
+        return response
+    
+    with metrics.phase('compress') as phase:
+        data = response.get_data()
+        response.set_data(compress(data, encoding, app.config['COMPRESS_LEVEL']))
+        phase.bytes = len(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def results_response(payload, columnar=None):
+    """JSON response for payloads carrying result rows
+    
+    Rows go out in the columnar layout (see responses.py) when the client
+    asks with ?layout=columnar.
+    """
+    if columnar is None:
+        columnar = request.args.get('layout') == 'columnar'
+    if columnar:
+        payload = compact_payload(payload)
+    with metrics.phase('json_encode') as phase:
+        body = dumps(payload)
+        phase.bytes = len(body)
+    return Response(body, mimetype='application/json')
+
+def job_payload(job, include_result=True, columnar=False):
+    """A job's status, with an execute result's rows columnar when asked for"""
+    data = job.to_dict(include_result=include_result)
+    if columnar and isinstance(data.get('result'), dict):
+        data['result'] = compact_payload(data['result'])
+    return data
 
 @app.route('/')
 def index():
+    # Assign the session up front so parallel uploads all land in one folder
+    if 'session_id' not in session:
+        session['session_id'] = secrets.token_hex(16)
     return render_template('index.html')
 
 @app.route('/upload_excel', methods=['POST'])
@@ -62,57 +316,39 @@ def upload_excel():
         if file.filename == '':
             return jsonify({'success': False, 'error': 'No file selected'})
         
-        if not allowed_file(file.filename, ALLOWED_EXCEL):
-            return jsonify({'success': False, 'error': 'Invalid file type. Please upload .xlsx or .xls file'})
+        if not allowed_file(file.filename, MAPPING_EXTENSIONS):
+            return jsonify({'success': False, 'error': 'Invalid file type. Please upload .xlsx, .xls, .csv or .tsv file'})
         
-        # Save Excel file
+        # Save mapping file
         session_folder = get_session_folder()
-        excel_path = os.path.join(session_folder, 'mapping.xlsx')
-        file.save(excel_path)
-        
-        # Read and validate Excel
-        df = pd.read_excel(excel_path, engine='openpyxl')
-        
-        if df.shape[1] < 2:
-            return jsonify({
-                'success': False,
-                'error': 'Excel file must have at least 2 columns (Current names → New names)'
-            })
-        
-        # Use first three columns if available
-        if df.shape[1] >= 3:
-            df = df.iloc[:, :3]
-            df.columns = ['current', 'new', 'category']
-        else:
-            df = df.iloc[:, :2]
-            df.columns = ['current', 'new']
-            df['category'] = ''  # Add empty category column
-        
-        # Clean data
-        df = df.dropna(how='all')
-        df['current'] = df['current'].astype(str).str.strip()
-        df['new'] = df['new'].astype(str).str.strip()
-        df['category'] = df['category'].astype(str).str.strip().str.upper()
-        
-        df = df[(df['current'] != '') & (df['current'] != 'nan') & 
-                (df['new'] != '') & (df['new'] != 'nan')]
-        
-        if df.empty:
-            return jsonify({
-                'success': False,
-                'error': 'No valid rename mappings found in Excel file'
-            })
-        
-        # Count categories
-        active_count = len(df[df['category'] == 'A'])
-        terminated_count = len(df[df['category'] == 'T'])
-        uncategorized_count = len(df[(df['category'] != 'A') & (df['category'] != 'T')])
-        
-        # Save cleaned mapping
-        session['mapping_count'] = len(df)
-        df.to_json(os.path.join(session_folder, 'mapping.json'), orient='records')
-        
-        message = f'Excel file loaded: {len(df)} rename mappings found'
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        excel_path = os.path.join(session_folder, f'mapping.{extension}')
+        with metrics.phase('mapping_save') as phase:
+            digest, phase.bytes = save_stream_hashed(file.stream, excel_path)
+        mapping_path = os.path.join(session_folder, MAPPING_FILENAME)
+        
+        # Reuse the parsed mapping if this exact file was uploaded before
+        cache_key = mapping_cache.key(digest, extension)
+        counts = mapping_cache.get(cache_key, mapping_path)
+        metrics.count('mapping_cache_lookups_total', result='miss' if counts is None else 'hit')
+        
+        if counts is None:
+            # Stream, clean and validate rows into the session mapping
+            try:
+                with metrics.phase('mapping_ingest') as phase:
+                    counts = ingest_mapping(excel_path, extension, mapping_path)
+                    phase.rows, phase.bytes = counts['count'], os.path.getsize(excel_path)
+            except MappingError as e:
+                return jsonify({'success': False, 'error': str(e)})
+            mapping_cache.put(cache_key, mapping_path, counts)
+        
+        mapping_count = counts['count']
+        active_count = counts['active']
+        terminated_count = counts['terminated']
+        uncategorized_count = counts['uncategorized']
+        session['mapping_count'] = mapping_count
+        
+        message = f'Excel file loaded: {mapping_count} rename mappings found'
         if active_count > 0 or terminated_count > 0:
             message += f' (Active: {active_count}, Terminated: {terminated_count}'
             if uncategorized_count > 0:
@@ -121,7 +357,7 @@ def upload_excel():
         
         return jsonify({
             'success': True,
-            'count': len(df),
+            'count': mapping_count,
             'message': message
         })
         
@@ -139,31 +375,170 @@ def upload_files():
         if not files or files[0].filename == '':
             return jsonify({'success': False, 'error': 'No files selected'})
         
-        # Save files
-        session_folder = get_session_folder()
-        files_folder = os.path.join(session_folder, 'files')
-        os.makedirs(files_folder, exist_ok=True)
+        # Save files, adding them to the batch uploaded so far
+        manifest = get_manifest()
+        if not within_quota(session['session_id'], request.content_length or 0):
+            return jsonify({'success': False, 'error': QUOTA_ERROR})
         
         uploaded_files = []
-        for file in files:
-            if file.filename:
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(files_folder, filename)
-                file.save(filepath)
-                uploaded_files.append(filename)
-        
-        session['uploaded_files'] = uploaded_files
+        entries = []
+        with blob_store.references():
+            with metrics.phase('blob_put') as phase:
+                for file in files:
+                    if file.filename:
+                        filename = secure_filename(file.filename)
+                        sha256, size = blob_store.put_stream(file.stream)
+                        uploaded_files.append(filename)
+                        entries.append((filename, size, sha256, None))
+                phase.rows, phase.bytes = len(entries), sum(entry[1] for entry in entries)
+            with metrics.phase('manifest_record') as phase:
+                manifest.record(entries)
+                phase.rows = len(entries)
+        total = manifest.count()
+        session_index.touch(session['session_id'], added_bytes=sum(entry[1] for entry in entries))
         
         return jsonify({
             'success': True,
             'count': len(uploaded_files),
+            'total': total,
             'files': uploaded_files,
-            'message': f'{len(uploaded_files)} file(s) uploaded successfully'
+            'message': f'{len(uploaded_files)} file(s) uploaded successfully ({total} in batch)'
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error uploading files: {str(e)}'})
 
+@app.route('/files', methods=['DELETE'])
+def clear_files():
+    """Remove every uploaded file from the batch"""
+    try:
+        manifest = get_manifest()
+        manifest.record(removed=[name for name, _, _ in manifest.listing()])
+        return jsonify({'success': True, 'total': 0})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error removing files: {str(e)}'})
+
+def get_chunk_root():
+    """Folder holding in-progress chunked uploads for this session"""
+    chunk_root = os.path.join(get_session_folder(), 'chunks')
+    os.makedirs(chunk_root, exist_ok=True)
+    return chunk_root
+
+@app.route('/uploads', methods=['POST'])
+def start_upload():
+    """Start a resumable chunked upload for one file"""
+    try:
+        data = request.get_json() or {}
+        filename = secure_filename(data.get('filename', ''))
+        size = data.get('size')
+        
+        if not filename:
+            return jsonify({'success': False, 'error': 'No file selected'})
+        if not isinstance(size, int) or size < 0:
+            return jsonify({'success': False, 'error': 'Invalid file size'})
+        get_session_folder()
+        if not within_quota(session['session_id'], size):
+            return jsonify({'success': False, 'error': QUOTA_ERROR})
+        
+        upload = ChunkedUpload.create(get_chunk_root(), filename, size, hashes=running_hashes)
+        return jsonify({'success': True, **upload.status()})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error starting upload: {str(e)}'})
+
+@app.route('/uploads/known', methods=['POST'])
+def add_known_uploads():
+    """Add files to the batch by content hash when this session already uploaded them
+    
+    Blobs are shared by every session, so only hashes in the session's own
+    manifest (removed uploads included) are accepted; otherwise a client
+    could probe for, or take, another user's file by its hash.
+    """
+    try:
+        data = request.get_json() or {}
+        manifest = get_manifest()
+        
+        known = []
+        entries = []
+        quota_left = None
+        if app.config['SESSION_QUOTA_BYTES'] is not None:
+            quota_left = app.config['SESSION_QUOTA_BYTES'] - session_index.size(session['session_id'])
+        if app.config['UPLOAD_SKIP_KNOWN']:
+            with blob_store.references():
+                own = manifest.blob_hashes()
+                for item in data.get('files', []):
+                    filename = secure_filename(item.get('filename', ''))
+                    sha256 = str(item.get('sha256', '')).lower()
+                    size = item.get('size')
+                    if quota_left is not None and isinstance(size, int) and size > quota_left:
+                        continue  # Left for a normal upload, which reports the quota
+                    if filename and sha256 in own and is_sha256(sha256) and blob_store.size(sha256) == size:
+                        known.append(item['filename'])
+                        entries.append((filename, size, sha256, None))
+                        if quota_left is not None:
+                            quota_left -= size
+                manifest.record(entries)
+        
+        session_index.touch(session['session_id'], added_bytes=sum(entry[1] for entry in entries))
+        return jsonify({'success': True, 'known': known, 'total': manifest.count()})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error checking uploads: {str(e)}'})
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Report which chunks of an upload have been received"""
+    try:
+        upload = ChunkedUpload.load(get_chunk_root(), upload_id)
+        if upload is None:
+            return jsonify({'success': False, 'error': 'Unknown upload'})
+        return jsonify({'success': True, **upload.status()})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error reading upload: {str(e)}'})
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Write one chunk of an upload at the given byte offset"""
+    try:
+        upload = ChunkedUpload.load(get_chunk_root(), upload_id)
+        if upload is None:
+            return jsonify({'success': False, 'error': 'Unknown upload'})
+        
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({'success': False, 'error': 'Missing chunk offset'})
+        
+        with metrics.phase('chunk_write') as phase:
+            upload.write_chunk(offset, request.stream, running_hashes)
+            phase.bytes = upload.expected_length(offset)
+        return jsonify({'success': True, 'offset': offset})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error uploading chunk: {str(e)}'})
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Finish an upload once every chunk has arrived"""
+    try:
+        upload = ChunkedUpload.load(get_chunk_root(), upload_id)
+        if upload is None:
+            return jsonify({'success': False, 'error': 'Unknown upload'})
+        
+        manifest = get_manifest()
+        with blob_store.references():
+            with metrics.phase('upload_complete') as phase:
+                filename = upload.complete(blob_store, running_hashes)
+                phase.rows, phase.bytes = 1, upload.size
+            manifest.record([(filename, upload.size, upload.sha256, None)])
+        session_index.touch(session['session_id'], added_bytes=upload.size)
+        
+        return jsonify({'success': True, 'filename': filename, 'total': manifest.count()})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error completing upload: {str(e)}'})
+
 @app.route('/preview', methods=['POST'])
 def preview():
     """Preview rename operations"""
@@ -171,429 +546,571 @@ def preview():
         session_folder = get_session_folder()
         
         # Load mapping
-        mapping_path = os.path.join(session_folder, 'mapping.json')
+        mapping_path = os.path.join(session_folder, MAPPING_FILENAME)
         if not os.path.exists(mapping_path):
             return jsonify({'success': False, 'error': 'Please upload Excel file first'})
         
-        df = pd.read_json(mapping_path, orient='records')
-        
         # Get uploaded files
-        files_folder = os.path.join(session_folder, 'files')
-        if not os.path.exists(files_folder):
+        manifest = get_manifest()
+        if not manifest.count():
             return jsonify({'success': False, 'error': 'Please upload files first'})
         
-        uploaded_files = set(os.listdir(files_folder))
-        
-        # Create a map of base filenames (without extension) to actual filenames
-        file_base_map = {}
-        for filename in uploaded_files:
-            # Get base name without extension
-            base_name = os.path.splitext(filename)[0]
-            file_base_map[base_name.lower()] = filename
-        
-        # Handle duplicate new names by appending (1), (2), etc.
-        new_name_counts = {}
-        final_new_names = []
-        
-        for new_name in df['new']:
-            if new_name in new_name_counts:
-                # Duplicate found - add counter
-                new_name_counts[new_name] += 1
-                counter = new_name_counts[new_name]
-                
-                # Split filename and extension
-                name_without_ext = os.path.splitext(new_name)[0]
-                extension = os.path.splitext(new_name)[1]
-                
-                # Create new name with counter
-                unique_name = f"{name_without_ext} ({counter}){extension}"
-                final_new_names.append(unique_name)
-            else:
-                new_name_counts[new_name] = 0
-                final_new_names.append(new_name)
-        
-        # Update dataframe with unique names
-        df['original_new'] = df['new']  # Keep track of original
-        df['new'] = final_new_names
-        
-        # Check for conflicts
-        existing_conflicts = {}
-        for new_name in df['new'].unique():
-            if new_name in uploaded_files and new_name not in df['current'].values:
-                existing_conflicts[new_name] = new_name
-        
-        # Process each rename
-        results = []
-        ready_count = 0
-        warning_count = 0
-        error_count = 0
-        active_count = 0
-        terminated_count = 0
-        renamed_count = 0  # Count of names that were auto-renamed due to duplicates
-        
-        for idx, row in df.iterrows():
-            current_name = row['current']
-            new_name = row['new']
-            original_new = row['original_new']
-            category = row.get('category', '').upper().strip() if 'category' in row else ''
-            
-            # Check if name was modified due to duplicate
-            was_renamed = (new_name != original_new)
-            if was_renamed:
-                renamed_count += 1
-            
-            # Validate category
-            if category and category not in ['A', 'T']:
-                category = ''  # Invalid category, treat as uncategorized
-            
-            status = 'ready'
-            notes = []
-            matched_file = None
-            
-            # Try exact match first
-            if current_name in uploaded_files:
-                matched_file = current_name
-            else:
-                # Try matching base filename (ignore extension)
-                current_base = os.path.splitext(current_name)[0]
-                matched_file = file_base_map.get(current_base.lower())
+        # Apply upload and mapping changes to the last preview when they are small
+        stat = mapping_stat(mapping_path)
+        model = preview_models.get(session['session_id'])
+        updated = None
+        if model is not None:
+            with metrics.phase('preview_update') as phase:
+                seq, added, removed = manifest.changes_since(model.listing_seq)
+                model.note_changes(seq, added, removed)
+                df = load_mapping(mapping_path) if stat != model.mapping_stat else None
+                updated = model.update(df, stat)
+                phase.rows = len(added) + len(removed)
+        
+        if updated is None:
+            # Match, dedupe and classify every row in one column-wise pass
+            with metrics.phase('mapping_load') as phase:
+                df = load_mapping(mapping_path)
+                phase.rows = len(df)
+            with metrics.phase('manifest_snapshot') as phase:
+                seq, listing = manifest.snapshot()
+                phase.rows = len(listing)
+            with metrics.phase('build_plan') as phase:
+                plan = build_plan(df, {name for name, _, _ in listing})
+                phase.rows = len(plan)
+            model = PreviewModel(plan, listing, stat, seq)
+            preview_models.put(session['session_id'], model)
+        
+        # Persist the plan in the background so execute and reports can reuse it
+        plan_path = os.path.join(session_folder, PLAN_FILENAME)
+        preview_models.persist(model, plan_path)
+        with model.lock:
+            plan, summary = model.plan, dict(model.summary)
+        
+        # Rows are served page by page from /preview/results
+        total, results = query_plan(plan, limit=PREVIEW_PAGE_SIZE)
+        attach_suggestions(results, model.suggestion_index())
+        
+        return results_response({
+            'success': True,
+            'results': results,
+            'summary': summary
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error during preview: {str(e)}'})
+
+def get_execute_mode():
+    """Execute mode requested by the client, defaulting to EXECUTE_MODE"""
+    data = request.get_json(silent=True) or {}
+    return request.args.get('mode') or data.get('mode') or app.config['EXECUTE_MODE']
+
+def run_execute(session_id, max_workers, mode='move', job=None):
+    """Put every ready plan row in place and write the backup log
+    
+    mode is one of EXECUTE_MODES: 'move' renames the uploads, 'link' leaves
+    them alone and links (or copies) them under their new names, 'virtual'
+    only records the renames so the download can apply them. Uploads are
+    blob store references, so renaming never copies their content. Returns
+    the /execute response payload. When a job is given, its progress is
+    advanced as each file is handled.
+    """
+    if mode not in EXECUTE_MODES:
+        raise ValueError(f'Unknown execute mode: {mode}')
+    
+    # Held until the execute is committed or rolled back, so recovery in
+    # another process never reverts it while it runs
+    session_folder = os.path.join(app.config['TEMP_FOLDER'], session_id)
+    with RenameJournal.for_session(session_folder).locked():
+        return execute_session(session_id, max_workers, mode, job)
+
+def execute_session(session_id, max_workers, mode, job):
+    """run_execute's work; the caller holds the session's journal lock"""
+    session_folder = os.path.join(app.config['TEMP_FOLDER'], session_id)
+    
+    # Reuse the preview plan unless uploads or mapping changed since
+    with metrics.phase('plan_load') as phase:
+        manifest = get_manifest(session_id)
+        listing = manifest.listing()
+        mapping_path = os.path.join(session_folder, MAPPING_FILENAME)
+        fingerprint = manifest.fingerprint(mapping_path)
+        model = preview_models.get(session_id)
+        plan = model.plan_for(fingerprint) if model else None
+        if plan is None:
+            plan = load_plan(os.path.join(session_folder, PLAN_FILENAME), fingerprint)
+        
+        if plan is None:
+            df = load_mapping(mapping_path)
+            uploaded_files = {name for name, _, _ in listing}
+            plan = build_plan(df, uploaded_files)
+        phase.rows = len(plan)
+    
+    # Create backup log
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_log = []
+    backup_log.append(f"Rename Backup Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    backup_log.append("=" * 80 + "\n\n")
+    
+    # Only rows the preview marked as ready are renamed
+    ready = plan[plan['status'] == 'ready']
+    
+    # Destination folder based on category; uncategorized files stay in the
+    # batch, so only their reference is renamed (dst None)
+    dest_prefixes = {
+        'Active': session_key(session_id, 'Active'),
+        'Terminated': session_key(session_id, 'Terminated')
+    }
+    moves = [
+        (row.matched_file, None if row.folder == ROOT_FOLDER else f'{dest_prefixes[row.folder]}/{row.new}')
+        for row in ready.itertuples(index=False)
+    ]
+    blobs = manifest.blobs(ready['matched_file'])
+    uploads = {name: (size, mtime) for name, size, mtime in listing}
+    
+    def place(name, dst):
+        if name not in blobs:
+            raise FileNotFoundError(f'Upload not found: {name}')
+        if dst is not None:
+            storage.link(blob_key(blobs[name]), dst)
+    
+    on_done = None
+    if job:
+        sizes = [uploads.get(row.matched_file, (0, 0))[0] for row in ready.itertuples(index=False)]
+        job.set_total(len(moves), sum(sizes))
+        on_done = lambda index: job.advance(1, sizes[index])
+    
+    # Journal every change before making it so a crash or /undo can revert it
+    journal = RenameJournal.for_session(session_folder)
+    execute_id = secrets.token_hex(8)
+    undo_prefix = session_key(session_id, UNDO_PREFIX)
+    journal.begin(execute_id, mode)
+    # Only the last execute can be undone; its journal is gone before its copies go
+    storage.delete_prefix(undo_prefix)
+    
+    virtual_path = os.path.join(session_folder, VIRTUAL_OUTPUTS_FILENAME)
+    if mode == 'virtual':
+        # Nothing is touched; the download reads the blobs under their new names,
+        # uncategorized ones at the top of the archive
+        outputs = [
+            [blob_key(blobs[row.matched_file]),
+             row.new if row.folder == ROOT_FOLDER else f'{row.folder}/{row.new}',
+             *uploads[row.matched_file]]
+            for row in ready.itertuples(index=False)
+            if row.matched_file in blobs
+        ]
+        with open(virtual_path + '.tmp', 'w') as f:
+            json.dump(outputs, f)
+        os.replace(virtual_path + '.tmp', virtual_path)
+        errors = [None] * len(moves)
+        if job:
+            job.advance(len(moves), sum(sizes))
+    else:
+        if os.path.exists(virtual_path):
+            os.remove(virtual_path)
+        try:
+            # Outputs about to be overwritten, even by a name differing only in
+            # case, are moved aside so undo can restore them
+            existing = {name_key(f'{prefix}/{name}'): f'{prefix}/{name}' for prefix in dest_prefixes.values()
+                        for name, _, _ in storage.list(prefix)}
+            overwritten = {existing[name_key(dst)] for _, dst in moves
+                           if dst is not None and name_key(dst) in existing}
+            preserved = [
+                {'op': 'preserve', 'key': key, 'saved': f"{undo_prefix}/{key.split('/', 1)[1]}"}
+                for key in sorted(overwritten)
+            ]
+            if preserved:
+                journal.append(preserved)
+                for record in preserved:
+                    storage.move(record['key'], record['saved'])
             
-            # Check if current file exists
-            if not matched_file:
-                status = 'error'
-                notes.append('Source file not found in uploads')
-                error_count += 1
-            elif current_name == new_name:
-                status = 'warning'
-                notes.append('Same name - no change needed')
-                warning_count += 1
-            elif new_name in existing_conflicts:
-                status = 'error'
-                notes.append('Target name already exists (not in mapping)')
-                error_count += 1
-            else:
-                if was_renamed:
-                    notes.append(f'Auto-renamed to avoid duplicate (was: {original_new})')
-                
-                if category == 'A':
-                    if not was_renamed:
-                        notes.append('Ready to rename → Active folder')
-                    else:
-                        notes.append('→ Active folder')
-                    active_count += 1
-                elif category == 'T':
-                    if not was_renamed:
-                        notes.append('Ready to rename → Terminated folder')
-                    else:
-                        notes.append('→ Terminated folder')
-                    terminated_count += 1
-                else:
-                    if not was_renamed:
-                        notes.append('Ready to rename')
-                ready_count += 1
+            # Link blobs into place in parallel; errors come back in plan order.
+            # Moves are keyed by upload name, so in move mode a second row claiming
+            # the same upload still fails as it did when files were really moved.
+            # Each batch is journaled before any of its moves starts
+            with metrics.phase('execute_moves') as phase:
+                errors = run_moves(
+                    moves, max_workers=max_workers, on_done=on_done, move=place,
+                    unique_sources=(mode == 'move'), batch_size=JOURNAL_BATCH,
+                    before_batch=lambda batch: journal.append(
+                        [{'op': 'links', 'keys': [dst for _, dst in batch if dst is not None]}])
+                )
+                phase.rows = len(moves)
             
-            results.append({
-                'status': status,
-                'current': current_name,
-                'new': new_name,
-                'category': category,
-                'notes': '; '.join(notes) if notes else 'OK',
-                'matched_file': matched_file
-            })
-        
-        # Save updated mapping with unique names
-        df.to_json(mapping_path, orient='records')
+            # Moved uploads leave the batch; uncategorized ones are renamed in it
+            done = [row for row, error in zip(ready.itertuples(index=False), errors) if error is None]
+            added, removed = manifest.rename_changes(
+                [(row.matched_file, row.new) for row in done if row.folder == ROOT_FOLDER],
+                removed=[row.matched_file for row in done if row.folder != ROOT_FOLDER] if mode == 'move' else [],
+                keep_sources=(mode == 'link')
+            )
+            restore = manifest.entries(removed + [name for name, _, _, _ in added])
+            journal.append([{
+                'op': 'manifest',
+                'added': [name for name, _, _, _ in added],
+                'restore': [[name, *entry] for name, entry in restore.items()]
+            }])
+            with metrics.phase('manifest_record') as phase:
+                manifest.record(added, removed, execute_id=execute_id)
+                phase.rows = len(added) + len(removed)
+        except BaseException:
+            # The manifest update is atomic, so only storage needs putting back
+            revert(journal.records(), storage, max_workers=max_workers)
+            journal.append([{'op': 'rolled_back'}])
+            raise
+    
+    results, summary = execute_results(ready, errors, EXECUTE_NOTES[mode])
+    for row, error in zip(ready.itertuples(index=False), errors):
+        if error is None:
+            backup_log.append(f"{row.matched_file} -> {row.folder}/{row.new}\n")
+    
+    # Save backup log next to the renamed files so downloads can include it
+    backup_key = session_key(session_id, f'rename_backup_{timestamp}.txt')
+    journal.append([{'op': 'files', 'keys': [backup_key]}])
+    backup_data = io.BytesIO(''.join(backup_log).encode('utf-8'))
+    with metrics.phase('backup_log') as phase:
+        storage.save(backup_key, backup_data)
+        phase.bytes = backup_data.getbuffer().nbytes
+    
+    # Keep results on the server for reports
+    save_execute_results(session_folder, results)
+    journal.append([{'op': 'commit'}])
+    session_index.touch(session_id, dirty=True)
+    
+    return {
+        'success': True,
+        'results': results,
+        'summary': summary,
+        'backup_log': f'rename_backup_{timestamp}.txt',
+        'mode': mode
+    }
+
+@app.route('/preview/results', methods=['GET'])
+def preview_results():
+    """Serve one filtered page of the last preview"""
+    try:
+        session_folder = get_session_folder()
+        plan_path = os.path.join(session_folder, PLAN_FILENAME)
+        model = preview_models.get(session['session_id'])
+        if model is not None:
+            with model.lock:
+                plan, summary = model.plan, dict(model.summary)
+            index = model.suggestion_index()
+        else:
+            plan, summary = load_saved_plan(plan_path)
+            index = load_suggestion_index(plan_path)
+        if plan is None:
+            return jsonify({'success': False, 'error': 'Please run the preview first'})
         
-        return jsonify({
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', PREVIEW_PAGE_SIZE, type=int), 1), MAX_PREVIEW_PAGE_SIZE)
+        total, results = query_plan(
+            plan,
+            status=request.args.get('status', ''),
+            category=request.args.get('category', ''),
+            search=request.args.get('q', '').strip(),
+            offset=offset,
+            limit=limit
+        )
+        attach_suggestions(results, index)
+        
+        return results_response({
             'success': True,
+            'offset': offset,
+            'total': total,
             'results': results,
-            'summary': {
-                'ready': ready_count,
-                'warning': warning_count,
-                'error': error_count,
-                'total': len(results),
-                'active': active_count,
-                'terminated': terminated_count,
-                'auto_renamed': renamed_count
-            }
+            'summary': summary
         })
         
     except Exception as e:
-        return jsonify({'success': False, 'error': f'Error during preview: {str(e)}'})
+        return jsonify({'success': False, 'error': f'Error loading preview: {str(e)}'})
 
 @app.route('/execute', methods=['POST'])
 def execute_renames():
     """Execute rename operations"""
     try:
-        session_folder = get_session_folder()
-        files_folder = os.path.join(session_folder, 'files')
+        get_session_folder()
+        return results_response(run_execute(session['session_id'], app.config['RENAME_WORKERS'], get_execute_mode()))
         
-        # Create Active and Terminated folders
-        active_folder = os.path.join(session_folder, 'Active')
-        terminated_folder = os.path.join(session_folder, 'Terminated')
-        uncategorized_folder = files_folder  # Keep uncategorized in original location
-        
-        os.makedirs(active_folder, exist_ok=True)
-        os.makedirs(terminated_folder, exist_ok=True)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error during rename: {str(e)}'})
+
+def undo_execute(session_id, max_workers):
+    """Revert the session's last execute from its journal
+    
+    Outputs are deleted and overwritten ones restored in parallel, then the
+    uploads go back into the manifest under their old names. Returns the
+    /undo response payload.
+    """
+    session_folder = os.path.join(app.config['TEMP_FOLDER'], session_id)
+    with RenameJournal.for_session(session_folder).locked():
+        return undo_session(session_id, max_workers)
+
+def undo_session(session_id, max_workers):
+    """undo_execute's work; the caller holds the session's journal lock"""
+    session_folder = os.path.join(app.config['TEMP_FOLDER'], session_id)
+    journal = RenameJournal.for_session(session_folder)
+    records = journal.records()
+    _, mode, last = journal.state(records)
+    if last not in ('commit', 'undo'):
+        return {'success': False, 'error': 'There is no rename to undo'}
+    
+    if last == 'commit':
+        journal.append([{'op': 'undo'}])
+    with metrics.phase('undo_revert') as phase:
+        removed, errors = revert(records, storage, get_manifest(session_id), max_workers)
+        phase.rows = removed
+    if errors:
+        # The journal stays at 'undo' so the next attempt picks up from here
+        return {'success': False, 'error': f'{len(errors)} file(s) could not be restored: {errors[0]}'}
+    
+    for filename in (VIRTUAL_OUTPUTS_FILENAME, RESULTS_FILENAME):
+        path = os.path.join(session_folder, filename)
+        if os.path.exists(path):
+            os.remove(path)
+    journal.append([{'op': 'undone'}])
+    session_index.touch(session_id, dirty=True)
+    return {'success': True, 'removed': removed, 'mode': mode}
+
+def recover_executes():
+    """Settle executes and undos that were cut short by a crash or restart
+    
+    An execute whose manifest update was committed is marked done; anything
+    earlier is rolled back from its journal. Interrupted undos are finished.
+    Journals whose lock is held belong to an execute or undo still running
+    in another process, and are left alone.
+    """
+    for entry in os.scandir(app.config['TEMP_FOLDER']):
+        if not entry.is_dir():
+            continue
+        journal = RenameJournal.for_session(entry.path)
+        execute_id, mode, last = journal.state()
+        if last in (None, 'commit', 'undone', 'rolled_back'):
+            continue
         
-        # Load mapping
-        mapping_path = os.path.join(session_folder, 'mapping.json')
-        df = pd.read_json(mapping_path, orient='records')
-        
-        uploaded_files = set(os.listdir(files_folder))
-        
-        # Create a map of base filenames to actual filenames
-        file_base_map = {}
-        for filename in uploaded_files:
-            base_name = os.path.splitext(filename)[0]
-            file_base_map[base_name.lower()] = filename
-        
-        # Filter to only ready items
-        results = []
-        success_count = 0
-        fail_count = 0
-        active_count = 0
-        terminated_count = 0
-        uncategorized_count = 0
-        
-        # Create backup log
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_log = []
-        backup_log.append(f"Rename Backup Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        backup_log.append("=" * 80 + "\n\n")
-        
-        for _, row in df.iterrows():
-            current_name = row['current']
-            new_name = row['new']
-            category = row.get('category', '').upper().strip() if 'category' in row else ''
-            
-            # Find matched file (exact or by base name)
-            matched_file = None
-            if current_name in uploaded_files:
-                matched_file = current_name
-            else:
-                current_base = os.path.splitext(current_name)[0]
-                matched_file = file_base_map.get(current_base.lower())
-            
-            # Skip if not ready
-            if not matched_file or current_name == new_name:
+        with journal.locked(blocking=False) as held:
+            if not held:
+                continue
+            # Read again under the lock: the owner may have finished meanwhile
+            records = journal.records()
+            execute_id, mode, last = journal.state(records)
+            if last in (None, 'commit', 'undone', 'rolled_back'):
                 continue
             
-            try:
-                current_path = os.path.join(files_folder, matched_file)
-                
-                # Determine destination folder based on category
-                if category == 'A':
-                    dest_folder = active_folder
-                    folder_name = 'Active'
-                    active_count += 1
-                elif category == 'T':
-                    dest_folder = terminated_folder
-                    folder_name = 'Terminated'
-                    terminated_count += 1
-                else:
-                    dest_folder = uncategorized_folder
-                    folder_name = 'Root'
-                    uncategorized_count += 1
-                
-                new_path = os.path.join(dest_folder, new_name)
-                
-                # Rename and move file
-                shutil.move(current_path, new_path)
-                
-                backup_log.append(f"{matched_file} -> {folder_name}/{new_name}\n")
-                
-                results.append({
-                    'status': 'success',
-                    'current': current_name,
-                    'new': new_name,
-                    'category': category,
-                    'folder': folder_name,
-                    'notes': f'Renamed successfully → {folder_name} folder (was: {matched_file})'
-                })
-                success_count += 1
-                
-            except Exception as e:
-                results.append({
-                    'status': 'failed',
-                    'current': current_name,
-                    'new': new_name,
-                    'category': category,
-                    'folder': '',
-                    'notes': f'Error: {str(e)}'
-                })
-                fail_count += 1
-        
-        # Save backup log
-        backup_path = os.path.join(session_folder, f'rename_backup_{timestamp}.txt')
-        with open(backup_path, 'w') as f:
-            f.writelines(backup_log)
-        
-        return jsonify({
-            'success': True,
-            'results': results,
-            'summary': {
-                'success': success_count,
-                'failed': fail_count,
-                'total': success_count + fail_count,
-                'active': active_count,
-                'terminated': terminated_count,
-                'uncategorized': uncategorized_count
-            },
-            'backup_log': f'rename_backup_{timestamp}.txt'
-        })
+            if last == 'undo':
+                undo_session(entry.name, app.config['RENAME_WORKERS'])
+            elif mode != 'virtual' and get_manifest(entry.name).last_execute() == execute_id:
+                journal.append([{'op': 'commit'}])
+            else:
+                revert(records, storage, max_workers=app.config['RENAME_WORKERS'])
+                virtual_path = os.path.join(entry.path, VIRTUAL_OUTPUTS_FILENAME)
+                if mode == 'virtual' and os.path.exists(virtual_path):
+                    os.remove(virtual_path)
+                journal.append([{'op': 'rolled_back'}])
+
+@app.route('/undo', methods=['POST'])
+def undo():
+    """Undo the last execute"""
+    try:
+        get_session_folder()
+        return jsonify(undo_execute(session['session_id'], app.config['RENAME_WORKERS']))
         
     except Exception as e:
-        return jsonify({'success': False, 'error': f'Error during rename: {str(e)}'})
+        return jsonify({'success': False, 'error': f'Error during undo: {str(e)}'})
+
+def collect_download_entries(session_id):
+    """List (key, arcname, size, mtime_ns) for the Active/Terminated files, virtual outputs and backup logs"""
+    entries = []
+    for folder_name in ['Active', 'Terminated']:
+        for filename, size, mtime in storage.list(session_key(session_id, folder_name)):
+            entries.append((session_key(session_id, folder_name, filename), f'{folder_name}/{filename}', size, mtime))
+    
+    # Files recorded by a virtual execute are read from the uploads directly
+    virtual_path = os.path.join(app.config['TEMP_FOLDER'], session_id, VIRTUAL_OUTPUTS_FILENAME)
+    if os.path.exists(virtual_path):
+        with open(virtual_path) as f:
+            outputs = json.load(f)
+        for key, arcname, size, mtime in outputs:
+            entries.append((key, arcname, size, mtime))
+    
+    # Add backup log if exists
+    for filename, size, mtime in storage.list(session_id):
+        if filename.startswith('rename_backup_'):
+            entries.append((session_key(session_id, filename), filename, size, mtime))
+    
+    return entries
+
+def iter_download_zip(entries, on_entry=None):
+    """Yield the download archive, reading each entry through storage"""
+    policy = CompressionPolicy(
+        level=app.config['ZIP_COMPRESSION_LEVEL'],
+        stored_extensions=app.config['ZIP_STORED_EXTENSIONS'],
+        sample_size=app.config['ZIP_SAMPLE_BYTES']
+    )
+    zip_entries = (
+        (lambda key=key: storage.iter_chunks(key), arcname, size, mtime / 1e9)
+        for key, arcname, size, mtime in entries
+    )
+    return stream_zip_parallel(zip_entries, policy, app.config['ZIP_WORKERS'], on_entry=on_entry)
+
+def build_download_zip(session_id, job):
+    """Write the download archive to disk for a background job"""
+    with metrics.phase('download_list') as phase:
+        entries = collect_download_entries(session_id)
+        phase.rows = len(entries)
+    job.set_total(len(entries), sum(size for _, _, size, _ in entries))
+    
+    downloads_folder = os.path.join(app.config['TEMP_FOLDER'], session_id, 'downloads')
+    os.makedirs(downloads_folder, exist_ok=True)
+    zip_path = os.path.join(downloads_folder, f'{job.id}.zip')
+    
+    with open(zip_path, 'wb') as f:
+        chunks = iter_download_zip(entries, on_entry=lambda size: job.advance(1, size))
+        for chunk in metrics.timed_iter(chunks, 'zip_stream', rows=len(entries)):
+            f.write(chunk)
+    
+    session_index.touch(session_id, dirty=True)
+    return {'success': True, 'count': len(entries), 'size': os.path.getsize(zip_path)}
 
 @app.route('/download', methods=['GET'])
 def download():
     """Download renamed files as zip with folder structure"""
     try:
-        session_folder = get_session_folder()
-        
-        # Create zip file in memory
-        memory_file = io.BytesIO()
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            # Add files from Active folder
-            active_folder = os.path.join(session_folder, 'Active')
-            if os.path.exists(active_folder):
-                for filename in os.listdir(active_folder):
-                    filepath = os.path.join(active_folder, filename)
-                    zf.write(filepath, f'Active/{filename}')
-            
-            # Add files from Terminated folder
-            terminated_folder = os.path.join(session_folder, 'Terminated')
-            if os.path.exists(terminated_folder):
-                for filename in os.listdir(terminated_folder):
-                    filepath = os.path.join(terminated_folder, filename)
-                    zf.write(filepath, f'Terminated/{filename}')
-            
-            # Add backup log if exists
-            for file in os.listdir(session_folder):
-                if file.startswith('rename_backup_'):
-                    backup_path = os.path.join(session_folder, file)
-                    zf.write(backup_path, file)
+        get_session_folder()
         
-        memory_file.seek(0)
+        # Collect entries up front; the archive itself is built while streaming
+        with metrics.phase('download_list') as phase:
+            entries = collect_download_entries(session['session_id'])
+            phase.rows = len(entries)
+        download_name = f'renamed_files_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
         
-        return send_file(
-            memory_file,
+        return Response(
+            metrics.timed_iter(iter_download_zip(entries), 'zip_stream', rows=len(entries)),
             mimetype='application/zip',
-            as_attachment=True,
-            download_name=f'renamed_files_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+            headers={'Content-Disposition': f'attachment; filename={download_name}'}
         )
         
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error creating download: {str(e)}'})
 
-@app.route('/download_report', methods=['POST'])
+@app.route('/download_report', methods=['GET', 'POST'])
 def download_report():
-    """Download detailed report"""
+    """Download detailed report built from the results stored for this session"""
     try:
-        data = request.get_json()
-        results = data.get('results', [])
-        
-        # Separate successful and failed/error results
-        successful = [r for r in results if r.get('status', '').lower() in ['success', 'ready']]
-        warnings = [r for r in results if r.get('status', '').lower() == 'warning']
-        errors = [r for r in results if r.get('status', '').lower() in ['error', 'failed']]
-        
-        # Create report
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        report = []
-        report.append("=" * 80 + "\n")
-        report.append("FILE RENAME REPORT\n")
-        report.append("=" * 80 + "\n\n")
-        report.append(f"Generated: {timestamp}\n\n")
-        
-        # Summary section
-        report.append("SUMMARY\n")
-        report.append("-" * 80 + "\n")
-        report.append(f"Total Files: {len(results)}\n")
-        report.append(f"✓ Successful: {len(successful)}\n")
-        report.append(f"⚠ Warnings: {len(warnings)}\n")
-        report.append(f"✗ Errors: {len(errors)}\n")
-        report.append("\n\n")
-        
-        # Successful renames mapping table
-        if successful:
-            report.append("=" * 80 + "\n")
-            report.append("SUCCESSFUL RENAMES - MAPPING TABLE\n")
-            report.append("=" * 80 + "\n\n")
-            
-            # Calculate column widths
-            max_old = max([len(r.get('current', '')) for r in successful] + [20])
-            max_new = max([len(r.get('new', '')) for r in successful] + [20])
-            
-            # Table header
-            report.append(f"{'ORIGINAL NAME':<{max_old}}  →  {'NEW NAME':<{max_new}}  FOLDER\n")
-            report.append(f"{'-' * max_old}     {'-' * max_new}  {'-' * 15}\n")
-            
-            # Table rows
-            for item in successful:
-                current = item.get('current', '')
-                new = item.get('new', '')
-                
-                # Determine folder
-                folder = item.get('folder', '')
-                if not folder and 'category' in item:
-                    cat = item.get('category', '')
-                    if cat == 'A':
-                        folder = 'Active'
-                    elif cat == 'T':
-                        folder = 'Terminated'
-                    else:
-                        folder = 'Root'
-                elif not folder:
-                    folder = 'Root'
-                
-                report.append(f"{current:<{max_old}}  →  {new:<{max_new}}  {folder}\n")
-            
-            report.append("\n")
+        session_folder = get_session_folder()
+        report_format = request.args.get('format', 'txt').lower()
+        if report_format not in REPORT_FORMATS:
+            return jsonify({'success': False, 'error': f'Unknown report format: {report_format}'})
         
-        # Warnings section
-        if warnings:
-            report.append("=" * 80 + "\n")
-            report.append("WARNINGS\n")
-            report.append("=" * 80 + "\n\n")
-            
-            for idx, item in enumerate(warnings, 1):
-                report.append(f"{idx}. {item.get('current', 'N/A')}\n")
-                report.append(f"   Reason: {item.get('notes', 'No details')}\n")
-                report.append("\n")
-        
-        # Errors section
-        if errors:
-            report.append("=" * 80 + "\n")
-            report.append("ERRORS (Files Not Renamed)\n")
-            report.append("=" * 80 + "\n\n")
-            
-            for idx, item in enumerate(errors, 1):
-                report.append(f"{idx}. {item.get('current', 'N/A')} → {item.get('new', 'N/A')}\n")
-                report.append(f"   Issue: {item.get('notes', 'No details')}\n")
-                report.append("\n")
-        
-        # Footer
-        report.append("\n")
-        report.append("=" * 80 + "\n")
-        report.append("End of Report\n")
-        report.append("=" * 80 + "\n")
-        
-        # Create file in memory
-        memory_file = io.BytesIO()
-        memory_file.write(''.join(report).encode('utf-8'))
-        memory_file.seek(0)
+        model = preview_models.get(session['session_id'])
+        rows = load_report_rows(session_folder, request.args.get('source', 'preview'),
+                                plan=model.plan if model else None)
+        if rows is None:
+            return jsonify({'success': False, 'error': 'Nothing to report yet, please run the preview first'})
+        
+        download_name = f'rename_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{report_format}'
+        
+        if report_format == 'xlsx':
+            reports_folder = os.path.join(session_folder, 'reports')
+            os.makedirs(reports_folder, exist_ok=True)
+            report_path = os.path.abspath(os.path.join(reports_folder, download_name))
+            with metrics.phase('report_xlsx') as phase:
+                write_xlsx_report(rows, report_path)
+                phase.rows, phase.bytes = len(rows), os.path.getsize(report_path)
+            return send_file(
+                report_path,
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                as_attachment=True,
+                download_name=download_name
+            )
+        
+        if report_format == 'csv':
+            body, mimetype = iter_csv_report(rows), 'text/csv'
+        else:
+            body, mimetype = iter_text_report(rows), 'text/plain'
+        
+        return Response(
+            metrics.timed_iter((chunk.encode('utf-8') for chunk in body), f'report_{report_format}', rows=len(rows)),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={download_name}'}
+        )
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error creating report: {str(e)}'})
+
+@app.route('/jobs/execute', methods=['POST'])
+def start_execute_job():
+    """Start executing renames in the background"""
+    try:
+        get_session_folder()
+        mode = get_execute_mode()
+        if mode not in EXECUTE_MODES:
+            return jsonify({'success': False, 'error': f'Unknown execute mode: {mode}'})
+        job = job_manager.submit('execute', session['session_id'], instrumented_job('job_execute', run_execute),
+                                 session['session_id'], app.config['RENAME_WORKERS'], mode)
+        return jsonify({'success': True, 'job_id': job.id})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error starting rename: {str(e)}'})
+
+@app.route('/jobs/download', methods=['POST'])
+def start_download_job():
+    """Start building the download archive in the background"""
+    try:
+        get_session_folder()
+        job = job_manager.submit('download', session['session_id'], instrumented_job('job_download', build_download_zip),
+                                 session['session_id'])
+        return jsonify({'success': True, 'job_id': job.id})
         
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error starting download: {str(e)}'})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Poll a job's progress; includes the result once it is done"""
+    job = job_manager.get(job_id, session.get('session_id'))
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'})
+    columnar = request.args.get('layout') == 'columnar'
+    return results_response({'success': True, 'job': job_payload(job, columnar=columnar)}, columnar=False)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Stream a job's progress as Server-Sent Events until it finishes"""
+    job = job_manager.get(job_id, session.get('session_id'))
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'})
+    
+    columnar = request.args.get('layout') == 'columnar'
+    
+    def generate():
+        while True:
+            finished = job.finished
+            yield f'data: {dumps(job_payload(job, finished, columnar)).decode()}\n\n'
+            if finished:
+                break
+            time.sleep(JOB_EVENT_INTERVAL)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/download', methods=['GET'])
+def job_download(job_id):
+    """Send the archive built by a finished download job"""
+    try:
+        job = job_manager.get(job_id, session.get('session_id'))
+        if job is None or job.kind != 'download' or job.status != 'done':
+            return jsonify({'success': False, 'error': 'Download is not ready'})
+        
+        zip_path = os.path.join(get_session_folder(), 'downloads', f'{job.id}.zip')
         return send_file(
-            memory_file,
-            mimetype='text/plain',
+            os.path.abspath(zip_path),
+            mimetype='application/zip',
             as_attachment=True,
-            download_name=f'rename_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.txt'
+            download_name=f'renamed_files_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
         )
         
     except Exception as e:
-        return jsonify({'success': False, 'error': f'Error creating report: {str(e)}'})
+        return jsonify({'success': False, 'error': f'Error creating download: {str(e)}'})
 
 @app.route('/reset', methods=['POST'])
 def reset():
@@ -605,5 +1122,37 @@ def reset():
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error resetting session: {str(e)}'})
 
+@app.route('/gc/stats', methods=['GET'])
+def gc_stats():
+    """Sweeper counters: sessions expired and evicted, bytes reclaimed, ..."""
+    return jsonify({'success': True, **sweeper.metrics()})
+
+# Sweeper stats that only ever grow are exported as counters, the rest as gauges
+SWEEPER_COUNTERS = ('passes', 'sessions_measured', 'sessions_expired', 'sessions_evicted',
+                    'session_bytes_reclaimed', 'blobs_removed', 'blob_bytes_reclaimed',
+                    'stale_files_removed', 'stale_bytes_reclaimed', 'errors')
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, phase and sweeper metrics in Prometheus text format"""
+    stats = sweeper.metrics()
+    counters = {f'gc_{key}_total': stats[key] for key in SWEEPER_COUNTERS}
+    gauges = {f'gc_{key}': value for key, value in stats.items() if key not in SWEEPER_COUNTERS}
+    gauges['jobs_running'] = job_manager.running()
+    return Response(metrics.render(gauges, counters), mimetype='text/plain; version=0.0.4')
+
+sweeper = SessionSweeper(
+    session_index, measure_session, remove_session,
+    sweep_blobs=(lambda: blob_store.sweep(referenced_blobs)) if app.config['GC_BLOBS'] else None,
+    ttl=app.config['SESSION_TTL'],
+    max_bytes=app.config['STORAGE_QUOTA_BYTES'],
+    interval=app.config['GC_INTERVAL'],
+    stale_folders=[app.config['UPLOAD_FOLDER']]  # The app never writes here; clear out leftovers
+)
+
+# Settle any execute a crash left half done before serving requests
+recover_executes()
+sweeper.start()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+ASGI Entry Point
+Serves the Flask app from an asyncio event loop
+
+    pip install uvicorn
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Request bodies are received on the event loop and spooled (to memory up to
+SPOOL_MEMORY_BYTES, then to a temporary file written on the I/O pool)
+before the request reaches Flask, so a slow upload never holds a worker
+thread. Each request then runs start to finish on one thread of a bounded
+pool, where Flask's request context lives, and hands its response back
+through a short queue: ZIP and report streams go out chunk by chunk as
+they are produced, and a slow reader only pauses the thread producing for
+it. The loop itself never touches a file.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', 32))  # Requests running in Flask at once
+ASGI_IO_WORKERS = int(os.environ.get('ASGI_IO_WORKERS', 4))  # Threads writing spooled bodies
+SPOOL_MEMORY_BYTES = 1024 * 1024  # Bodies up to this size are never written to disk
+RESPONSE_QUEUE_CHUNKS = 8  # Response chunks buffered between Flask and the client
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class AsgiBridge:
+    """ASGI application running a WSGI app on a bounded thread pool"""
+
+    def __init__(self, wsgi_app, workers=ASGI_WORKERS, io_workers=ASGI_IO_WORKERS,
+                 max_body=None):
+        self.wsgi_app = wsgi_app
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asgi')
+        self.io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix='asgi-io')
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return  # No websockets here
+
+        length = self._content_length(scope)
+        if self.max_body is not None and length is not None and length > self.max_body:
+            await self._plain(send, 413, b'Request Entity Too Large')
+            return
+
+        loop = asyncio.get_running_loop()
+        try:
+            body, length = await self._spool(receive)
+        except ClientDisconnected:
+            return
+        if body is None:
+            await self._plain(send, 413, b'Request Entity Too Large')
+            return
+        try:
+            await self._respond(self._environ(scope, body, length), send)
+        finally:
+            await loop.run_in_executor(self.io_pool, body.close)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.pool.shutdown(wait=False)
+                self.io_pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    def _content_length(scope):
+        for name, value in scope['headers']:
+            if name == b'content-length':
+                try:
+                    return int(value)
+                except ValueError:
+                    return None
+        return None
+
+    @staticmethod
+    async def _plain(send, status, text):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/plain'), (b'content-length', str(len(text)).encode())]})
+        await send({'type': 'http.response.body', 'body': text})
+
+    async def _spool(self, receive):
+        """Receive the whole body; return (file positioned at 0, size), or (None, size) if too big"""
+        loop = asyncio.get_running_loop()
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+        size = 0
+        more = True
+        try:
+            while more:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    raise ClientDisconnected()
+                data = message.get('body', b'')
+                more = message.get('more_body', False)
+                if not data:
+                    continue
+                size += len(data)
+                if self.max_body is not None and size > self.max_body:
+                    body.close()
+                    return None, size
+                if size <= SPOOL_MEMORY_BYTES:
+                    body.write(data)  # Still in memory, nothing to wait for
+                else:
+                    await loop.run_in_executor(self.io_pool, body.write, data)
+        except BaseException:
+            await loop.run_in_executor(self.io_pool, body.close)
+            raise
+        body.seek(0)  # A rolled-over file only moves its offset here
+        return body, size
+
+    @staticmethod
+    def _environ(scope, body, length):
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'CONTENT_LENGTH': str(length),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        server = scope.get('server') or ('localhost', 80)
+        environ['SERVER_NAME'], environ['SERVER_PORT'] = server[0], str(server[1])
+        if scope.get('client'):
+            environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+        for name, value in scope['headers']:
+            name = name.decode('latin-1')
+            if name == 'content-length':
+                continue  # The spooled size is what Flask will read
+            key = 'CONTENT_TYPE' if name == 'content-type' else 'HTTP_' + name.upper().replace('-', '_')
+            value = value.decode('latin-1')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    async def _respond(self, environ, send):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(RESPONSE_QUEUE_CHUNKS)
+        aborted = threading.Event()
+
+        def put(item):
+            if aborted.is_set():
+                raise ClientDisconnected()
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def run():
+            # The whole request runs on this thread, so Flask's context never moves
+            status = []
+            started = False
+
+            def start_response(status_line, headers, exc_info=None):
+                status[:] = [status_line, headers]
+                return lambda data: write(data)
+
+            def write(data):
+                nonlocal started
+                if not started:
+                    put(('start', status))
+                    started = True
+                if data:
+                    put(('body', bytes(data)))
+
+            try:
+                result = self.wsgi_app(environ, start_response)
+                try:
+                    for chunk in result:
+                        write(chunk)
+                    write(b'')
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+            except ClientDisconnected:
+                pass
+            except BaseException as e:
+                put(('error', e))
+                return
+            put(('done', None))
+
+        future = loop.run_in_executor(self.pool, run)
+        finished = started = False
+        try:
+            while not finished:
+                kind, value = await queue.get()
+                if kind == 'start':
+                    status_line, headers = value
+                    await send({
+                        'type': 'http.response.start',
+                        'status': int(status_line.split(' ', 1)[0]),
+                        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+                    })
+                    started = True
+                elif kind == 'body':
+                    await send({'type': 'http.response.body', 'body': value, 'more_body': True})
+                elif kind == 'error':
+                    finished = True
+                    if started:
+                        raise value  # The server drops the connection; a truncated body must not look complete
+                    await self._plain(send, 500, b'Internal Server Error')
+                else:
+                    finished = True
+                    await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if not finished:
+                # The client went away: stop the producer and let it run down
+                aborted.set()
+                while not queue.empty() or not future.done():
+                    try:
+                        await asyncio.wait_for(queue.get(), 0.1)
+                    except asyncio.TimeoutError:
+                        pass
+            await future
+
+
+application = AsgiBridge(app, max_body=app.config['MAX_CONTENT_LENGTH'])
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('Serving over ASGI needs an ASGI server: pip install uvicorn')
+    uvicorn.run(application, host='0.0.0.0', port=5000)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Batch Rename
+Applies a rename mapping to a local directory in place, without the web app
+
+The files directly inside the directory play the part of the uploads:
+they are matched with the same planning the preview uses (rename_plan),
+then category A/T rows move into Active/ and Terminated/ subfolders and
+the rest are renamed where they are. Nothing is uploaded, copied or
+zipped. rename_cli.py is the command-line front end; execute_results is
+shared with the web app's execute.
+"""
+
+import os
+import secrets
+import tempfile
+
+from mapping_reader import ingest_mapping, load_mapping
+from rename_executor import DEFAULT_WORKERS, move_file, run_moves
+from rename_plan import FOLDERS, ROOT_FOLDER, build_plan, name_key
+from storage import clone_file
+
+EXECUTE_NOTES = {
+    'move': 'Renamed successfully',
+    'link': 'Linked under new name',
+    'virtual': 'Will be renamed in the download'
+}
+DRY_RUN_NOTE = 'Would be renamed'
+DIRECTORY_MODES = ('move', 'link')
+
+
+def execute_results(ready, errors, note):
+    """Turn ready plan rows and one error (or None) per row into results and a summary
+
+    note starts the notes of successful rows, e.g. EXECUTE_NOTES[mode].
+    """
+    results = []
+    summary = {'success': 0, 'failed': 0, 'total': 0, 'active': 0, 'terminated': 0, 'uncategorized': 0}
+    folder_counts = {'Active': 'active', 'Terminated': 'terminated'}
+    for row, error in zip(ready.itertuples(index=False), errors):
+        summary[folder_counts.get(row.folder, 'uncategorized')] += 1
+        if error is None:
+            results.append({
+                'status': 'success',
+                'current': row.current,
+                'new': row.new,
+                'category': row.category,
+                'folder': row.folder,
+                'notes': f'{note} → {row.folder} folder (was: {row.matched_file})'
+            })
+            summary['success'] += 1
+        else:
+            results.append({
+                'status': 'failed',
+                'current': row.current,
+                'new': row.new,
+                'category': row.category,
+                'folder': '',
+                'notes': f'Error: {str(error)}'
+            })
+            summary['failed'] += 1
+    summary['total'] = summary['success'] + summary['failed']
+    return results, summary
+
+
+def read_mapping(mapping_path):
+    """Load a mapping sheet (.xlsx, .xls, .csv or .tsv) as a DataFrame"""
+    extension = os.path.splitext(mapping_path)[1].lstrip('.').lower()
+    fd, parsed_path = tempfile.mkstemp(suffix='.pkl')
+    os.close(fd)
+    try:
+        ingest_mapping(mapping_path, extension, parsed_path)
+        return load_mapping(parsed_path)
+    finally:
+        os.remove(parsed_path)
+
+
+def list_files(directory):
+    """Names of the regular files directly inside directory"""
+    return [entry.name for entry in os.scandir(directory) if entry.is_file()]
+
+
+def plan_directory(mapping, directory):
+    """Plan a mapping DataFrame against the files in directory; return (plan, files)"""
+    files = list_files(directory)
+    return build_plan(mapping, set(files)), files
+
+
+def _is_plain_name(name):
+    return (name not in ('', '.', '..') and os.sep not in name
+            and not (os.altsep and os.altsep in name))
+
+
+def run_directory(plan, directory, files, mode='move', max_workers=DEFAULT_WORKERS, dry_run=False,
+                  on_done=None):
+    """Rename the plan's ready rows inside directory; return (results, summary)
+
+    files are the names the plan was built from. A new name that already
+    exists, in any case, and is not renamed away fails its row instead of
+    overwriting.
+    Uncategorized renames whose target is another row's source go through a
+    temporary name, so chains and swaps work however the threads interleave.
+    With dry_run every check runs but nothing is touched. on_done(count) is
+    called as rows finish.
+    """
+    if mode not in DIRECTORY_MODES:
+        raise ValueError(f'Unknown mode: {mode}')
+    ready = plan[plan['status'] == 'ready']
+    rows = list(ready.itertuples(index=False))
+    errors = [None] * len(rows)
+
+    # Files a ready row moves away free their names; in link mode nothing moves.
+    # Names are compared by name_key, as on a case-insensitive volume
+    moved = set() if mode == 'link' else {row.matched_file for row in rows}
+    occupied = {name_key(name) for name in files if name not in moved}
+    sources = {name_key(row.matched_file) for row in rows}
+    for folder in FOLDERS.values():
+        path = os.path.join(directory, folder)
+        if os.path.isdir(path):
+            occupied.update(name_key(f'{folder}/{name}') for name in list_files(path))
+
+    staged = []
+    direct = []
+    for index, row in enumerate(rows):
+        target = row.new if row.folder == ROOT_FOLDER else f'{row.folder}/{row.new}'
+        if not _is_plain_name(row.new):
+            errors[index] = ValueError(f'Invalid new name: {row.new}')
+        elif name_key(target) in occupied:
+            errors[index] = FileExistsError(f'Target already exists: {target}')
+        elif row.folder == ROOT_FOLDER and name_key(row.new) in sources and mode == 'move':
+            staged.append(index)
+        else:
+            direct.append(index)
+
+    if dry_run:
+        if on_done:
+            on_done(len(rows))
+        return execute_results(ready, errors, DRY_RUN_NOTE)
+
+    for folder in {rows[index].folder for index in direct} - {ROOT_FOLDER}:
+        os.makedirs(os.path.join(directory, folder), exist_ok=True)
+
+    def path(*parts):
+        return os.path.join(directory, *parts)
+
+    def target_path(row):
+        return path(row.new) if row.folder == ROOT_FOLDER else path(row.folder, row.new)
+
+    tick = (lambda _: on_done(1)) if on_done else None
+
+    # Straight moves (and links) first, in parallel
+    moves = [(path(rows[index].matched_file), target_path(rows[index])) for index in direct]
+    for index, error in zip(direct, run_moves(moves, max_workers=max_workers, on_done=tick,
+                                              move=None if mode == 'move' else clone_file,
+                                              unique_sources=(mode == 'move'))):
+        errors[index] = error
+
+    # Then chained renames: every source to a temporary name, then each into place
+    token = secrets.token_hex(4)
+    temporary = {index: path(f'.renaming-{token}-{index}') for index in staged}
+    first = run_moves([(path(rows[index].matched_file), temporary[index]) for index in staged],
+                      max_workers=max_workers, move=move_file)
+    parked = [index for index, error in zip(staged, first) if error is None]
+    for index, error in zip(staged, first):
+        if error is not None:
+            errors[index] = error
+            if tick:
+                tick(index)
+    second = run_moves([(temporary[index], target_path(rows[index])) for index in parked],
+                       max_workers=max_workers, on_done=tick, move=move_file)
+    for index, error in zip(parked, second):
+        if error is not None:
+            errors[index] = error
+            try:
+                move_file(temporary[index], path(rows[index].matched_file))
+            except OSError:
+                pass  # Left under its temporary name; the error reports the row
+
+    return execute_results(ready, errors, EXECUTE_NOTES[mode])
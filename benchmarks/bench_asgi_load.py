@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+ASGI Load Test
+Runs many parallel sessions through asgi.application (upload mapping, chunked
+uploads, preview, execute, ZIP download, report) and measures request
+latency and event loop lag, then repeats with slow uploaders trickling large
+bodies in to show they hold no worker threads
+
+Requests go straight to the ASGI callable, so no server or HTTP client is
+needed; everything from the adapter down is exercised.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+
+class Client:
+    """One browser session: keeps the session cookie and times each request"""
+
+    def __init__(self, application, timings):
+        self.application = application
+        self.timings = timings
+        self.cookie = None
+
+    async def request(self, method, path, body=b'', content_type=None, pieces=1, delay=0.0):
+        path, _, query = path.partition('?')
+        headers = [(b'host', b'bench'), (b'content-length', str(len(body)).encode())]
+        if content_type:
+            headers.append((b'content-type', content_type.encode()))
+        if self.cookie:
+            headers.append((b'cookie', self.cookie.encode()))
+        scope = {'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http',
+                 'path': path, 'root_path': '', 'query_string': query.encode(),
+                 'headers': headers, 'server': ('bench', 80), 'client': ('127.0.0.1', 1)}
+
+        step = max(1, -(-len(body) // pieces))
+        parts = [body[i:i + step] for i in range(0, len(body), step)] or [b'']
+
+        async def receive():
+            if delay:
+                await asyncio.sleep(delay)
+            data = parts.pop(0)
+            return {'type': 'http.request', 'body': data, 'more_body': bool(parts)}
+
+        response = {'status': None, 'body': bytearray()}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                for name, value in message['headers']:
+                    if name == b'set-cookie':
+                        self.cookie = value.decode().split(';', 1)[0]
+            else:
+                response['body'] += message.get('body', b'')
+
+        started = time.perf_counter()
+        await self.application(scope, receive, send)
+        self.timings.append(time.perf_counter() - started)
+        if response['status'] != 200:
+            raise RuntimeError(f'{method} {path}: HTTP {response["status"]}')
+        return bytes(response['body'])
+
+    async def json(self, *args, **kwargs):
+        data = json.loads(await self.request(*args, **kwargs))
+        if not data.get('success', True):
+            raise RuntimeError(f'{args[1]}: {data.get("error")}')
+        return data
+
+
+def multipart(field, filename, data):
+    boundary = 'bench' + secrets.token_hex(8)
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+async def run_session(application, timings, files, file_size, index):
+    client = Client(application, timings)
+    await client.request('GET', '/')
+
+    rows = '\n'.join(f's{index}_f{i}.pdf,s{index}_new{i}.pdf,{"AT"[i % 2]}' for i in range(files))
+    body, content_type = multipart('excel', 'map.csv', f'current,new,category\n{rows}\n'.encode())
+    await client.json('POST', '/upload_excel', body, content_type)
+
+    for i in range(files):
+        data = os.urandom(file_size)
+        upload = await client.json('POST', '/uploads', json.dumps({'filename': f's{index}_f{i}.pdf', 'size': file_size}).encode(),
+                                   'application/json')
+        for offset in range(0, file_size, upload['chunk_size']):
+            await client.json('PUT', f'/uploads/{upload["upload_id"]}?offset={offset}',
+                              data[offset:offset + upload['chunk_size']], 'application/octet-stream')
+        await client.json('POST', f'/uploads/{upload["upload_id"]}/complete')
+
+    preview = await client.json('POST', '/preview')
+    assert preview['summary']['ready'] == files, preview['summary']
+    result = await client.json('POST', '/execute')
+    assert result['summary']['success'] == files, result['summary']
+    archive = await client.request('GET', '/download')
+    assert archive[:2] == b'PK'
+    await client.request('GET', '/download_report?format=csv&source=execute')
+
+
+async def slow_upload(application, timings, size, pieces, delay):
+    client = Client(application, [])
+    await client.request('GET', '/')
+    body, content_type = multipart('files[]', 'slow.bin', os.urandom(size))
+    client.timings = timings
+    await client.json('POST', '/upload_files', body, content_type, pieces=pieces, delay=delay)
+
+
+async def watch_loop(lags, stop, interval=0.01):
+    """Record how late each timer tick fires; a blocked loop shows up here"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run_phase(application, sessions, files, file_size, slow_clients=0, slow_size=0, slow_delay=0.0):
+    timings, slow_timings, lags = [], [], []
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(lags, stop))
+    started = time.perf_counter()
+    tasks = [run_session(application, timings, files, file_size, i) for i in range(sessions)]
+    tasks += [slow_upload(application, slow_timings, slow_size, 64, slow_delay) for _ in range(slow_clients)]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await watcher
+    return elapsed, timings, slow_timings, lags
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(label, elapsed, timings, lags):
+    print(f'{label}')
+    print(f'  {len(timings)} requests in {elapsed:.2f}s ({len(timings) / elapsed:.0f} req/s)')
+    print(f'  latency p50 {percentile(timings, 0.5) * 1000:.1f}ms  p95 {percentile(timings, 0.95) * 1000:.1f}ms'
+          f'  p99 {percentile(timings, 0.99) * 1000:.1f}ms')
+    print(f'  event loop lag mean {statistics.mean(lags) * 1000:.2f}ms  max {max(lags) * 1000:.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sessions', type=int, default=32)
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--file-size', type=int, default=64 * 1024)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--slow-clients', type=int, default=32)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='bench_asgi_')
+    os.chdir(folder)  # The app keeps its temp/ and cache/ folders relative to here
+    try:
+        os.environ['ASGI_WORKERS'] = str(args.workers)
+        import asgi
+
+        print(f'{args.sessions} sessions x {args.files} files of {args.file_size // 1024}KB, '
+              f'{args.workers} worker threads')
+        elapsed, timings, _, lags = asyncio.run(
+            run_phase(asgi.application, args.sessions, args.files, args.file_size))
+        report('Parallel sessions', elapsed, timings, lags)
+
+        # More slow uploaders than worker threads: each trickles 4MB in 64
+        # pieces over ~2s. A thread-per-request server would have every
+        # thread stuck reading them; here they only occupy the loop
+        elapsed, timings, slow_timings, lags = asyncio.run(
+            run_phase(asgi.application, args.sessions, args.files, args.file_size,
+                      slow_clients=args.slow_clients, slow_size=4 * 1024 * 1024, slow_delay=0.03))
+        report(f'Parallel sessions + {args.slow_clients} slow uploaders', elapsed, timings, lags)
+        print(f'  slow uploads finished in {min(slow_timings):.2f}-{max(slow_timings):.2f}s')
+    finally:
+        os.chdir(REPO)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Duplicate Name Benchmark
+Times dedupe_new_names on a large mapping built to collide (repeats
+differing only in case, rows already named like a suffixed duplicate and
+existing files in the way) against the old repeat-count suffixing.
+tests/test_dedupe.py checks its guarantees.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rename_plan import dedupe_new_names, name_key
+
+
+def counting_dedupe(new):
+    """The old suffixing: (n) from a per-name repeat count, exact names only"""
+    counter = new.groupby(new, sort=False).cumcount()
+    dup = counter > 0
+    base, ext = zip(*map(os.path.splitext, new[dup])) if dup.any() else ((), ())
+    unique = new.copy()
+    unique[dup] = [f'{b} ({k}){e}' for b, k, e in zip(base, counter[dup], ext)]
+    return unique
+
+
+def make_names(rng, rows, stems, duplicate_ratio=0.05):
+    """rows new names over stems distinct bases, with case repeats and suffixed names mixed in"""
+    names = []
+    for _ in range(rows):
+        stem = f'WD_{rng.randrange(stems):07d}'
+        roll = rng.random()
+        if roll < duplicate_ratio / 2:
+            stem = stem.lower()
+        elif roll < duplicate_ratio:
+            stem = f'{stem} ({rng.randint(1, 3)})'
+        names.append(stem + rng.choice(['.pdf', '.pdf', '.pdf', '.PDF', '']))
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    new = pd.Series(make_names(rng, args.rows, int(args.rows * 0.95)), dtype=object)
+    existing = make_names(rng, args.rows // 10, args.rows)
+    for label, fn in (('counting (exact, unchecked)', lambda: counting_dedupe(new)),
+                      ('allocator', lambda: dedupe_new_names(new, existing))):
+        start = time.perf_counter()
+        unique = fn()
+        elapsed = time.perf_counter() - start
+        keys = unique.map(name_key)
+        suffixed = unique != new
+        taken = keys.isin({name_key(name) for name in existing})
+        clashes = int(keys.duplicated().sum() + (suffixed & taken).sum())
+        print(f'{label:<28} {elapsed:>7.3f}s {args.rows / elapsed:>12,.0f} rows/s '
+              f'{int(suffixed.sum()):>8,} suffixed {clashes:>8,} clashing outputs')
+
+
+if __name__ == '__main__':
+    main()
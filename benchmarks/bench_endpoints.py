@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Endpoint Benchmark Suite
+Drives upload_excel, upload_files, preview, execute, download and
+download_report through Flask's test client on synthetic corpora and
+reports throughput, latency percentiles and peak memory as JSON
+
+Each scale generates a mapping sheet and a file corpus from a fixed seed,
+so runs on different commits see identical input:
+
+    python benchmarks/bench_endpoints.py --scales small,medium -o before.json
+    (change something)
+    python benchmarks/bench_endpoints.py --scales small,medium -o after.json --compare before.json
+
+Every repeat is a fresh session. Timed repeats run without memory tracing;
+one extra untimed pass per scale runs under tracemalloc to get each
+endpoint's peak Python allocation (numpy and pandas buffers included).
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from werkzeug.test import EnvironBuilder
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+# rows, files, mean file size, duplicate ratio, mismatch ratio
+SCALES = {
+    'small': dict(rows=1_000, files=1_000, file_size=4 * 1024, duplicate_ratio=0.05, mismatch_ratio=0.1),
+    'medium': dict(rows=10_000, files=10_000, file_size=4 * 1024, duplicate_ratio=0.05, mismatch_ratio=0.1),
+    'large': dict(rows=100_000, files=50_000, file_size=2 * 1024, duplicate_ratio=0.05, mismatch_ratio=0.2),
+    'big-files': dict(rows=200, files=200, file_size=2 * 1024 * 1024, duplicate_ratio=0.0, mismatch_ratio=0.0),
+}
+UPLOAD_BATCH_BYTES = 32 * 1024 * 1024  # Per /upload_files request, well under MAX_CONTENT_LENGTH
+UPLOAD_BATCH_FILES = 500
+REPORT_FORMATS = ('csv', 'txt', 'xlsx')
+EXTENSIONS = ['.pdf', '.pdf', '.pdf', '.docx', '.jpg', '.txt']  # Mostly already-compressed types
+TEXT = b'employee record terminated active report 2024 department '
+REGRESSION_THRESHOLD = 1.10  # Flag endpoints whose p50 grew by more than 10%
+
+
+class Corpus:
+    """A synthetic mapping and the uploads that go with it
+
+    duplicate_ratio of the rows reuse an earlier row's new name (the plan
+    auto-suffixes them); mismatch_ratio of the rows name a source that is
+    not uploaded. Uploads beyond the matched rows are files the mapping
+    does not mention.
+    """
+
+    def __init__(self, rows, files, file_size, duplicate_ratio, mismatch_ratio, seed=0):
+        rng = random.Random(seed)
+        self.file_size = file_size
+        self.seed = seed
+        self.current = [f'employee_{i:07d}{rng.choice(EXTENSIONS)}' for i in range(rows)]
+        self.new = [f'WD_{i:07d}{os.path.splitext(name)[1]}' for i, name in enumerate(self.current)]
+        for i in rng.sample(range(1, rows), int((rows - 1) * duplicate_ratio)) if rows > 1 else []:
+            self.new[i] = self.new[rng.randrange(i)]
+        self.category = [rng.choice(['A', 'A', 'T', 'T', '']) for _ in range(rows)]
+
+        missing = set(rng.sample(range(rows), int(rows * mismatch_ratio)))
+        uploads = [name for i, name in enumerate(self.current) if i not in missing][:files]
+        uploads += [f'unmapped_{i:07d}.pdf' for i in range(files - len(uploads))]
+        self.uploads = uploads
+        self.sizes = [max(1, int(file_size * rng.uniform(0.5, 1.5))) for _ in uploads]
+
+    @property
+    def rows(self):
+        return len(self.current)
+
+    def mapping_sheet(self, extension, marker):
+        """Mapping file bytes; marker adds one unmatched row so each repeat misses the mapping cache"""
+        rows = list(zip(self.current, self.new, self.category))
+        rows.append((f'{marker}.pdf', f'{marker}_new.pdf', ''))
+        if extension == 'csv':
+            lines = ['current,new,category'] + [f'{c},{n},{k}' for c, n, k in rows]
+            return ('\n'.join(lines) + '\n').encode()
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(['current', 'new', 'category'])
+        for row in rows:
+            sheet.append(row)
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+
+    def file_data(self, index):
+        """Deterministic content: random bytes, or repetitive text for .txt"""
+        size = self.sizes[index]
+        if self.uploads[index].endswith('.txt'):
+            return (TEXT * (size // len(TEXT) + 1))[:size]
+        return random.Random(self.seed * 1_000_003 + index).randbytes(size)
+
+    def upload_batches(self):
+        batch, batch_bytes = [], 0
+        for index, name in enumerate(self.uploads):
+            batch.append(index)
+            batch_bytes += self.sizes[index]
+            if len(batch) >= UPLOAD_BATCH_FILES or batch_bytes >= UPLOAD_BATCH_BYTES:
+                yield batch
+                batch, batch_bytes = [], 0
+        if batch:
+            yield batch
+
+
+class Recorder:
+    """Latencies and work done per endpoint; optional tracemalloc peaks"""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.latencies = {}
+        self.work = {}
+        self.peaks = {}
+
+    def call(self, endpoint, send, units=lambda response: 0):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        response = send()
+        body = response.get_data()  # Streamed bodies are produced here
+        response.close()
+        elapsed = time.perf_counter() - started
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            self.peaks[endpoint] = max(self.peaks.get(endpoint, 0), peak)
+        if response.status_code != 200:
+            raise RuntimeError(f'{endpoint}: HTTP {response.status_code}')
+        if response.mimetype == 'application/json':
+            data = json.loads(body)
+            if not data.get('success', True):
+                raise RuntimeError(f'{endpoint}: {data.get("error")}')
+        self.latencies.setdefault(endpoint, []).append(elapsed)
+        self.work[endpoint] = self.work.get(endpoint, 0) + units(body)
+        return body
+
+
+def prepared(client, method, path, data=None):
+    """Encode a request up front so building a large multipart body is not timed"""
+    builder = EnvironBuilder(path=path, method=method, data=data)
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    return lambda: client.open(environ)
+
+
+def run_session(app, corpus, recorder, mapping_extension, marker):
+    client = app.test_client()
+    client.get('/').close()
+    sheet = corpus.mapping_sheet(mapping_extension, marker)
+
+    recorder.call('upload_excel', prepared(client, 'POST', '/upload_excel',
+                                           {'excel': (io.BytesIO(sheet), f'mapping.{mapping_extension}')}),
+                  units=lambda body: corpus.rows + 1)
+
+    for batch in corpus.upload_batches():
+        files = [(io.BytesIO(corpus.file_data(i)), corpus.uploads[i]) for i in batch]
+        size = sum(corpus.sizes[i] for i in batch)
+        recorder.call('upload_files', prepared(client, 'POST', '/upload_files', {'files[]': files}),
+                      units=lambda body, size=size: size)
+
+    body = recorder.call('preview', lambda: client.post('/preview'), units=lambda body: corpus.rows + 1)
+    ready = json.loads(body)['summary']['ready']
+    body = recorder.call('execute', lambda: client.post('/execute'), units=lambda body: ready)
+    summary = json.loads(body)['summary']
+    if summary['success'] != ready:
+        raise RuntimeError(f'execute renamed {summary["success"]} of {ready} ready rows')
+
+    archive = recorder.call('download', lambda: client.get('/download'), units=len)
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        if len(z.namelist()) < summary['active'] + summary['terminated']:
+            raise RuntimeError('download is missing renamed files')
+    for report_format in REPORT_FORMATS:
+        recorder.call(f'download_report.{report_format}',
+                      lambda: client.get(f'/download_report?format={report_format}&source=execute'),
+                      units=lambda body: corpus.rows + 1)
+    client.post('/reset').close()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(recorder, memory):
+    units = {'upload_files': 'bytes', 'download': 'bytes'}
+    endpoints = {}
+    for endpoint, values in recorder.latencies.items():
+        total = sum(values)
+        unit = units.get(endpoint, 'rows')
+        endpoints[endpoint] = {
+            'requests': len(values),
+            'seconds': round(total, 4),
+            'requests_per_second': round(len(values) / total, 2),
+            f'{unit}_per_second': round(recorder.work[endpoint] / total, 1),
+            'p50_ms': round(percentile(values, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(max(values) * 1000, 2),
+            'peak_alloc_mb': round(memory.peaks.get(endpoint, 0) / 2 ** 20, 2) if memory else None,
+        }
+    return endpoints
+
+
+def max_rss_mb():
+    # Linux reports KB, macOS bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+def run_scale(app, name, params, repeat, mapping_extension, trace_memory):
+    corpus = Corpus(**params)
+    recorder = Recorder()
+    for i in range(repeat):
+        run_session(app, corpus, recorder, mapping_extension, f'{name}_repeat_{i}')
+
+    memory = None
+    if trace_memory:
+        memory = Recorder(trace_memory=True)
+        tracemalloc.start()
+        try:
+            run_session(app, corpus, memory, mapping_extension, f'{name}_memory')
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'name': name,
+        'params': dict(params, uploads=len(corpus.uploads), upload_bytes=sum(corpus.sizes)),
+        'repeat': repeat,
+        'endpoints': summarize(recorder, memory),
+        'max_rss_mb': max_rss_mb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    """Print p50 and throughput changes against an earlier run"""
+    with open(baseline_path) as f:
+        previous = json.load(f)
+    baseline = {scale['name']: scale for scale in previous['scales']}
+    print(f"Compared with {baseline_path} (commit {previous.get('commit')}):", file=sys.stderr)
+    if previous.get('mapping_format') != current['mapping_format']:
+        print(f"  note: baseline used {previous.get('mapping_format')} mappings", file=sys.stderr)
+    regressions = 0
+    for scale in current['scales']:
+        before = baseline.get(scale['name'])
+        if before is None:
+            continue
+        for endpoint, now in scale['endpoints'].items():
+            then = before['endpoints'].get(endpoint)
+            if not then:
+                continue
+            ratio = now['p50_ms'] / then['p50_ms'] if then['p50_ms'] else 1.0
+            flag = '  REGRESSION' if ratio > REGRESSION_THRESHOLD else ''
+            regressions += bool(flag)
+            print(f"  {scale['name']:>9} {endpoint:<22} p50 {then['p50_ms']:>9.1f}ms -> {now['p50_ms']:>9.1f}ms "
+                  f"({ratio:.2f}x){flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scales', default='small,medium', help=f'Comma-separated, from {", ".join(SCALES)}')
+    parser.add_argument('--rows', type=int, help='Run one custom scale with this many mapping rows')
+    parser.add_argument('--files', type=int, help='Uploads in the custom scale (default: rows)')
+    parser.add_argument('--file-size', type=int, default=4 * 1024, help='Mean upload size in the custom scale')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.05)
+    parser.add_argument('--mismatch-ratio', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=3, help='Timed sessions per scale')
+    parser.add_argument('--mapping-format', choices=('xlsx', 'csv'), default='xlsx')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc pass')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='Write the JSON here instead of stdout')
+    parser.add_argument('--compare', help='Earlier JSON output to compare p50 latencies against')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    if args.rows:
+        scales = {'custom': dict(rows=args.rows, files=args.files or args.rows, file_size=args.file_size,
+                                 duplicate_ratio=args.duplicate_ratio, mismatch_ratio=args.mismatch_ratio)}
+    else:
+        scales = {name: SCALES[name] for name in args.scales.split(',')}
+
+    folder = tempfile.mkdtemp(prefix='bench_endpoints_')
+    os.chdir(folder)  # The app keeps its temp/ and cache/ folders relative to here
+    try:
+        from app import app, sweeper
+        sweeper.stop()  # Keep background sweeps out of the timings
+        app.config['TESTING'] = True
+
+        results = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'mapping_format': args.mapping_format,
+            'scales': []
+        }
+        for name, params in scales.items():
+            print(f'{name}: {params}', file=sys.stderr)
+            results['scales'].append(run_scale(app, name, dict(params, seed=args.seed), args.repeat,
+                                               args.mapping_format, not args.no_memory))
+    finally:
+        os.chdir(REPO)
+        shutil.rmtree(folder, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if baseline:
+        regressions = compare(results, baseline)
+        print(f'{regressions} endpoint(s) over {REGRESSION_THRESHOLD:.2f}x slower at p50', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
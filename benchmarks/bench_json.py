@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Result Payload Benchmark
+Compares the row-dict JSON that jsonify produced for preview and execute
+results with the columnar layout and encoder in responses.py: payload size
+raw and compressed, and the time to encode, serialize and compress
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import responses
+from batch_rename import EXECUTE_NOTES, execute_results
+from bench_plan import make_corpus
+from rename_plan import build_plan, plan_results, summarize_plan
+
+
+def best_time(fn, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def payloads(rows):
+    mapping, uploaded = make_corpus(rows)
+    plan = build_plan(mapping, uploaded)
+    preview = {'success': True, 'results': plan_results(plan), 'summary': summarize_plan(plan)}
+    ready = plan[plan['status'] == 'ready']
+    results, summary = execute_results(ready, [None] * len(ready), EXECUTE_NOTES['move'])
+    execute = {'success': True, 'results': results, 'summary': summary, 'mode': 'move'}
+    return {'preview (all rows)': preview, 'execute': execute}
+
+
+def measure(payload, repeat):
+    """Return rows of (variant, encode+serialize seconds, body) for one payload"""
+    app = Flask(__name__)
+    with app.app_context():
+        before, body = best_time(lambda: app.json.response(payload).get_data(), repeat)
+    variants = [('jsonify, row dicts', before, body)]
+
+    orjson = responses.orjson
+    for label, encoder in (('columnar + orjson', orjson), ('columnar + json', None)):
+        if label.endswith('orjson') and orjson is None:
+            continue
+        responses.orjson = encoder
+        try:
+            seconds, body = best_time(lambda: responses.dumps(responses.compact_payload(payload)), repeat)
+        finally:
+            responses.orjson = orjson
+        variants.append((label, seconds, body))
+    return variants
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    encodings = ['gzip'] + (['br'] if responses.brotli is not None else [])
+    print(f'{args.rows:,} mapping rows; orjson {"on" if responses.orjson else "not installed"}, '
+          f'brotli {"on" if responses.brotli else "not installed"}')
+    for name, payload in payloads(args.rows).items():
+        print(f'\n{name}: {len(payload["results"]):,} result rows')
+        header = f"{'VARIANT':<20} {'SERIALIZE':>10} {'RAW':>10}"
+        for encoding in encodings:
+            header += f" {encoding.upper():>10} {'TIME':>8}"
+        print(header)
+        for label, seconds, body in measure(payload, args.repeat):
+            line = f'{label:<20} {seconds * 1000:>8.1f}ms {len(body) / 1e6:>8.2f}MB'
+            for encoding in encodings:
+                compress_time, compressed = best_time(lambda: responses.compress(body, encoding), args.repeat)
+                line += f' {len(compressed) / 1e6:>8.2f}MB {compress_time * 1000:>6.0f}ms'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Match Index Benchmark
+Measures suggestion index build time, lookups per second for unmatched
+names, and how often the misspelled upload is the first or among the top
+TOP_K suggestions
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from match_index import SuggestionIndex
+
+SIZES = [1_000, 10_000, 100_000]
+QUERIES = 200  # One preview page of unmatched rows
+TOP_K = 3  # Suggestions shown per row (attach_suggestions)
+
+
+def make_queries(files, count, seed=0):
+    """Misspell uploaded names by dropping one character from the stem
+
+    Returns (query, uploaded name) pairs.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for name in rng.sample(files, count):
+        stem, ext = os.path.splitext(name)
+        i = rng.randrange(len(stem))
+        queries.append((stem[:i] + stem[i + 1:] + ext, name))
+    return queries
+
+
+def main():
+    print(f"{'FILES':>10}  {'BUILD SEC':>10}  {'LOOKUPS/SEC':>12}  {'TOP-1':>7}  {'TOP-' + str(TOP_K):>7}")
+    for size in SIZES:
+        files = [f'employee_{i:07d}_record.pdf' for i in range(size)]
+        queries = make_queries(files, min(QUERIES, size))
+
+        start = time.perf_counter()
+        index = SuggestionIndex(files)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        suggestions = [index.suggest(query, k=TOP_K) for query, _ in queries]
+        lookup = time.perf_counter() - start
+
+        # A hit only if the upload the query was made from is suggested
+        first = sum(found[:1] == [source] for found, (_, source) in zip(suggestions, queries))
+        top_k = sum(source in found for found, (_, source) in zip(suggestions, queries))
+        print(f"{size:>10}  {build:>10.4f}  {len(queries) / lookup:>12,.0f}  "
+              f"{first / len(queries):>7.0%}  {top_k / len(queries):>7.0%}")
+
+
+if __name__ == '__main__':
+    main()
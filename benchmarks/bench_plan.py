@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Rename Plan Benchmark
+Measures build_plan throughput (rows/second) on synthetic mappings
+"""
+
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rename_plan import build_plan, summarize_plan
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def make_corpus(rows, seed=0):
+    """Build a mapping with ~10% missing sources and ~5% duplicate targets"""
+    rng = random.Random(seed)
+    current = [f'employee_{i:07d}.pdf' for i in range(rows)]
+    new = [f'WD_{i:07d}.pdf' for i in range(rows)]
+    for i in rng.sample(range(rows), rows // 20):
+        new[i] = new[rng.randrange(rows)]
+    uploaded = set(current)
+    for name in rng.sample(current, rows // 10):
+        uploaded.discard(name)
+    # Some uploads only match by base name
+    for name in rng.sample(sorted(uploaded), rows // 20):
+        uploaded.discard(name)
+        uploaded.add(name.replace('.pdf', '.PDF'))
+    mapping = pd.DataFrame({
+        'current': current,
+        'new': new,
+        'category': [rng.choice(['A', 'T', '']) for _ in range(rows)]
+    })
+    return mapping, uploaded
+
+
+def bench(rows, repeat=3):
+    mapping, uploaded = make_corpus(rows)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plan = build_plan(mapping, uploaded)
+        summarize_plan(plan)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'ROWS':>10}  {'SECONDS':>10}  {'ROWS/SEC':>12}")
+    for rows in SIZES:
+        elapsed = bench(rows)
+        print(f"{rows:>10}  {elapsed:>10.4f}  {rows / elapsed:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Incremental Preview Benchmark
+Times PreviewModel.update for small edits to a large batch and checks every
+updated plan against a full build_plan of the same inputs
+"""
+
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_plan import make_corpus
+from preview_model import PreviewModel
+from rename_plan import PLAN_COLUMNS, build_plan, listing_fingerprint, summarize_plan
+
+ROWS = 100_000
+STEPS = 30
+
+
+def random_name(rng, rows):
+    """A name likely to interact with the batch: a source, a target or a variant"""
+    i = rng.randrange(rows)
+    return rng.choice([
+        f'employee_{i:07d}.pdf',
+        f'employee_{i:07d}.PDF',
+        f'Employee {i:07d}.pdf',
+        f'employee_{i:07d}.docx',
+        f'WD_{i:07d}.pdf',
+        f'wd_{i:07d}.PDF',
+        f'WD_{i:07d} (1).pdf',
+    ])
+
+
+def random_delta(rng, mapping, files):
+    """Mutate files in place; return (mapping, added, removed, mapping_changed)"""
+    rows = len(mapping)
+    added, removed = [], []
+    kind = rng.choice(['files', 'rows', 'append', 'mixed'])
+    if kind in ('files', 'mixed'):
+        for _ in range(rng.randint(1, 5)):
+            if files and rng.random() < 0.4:
+                name = rng.choice(sorted(files))
+                del files[name]
+                removed.append(name)
+            else:
+                name = random_name(rng, rows)
+                files[name] = (rng.randrange(1, 10_000), time.time_ns())
+                added.append((name, *files[name]))
+    mapping_changed = kind in ('rows', 'append', 'mixed')
+    if kind in ('rows', 'mixed'):
+        for _ in range(rng.randint(1, 10)):
+            i = rng.randrange(rows)
+            column = rng.choice(['current', 'new', 'category'])
+            if column == 'category':
+                mapping.at[i, column] = rng.choice(['A', 'T', ''])
+            else:
+                mapping.at[i, column] = random_name(rng, rows)
+    if kind == 'append':
+        extra = pd.DataFrame({
+            'current': [random_name(rng, rows) for _ in range(3)],
+            'new': [random_name(rng, rows) for _ in range(3)],
+            'category': ['A', 'T', ''],
+        })
+        mapping = pd.concat([mapping, extra], ignore_index=True)
+    return mapping, added, removed, mapping_changed
+
+
+def check(model, mapping, files):
+    plan = build_plan(mapping, set(files))
+    actual = model.plan[PLAN_COLUMNS].reset_index(drop=True).astype(object)
+    expected = plan[PLAN_COLUMNS].astype(object)
+    if not actual.fillna('<none>').equals(expected.fillna('<none>')):
+        diff = (actual.fillna('<none>') != expected.fillna('<none>')).any(axis=1)
+        raise AssertionError(f'plan mismatch in rows {list(diff[diff].index[:5])}')
+    if model.summary != summarize_plan(plan):
+        raise AssertionError(f'summary mismatch: {model.summary} != {summarize_plan(plan)}')
+
+
+def main():
+    rng = random.Random(1)
+    mapping, uploaded = make_corpus(ROWS)
+    files = {name: (1, 0) for name in uploaded}
+    listing = [(name, *stat) for name, stat in files.items()]
+
+    start = time.perf_counter()
+    plan = build_plan(mapping, uploaded)
+    print(f'full build: {time.perf_counter() - start:.3f}s for {ROWS:,} rows')
+    model = PreviewModel(plan, listing, (0, 0))
+    start = time.perf_counter()
+    model.prepare()
+    print(f'index build (once, in the background): {time.perf_counter() - start:.3f}s')
+
+    timings = {'files only': [], 'mapping rows': []}
+    for step in range(STEPS):
+        mapping, added, removed, mapping_changed = random_delta(rng, mapping, files)
+        model.note_files(added, removed)
+        start = time.perf_counter()
+        touched = model.update(mapping if mapping_changed else None, (step, step))
+        timings['mapping rows' if mapping_changed else 'files only'].append(time.perf_counter() - start)
+        if touched is None:
+            raise AssertionError('small delta fell back to a full rebuild')
+        check(model, mapping, files)
+
+    # The maintained digest must agree with hashing the listing from scratch
+    listing = [(name, *stat) for name, stat in files.items()]
+    mapping_path = os.path.abspath(__file__)
+    st = os.stat(mapping_path)
+    model.mapping_stat = (st.st_size, st.st_mtime_ns)
+    assert model.fingerprint == listing_fingerprint(listing, mapping_path)
+
+    for kind, values in timings.items():
+        values.sort()
+        print(f'update ({kind}): median {values[len(values) // 2] * 1000:.1f}ms, '
+              f'max {values[-1] * 1000:.1f}ms over {len(values)} deltas')
+    print('all updated plans and summaries match a full rebuild')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+ZIP Compression Benchmark
+Compares deflate-everything against the compression policy, serial and parallel,
+on a mixed corpus of already-compressed and compressible files
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zipstream import CHUNK_SIZE, CompressionPolicy, stream_zip, stream_zip_parallel
+
+FILES = 200
+WORDS = [b'employee', b'record', b'terminated', b'active', b'2024', b'report', b'id', b'name']
+
+
+def make_corpus(folder, files=FILES, seed=0):
+    """Write a mix like real uploads: mostly PDFs/JPEGs/DOCX, some text, some unknown"""
+    rng = random.Random(seed)
+    kinds = ['.pdf'] * 4 + ['.jpg'] * 2 + ['.docx'] + ['.txt', '.csv'] + ['.dat']
+    paths = []
+    for i in range(files):
+        ext = rng.choice(kinds)
+        size = rng.randint(100 * 1024, 2 * 1024 * 1024)
+        if ext in ('.txt', '.csv'):
+            data = b' '.join(rng.choice(WORDS) for _ in range(size // 7))[:size]
+        else:
+            data = rng.randbytes(size)  # Stands in for already-compressed content
+        path = os.path.join(folder, f'file_{i:04d}{ext}')
+        with open(path, 'wb') as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+
+def file_chunks(path):
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(CHUNK_SIZE), b'')
+
+
+def measure(archive):
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in archive)
+    return time.perf_counter() - start, size
+
+
+def main():
+    folder = tempfile.mkdtemp(prefix='bench_zip_')
+    try:
+        paths = make_corpus(folder)
+        total = sum(os.path.getsize(p) for p in paths)
+        entries = [(p, os.path.basename(p)) for p in paths]
+
+        def parallel_entries():
+            return ((lambda p=p: file_chunks(p), name, os.path.getsize(p), None) for p, name in entries)
+
+        cases = [
+            ('deflate all (before)', lambda: stream_zip(entries)),
+            ('policy, 1 worker', lambda: stream_zip_parallel(parallel_entries(), CompressionPolicy(), 1)),
+            (f'policy, parallel ({os.cpu_count()})', lambda: stream_zip_parallel(parallel_entries(), CompressionPolicy())),
+        ]
+
+        print(f'{len(paths)} files, {total / 1e6:.1f} MB')
+        print(f"{'CASE':<24}  {'SECONDS':>8}  {'MB/SEC':>8}  {'ARCHIVE MB':>10}")
+        for label, build in cases:
+            elapsed, size = measure(build())
+            print(f'{label:<24}  {elapsed:>8.3f}  {total / 1e6 / elapsed:>8.1f}  {size / 1e6:>10.1f}')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
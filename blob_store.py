@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Blob Store
+Uploaded content stored once by SHA-256 and shared by every session
+
+Blobs live under blobs/<first two hex digits>/<sha256> in the storage
+backend, and sessions only keep name -> hash references in their upload
+manifest. The same document uploaded again, under any name or in any
+session, takes the space of one copy, and a client that sends hashes
+first can skip the bytes the server already has.
+
+Unreferenced blobs are collected by sweep(). Code that finds or stores a
+blob and then records a reference to it does both inside references(), so
+a sweep never deletes a blob between the two steps.
+"""
+
+import os
+import secrets
+import string
+import threading
+import time
+from contextlib import contextmanager
+
+from hashing import HashingReader, hash_file
+
+BLOB_PREFIX = 'blobs'
+INCOMING_PREFIX = 'blobs/incoming'  # Streams land here until their hash is known
+SWEEP_MIN_AGE = 60 * 60  # Seconds a blob or incoming file is left alone after it is written
+
+
+def blob_key(sha256):
+    return f'{BLOB_PREFIX}/{sha256[:2]}/{sha256}'
+
+
+def is_sha256(value):
+    return isinstance(value, str) and len(value) == 64 and all(c in string.hexdigits for c in value)
+
+
+def _flock(f, exclusive):
+    try:
+        import fcntl  # Not available on Windows, where the thread lock alone applies
+    except ImportError:
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+
+class BlobStore:
+    """Content-addressed files kept in a storage backend
+
+    lock_path names a file used to keep sweeps and new references apart
+    across processes on one machine; without it only threads are kept apart.
+    """
+
+    def __init__(self, storage, lock_path=None):
+        self.storage = storage
+        self.lock_path = lock_path
+        self._readers = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        if self.lock_path is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as f:
+            _flock(f, exclusive)
+            yield  # Closing the file releases the lock
+
+    @contextmanager
+    def references(self):
+        """Hold off sweeps while blobs are stored and references recorded"""
+        with self._cond:
+            self._readers += 1
+        try:
+            with self._file_lock(exclusive=False):
+                yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    def sweep(self, referenced, min_age=SWEEP_MIN_AGE):
+        """Delete blobs that referenced() does not list, and stale incoming files
+
+        referenced() returns the set of hashes still in use; it is called
+        once no references() block is open. Files younger than min_age
+        seconds are kept. Returns (files removed, bytes removed).
+        """
+        cutoff_ns = time.time_ns() - int(min_age * 1_000_000_000)
+        prefixes = [f'{BLOB_PREFIX}/{i:02x}' for i in range(256)]
+        candidates = [
+            (prefix, name, size)
+            for prefix in prefixes
+            for name, size, mtime in self.storage.list(prefix)
+            if mtime < cutoff_ns
+        ]
+        stale = [(name, size) for name, size, mtime in self.storage.list(INCOMING_PREFIX) if mtime < cutoff_ns]
+
+        removed = removed_bytes = 0
+        with self._cond:
+            self._cond.wait_for(lambda: self._readers == 0)
+            with self._file_lock(exclusive=True):
+                in_use = referenced()
+                for prefix, name, size in candidates:
+                    if name not in in_use:
+                        self.storage.delete(f'{prefix}/{name}')
+                        removed += 1
+                        removed_bytes += size
+        for name, size in stale:
+            self.storage.delete(f'{INCOMING_PREFIX}/{name}')
+            removed += 1
+            removed_bytes += size
+        return removed, removed_bytes
+
+    def size(self, sha256):
+        """Byte size of a stored blob, or None if the server does not have it"""
+        return self.storage.size(blob_key(sha256))
+
+    def put_stream(self, stream):
+        """Store a readable stream's bytes, hashing them on the way; return (sha256, size)"""
+        incoming = f'{INCOMING_PREFIX}/{secrets.token_hex(16)}'
+        reader = HashingReader(stream)
+        self.storage.save(incoming, reader)
+        sha256 = reader.hexdigest()
+        if self.size(sha256) is None:
+            self.storage.move(incoming, blob_key(sha256))
+        else:
+            self.storage.delete(incoming)
+        return sha256, reader.size
+
+    def put_file(self, path, sha256=None):
+        """Move a finished local file into the store; return (sha256, size)
+
+        sha256 is the file's hash when the caller computed it while writing.
+        """
+        sha256 = sha256 or hash_file(path)
+        size = os.path.getsize(path)
+        if self.size(sha256) is None:
+            self.storage.save_file(blob_key(sha256), path)
+        else:
+            os.remove(path)
+        return sha256, size
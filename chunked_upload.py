@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Chunked Uploads
+Resumable, offset-addressed uploads written straight to disk
+
+Each upload has a state folder holding meta.json, the partially written
+file, and one empty marker file per received chunk. Markers make parallel
+chunk requests safe without any shared state, and listing them is how a
+client resumes after a dropped connection.
+
+RunningHashes hashes each upload as its chunks are written, so completing
+it does not read the whole file back.
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import threading
+from collections import OrderedDict
+
+from hashing import hash_file
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB per chunk request
+COPY_BUFFER = 1024 * 1024
+PENDING_LIMIT = 64 * 1024 * 1024  # Chunk bytes held for hashing while ahead of the gap, over all uploads
+
+
+class RunningHash:
+    """sha256 of an upload's first offset bytes, and chunks received beyond them"""
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self.offset = 0
+        self.streaming = False  # The chunk at offset is being hashed as it is written
+        self.pending = {}  # offset -> (length, chunk bytes or None to read them back from disk)
+
+
+class ChunkSink:
+    """Where one chunk's bytes go while it is written: a digest, or memory"""
+
+    def __init__(self, offset, length, digest=None, keep=False):
+        self.offset = offset
+        self.length = length
+        self.digest = digest
+        self.pieces = [] if keep else None
+
+    def update(self, data):
+        if self.digest is not None:
+            self.digest.update(data)
+        elif self.pieces is not None:
+            self.pieces.append(data)
+
+
+class RunningHashes:
+    """Hashes of in-progress chunked uploads, advanced as chunks are written
+
+    sha256 only runs front to back and its state can't be saved, so this
+    lives in the process. The chunk that continues an upload's hash is
+    hashed as it streams to disk; chunks that arrive ahead of it (parallel
+    requests) are kept in memory, up to pending_limit bytes in all, and
+    hashed once the gap fills. Only chunks that could not be kept are read
+    back. Uploads are tracked from their start; one this process does not
+    track (started by another worker or before a restart, pushed out by
+    newer uploads, or with a chunk written twice) is read back when it
+    completes.
+    """
+
+    def __init__(self, max_uploads=1024, pending_limit=PENDING_LIMIT):
+        self.max_uploads = max_uploads
+        self.pending_limit = pending_limit
+        self.pending_bytes = 0
+        self._hashes = OrderedDict()  # upload_id -> RunningHash
+        self._lock = threading.Lock()
+
+    def start(self, upload_id):
+        """Track a new upload"""
+        with self._lock:
+            self._hashes[upload_id] = RunningHash()
+            while len(self._hashes) > self.max_uploads:
+                self._forget(self._hashes.popitem(last=False)[1])
+
+    def claim(self, upload_id, offset, length, rewrite=False):
+        """Sink for a chunk about to be written, or None if the upload is not tracked"""
+        with self._lock:
+            state = self._hashes.get(upload_id)
+            if state is None:
+                return None
+            if rewrite or offset < state.offset or offset in state.pending or (
+                    state.streaming and offset == state.offset):
+                # Bytes already hashed may change; completing reads the file back
+                self._forget(self._hashes.pop(upload_id))
+                return None
+            if offset == state.offset and not state.streaming:
+                state.streaming = True
+                return ChunkSink(offset, length, digest=state.digest.copy())
+            keep = self.pending_bytes + length <= self.pending_limit
+            if keep:
+                self.pending_bytes += length
+            return ChunkSink(offset, length, keep=keep)
+
+    def release(self, upload_id, sink):
+        """Drop a sink whose chunk failed to write"""
+        with self._lock:
+            state = self._hashes.get(upload_id)
+            if sink.digest is not None and state is not None and state.offset == sink.offset:
+                state.streaming = False
+            if sink.pieces is not None:
+                self.pending_bytes -= sink.length
+
+    def received(self, upload_id, sink, path):
+        """Fold a written chunk into the upload's hash, with any chunks it unblocks"""
+        with self._lock:
+            state = self._hashes.get(upload_id)
+            if state is not None and sink.offset in state.pending:
+                self._forget(self._hashes.pop(upload_id))  # Written twice at once
+                state = None
+            if state is None:
+                if sink.pieces is not None:
+                    self.pending_bytes -= sink.length
+                return
+            if sink.digest is not None:
+                state.digest = sink.digest
+                state.offset += sink.length
+                state.streaming = False
+            else:
+                state.pending[sink.offset] = (sink.length, None if sink.pieces is None else b''.join(sink.pieces))
+            while state.offset in state.pending and not state.streaming:
+                length, data = state.pending.pop(state.offset)
+                if data is None:
+                    with open(path, 'rb') as f:
+                        f.seek(state.offset)
+                        data = f.read(length)
+                else:
+                    self.pending_bytes -= length
+                state.digest.update(data)
+                state.offset += length
+
+    def finish(self, upload_id, path):
+        """sha256 hexdigest of a completed upload's file, reading only what was not hashed"""
+        with self._lock:
+            state = self._hashes.pop(upload_id, None)
+            self._forget(state)
+        if state is None:
+            return hash_file(path)
+        return hash_file(path, state.offset, state.digest)
+
+    def _forget(self, state):
+        if state is not None:
+            self.pending_bytes -= sum(length for length, data in state.pending.values() if data is not None)
+            state.pending.clear()
+
+
+class ChunkedUpload:
+    """A single resumable upload stored under <root>/<upload_id>/"""
+
+    def __init__(self, root, upload_id, meta):
+        self.root = root
+        self.upload_id = upload_id
+        self.filename = meta['filename']
+        self.size = meta['size']
+        self.chunk_size = meta['chunk_size']
+        self.sha256 = None
+
+    @property
+    def folder(self):
+        return os.path.join(self.root, self.upload_id)
+
+    @property
+    def part_path(self):
+        return os.path.join(self.folder, 'data.part')
+
+    @classmethod
+    def create(cls, root, filename, size, chunk_size=DEFAULT_CHUNK_SIZE, hashes=None):
+        """Start a new upload and preallocate its data file, tracked by hashes if given"""
+        upload_id = secrets.token_hex(16)
+        meta = {'filename': filename, 'size': size, 'chunk_size': chunk_size}
+        upload = cls(root, upload_id, meta)
+        os.makedirs(upload.folder)
+        with open(upload.part_path, 'wb') as f:
+            f.truncate(size)
+        with open(os.path.join(upload.folder, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        if hashes:
+            hashes.start(upload_id)
+        return upload
+
+    @classmethod
+    def load(cls, root, upload_id):
+        """Load an existing upload, or None if the ID is unknown"""
+        if not upload_id.isalnum():
+            return None
+        meta_path = os.path.join(root, upload_id, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            return cls(root, upload_id, json.load(f))
+
+    def expected_length(self, offset):
+        """Byte count the chunk starting at offset must have"""
+        if offset < 0 or offset % self.chunk_size or (offset >= self.size and self.size):
+            raise ValueError(f'Invalid chunk offset {offset}')
+        return min(self.chunk_size, self.size - offset)
+
+    def write_chunk(self, offset, stream, hashes=None):
+        """Copy one chunk from a stream into place, then mark it received
+
+        With hashes (RunningHashes), the upload's hash advances as it goes.
+        """
+        expected = self.expected_length(offset)
+        marker = os.path.join(self.folder, f'{offset}.chunk')
+        sink = hashes.claim(self.upload_id, offset, expected, os.path.exists(marker)) if hashes else None
+        written = 0
+        try:
+            with open(self.part_path, 'r+b') as f:
+                f.seek(offset)
+                while written < expected:
+                    data = stream.read(min(COPY_BUFFER, expected - written))
+                    if not data:
+                        break
+                    f.write(data)
+                    if sink is not None:
+                        sink.update(data)
+                    written += len(data)
+            if written != expected or stream.read(1):
+                raise ValueError(f'Chunk at offset {offset} must be exactly {expected} bytes')
+        except BaseException:
+            if sink is not None:
+                hashes.release(self.upload_id, sink)
+            raise
+        open(marker, 'w').close()
+        if sink is not None:
+            hashes.received(self.upload_id, sink, self.part_path)
+
+    def received_offsets(self):
+        """Sorted offsets of every chunk written so far"""
+        return sorted(
+            int(name[:-len('.chunk')]) for name in os.listdir(self.folder)
+            if name.endswith('.chunk')
+        )
+
+    def missing_offsets(self):
+        received = set(self.received_offsets())
+        expected = range(0, self.size, self.chunk_size) if self.size else []
+        return [offset for offset in expected if offset not in received]
+
+    def complete(self, blob_store, hashes=None):
+        """Hand the finished file to the blob store and drop the upload state
+
+        Sets sha256 to the stored content's hash, taken from hashes
+        (RunningHashes) when the chunks were written through it.
+        """
+        if self.missing_offsets():
+            raise ValueError('Upload is incomplete')
+        sha256 = hashes.finish(self.upload_id, self.part_path) if hashes else None
+        self.sha256, _ = blob_store.put_file(self.part_path, sha256)
+        shutil.rmtree(self.folder, ignore_errors=True)
+        return self.filename
+
+    def status(self):
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'size': self.size,
+            'chunk_size': self.chunk_size,
+            'received': self.received_offsets()
+        }
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Hashing Helpers
+Content hashes computed while data is being written, so files are read once
+"""
+
+import hashlib
+
+COPY_BUFFER = 1024 * 1024
+
+
+def save_stream_hashed(stream, path):
+    """Copy a readable stream to path and return (sha256 hexdigest, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            data = stream.read(COPY_BUFFER)
+            if not data:
+                break
+            digest.update(data)
+            f.write(data)
+            size += len(data)
+    return digest.hexdigest(), size
+
+
+class HashingReader:
+    """Wrap a readable stream, hashing and counting the bytes read through it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def hash_file(path, start=0, digest=None):
+    """Return the sha256 hexdigest of a file on disk
+
+    Given a digest of the file's first start bytes, only the rest is read.
+    """
+    digest = hashlib.sha256() if digest is None else digest
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for data in iter(lambda: f.read(COPY_BUFFER), b''):
+            digest.update(data)
+    return digest.hexdigest()
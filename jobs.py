@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Background Jobs
+Runs long execute/download work off the request thread with progress tracking
+"""
+
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Finished jobs are forgotten after this many seconds
+JOB_RETENTION = 60 * 60
+
+
+class Job:
+    """Progress and outcome of one background task"""
+
+    def __init__(self, kind, owner):
+        self.id = secrets.token_hex(16)
+        self.kind = kind
+        self.owner = owner
+        self.status = 'queued'
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def set_total(self, files, bytes_total=0):
+        with self._lock:
+            self.files_total = files
+            self.bytes_total = bytes_total
+
+    def advance(self, files=1, bytes_done=0):
+        with self._lock:
+            self.files_done += files
+            self.bytes_done += bytes_done
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def eta(self):
+        """Seconds left, extrapolated from bytes (or files) done so far"""
+        if self.status != 'running' or not self.started_at:
+            return None
+        elapsed = time.time() - self.started_at
+        if self.bytes_total and self.bytes_done:
+            return elapsed * (self.bytes_total - self.bytes_done) / self.bytes_done
+        if self.files_total and self.files_done:
+            return elapsed * (self.files_total - self.files_done) / self.files_done
+        return None
+
+    def to_dict(self, include_result=True):
+        with self._lock:
+            eta = self.eta()
+            data = {
+                'id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'files_total': self.files_total,
+                'files_done': self.files_done,
+                'bytes_total': self.bytes_total,
+                'bytes_done': self.bytes_done,
+                'eta': round(eta, 1) if eta is not None else None,
+                'error': self.error
+            }
+        if include_result and self.status == 'done':
+            data['result'] = self.result
+        return data
+
+
+class JobManager:
+    """In-process job registry backed by a small worker pool"""
+
+    def __init__(self, max_workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, owner, fn, *args):
+        """Queue fn(*args, job=job); its return value becomes job.result"""
+        job = Job(kind, owner)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id, owner):
+        """Look up a job, only for the session that created it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def running(self):
+        """Number of jobs queued or running"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def _run(self, job, fn, args):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args, job=job)
+            status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            status = 'failed'
+        # Timestamp first so a finished job always has finished_at for pruning
+        job.finished_at = time.time()
+        job.status = status
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
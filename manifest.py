@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Upload Manifest
+Per-session SQLite record of uploaded files, added to across many requests
+
+Every upload is upserted with its size, SHA-256 and mtime, so a batch can
+be built up over any number of requests without the cookie session
+carrying file lists. Each change gets a sequence number and removals leave
+a tombstone, so the preview can ask for only what changed since it last
+looked. The order-independent listing digest (rename_plan.listing_digest)
+is kept up to date next to the rows, so fingerprints never scan them.
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from rename_plan import DIGEST_MODULUS, entry_digest, mapping_stat, plan_fingerprint
+
+MANIFEST_FILENAME = 'manifest.db'
+SQLITE_MAX_VARIABLES = 900  # Stay under SQLite's bound-parameter limit per query
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    sha256 TEXT,
+    mtime_ns INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    removed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS files_seq ON files (seq);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT OR IGNORE INTO meta VALUES ('seq', '0'), ('digest', '0'), ('count', '0'), ('execute', '');
+'''
+
+
+class Manifest:
+    """The uploads of one session, stored in <session_folder>/manifest.db"""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')  # Readers never wait for uploads
+            conn.executescript(SCHEMA)
+
+    @classmethod
+    def for_session(cls, session_folder):
+        return cls(os.path.join(session_folder, MANIFEST_FILENAME))
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent uploads
+        # queue on the busy timeout instead of failing to upgrade a read lock
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def _lookup(self, conn, names):
+        """(size, sha256, mtime_ns) of whichever names are live uploads"""
+        found = {}
+        for start in range(0, len(names), SQLITE_MAX_VARIABLES):
+            batch = names[start:start + SQLITE_MAX_VARIABLES]
+            rows = conn.execute(
+                f'SELECT name, size, sha256, mtime_ns FROM files WHERE removed = 0 '
+                f'AND name IN ({",".join("?" * len(batch))})', batch)
+            found.update((name, (size, sha256, mtime)) for name, size, sha256, mtime in rows)
+        return found
+
+    def record(self, added=(), removed=(), execute_id=None):
+        """Apply removals, then upserts of (name, size, sha256, mtime_ns) entries
+
+        mtime_ns may be None to use the current time. execute_id marks the
+        change as that execute's, in the same transaction (see
+        rename_journal). Returns the new sequence number.
+        """
+        added = [(name, size, sha256, time.time_ns() if mtime is None else mtime)
+                 for name, size, sha256, mtime in added]
+        removed = list(removed)
+        with self._transaction() as conn:
+            meta = dict(conn.execute('SELECT key, value FROM meta'))
+            seq = int(meta['seq']) + 1
+            digest = int(meta['digest'], 16)
+            count = int(meta['count'])
+
+            existing = {name: (size, mtime) for name, (size, _, mtime)
+                        in self._lookup(conn, removed + [entry[0] for entry in added]).items()}
+            for name in removed:
+                if name in existing:
+                    digest -= entry_digest(name, *existing.pop(name))
+                    count -= 1
+            conn.executemany('UPDATE files SET removed = 1, seq = ? WHERE name = ?',
+                             [(seq, name) for name in removed])
+
+            for name, size, sha256, mtime in added:
+                if name in existing:
+                    digest -= entry_digest(name, *existing[name])
+                else:
+                    count += 1
+                existing[name] = (size, mtime)
+                digest += entry_digest(name, size, mtime)
+            conn.executemany(
+                'INSERT INTO files (name, size, sha256, mtime_ns, seq, removed) VALUES (?, ?, ?, ?, ?, 0) '
+                'ON CONFLICT (name) DO UPDATE SET size = excluded.size, sha256 = excluded.sha256, '
+                'mtime_ns = excluded.mtime_ns, seq = excluded.seq, removed = 0',
+                [(name, size, sha256, mtime, seq) for name, size, sha256, mtime in added])
+
+            conn.executemany('UPDATE meta SET value = ? WHERE key = ?', [
+                (str(seq), 'seq'),
+                (format(digest % DIGEST_MODULUS, 'x'), 'digest'),
+                (str(count), 'count'),
+            ])
+            if execute_id is not None:
+                conn.execute("UPDATE meta SET value = ? WHERE key = 'execute'", (execute_id,))
+        return seq
+
+    def rename_changes(self, renames, removed=(), keep_sources=False):
+        """Return the (added, removed) record() arguments for renaming uploads
+
+        renames are (old, new) name pairs, plus plain removals. With
+        keep_sources the old names stay (the files were linked or copied).
+        New names keep the old size and hash.
+        """
+        renames = list(renames)
+        sources = self.entries([old for old, _ in renames])
+        added = [(new, sources[old][0], sources[old][1], None) for old, new in renames if old in sources]
+        if not keep_sources:
+            removed = list(removed) + [old for old, _ in renames]
+        return added, list(removed)
+
+    def record_renames(self, renames, removed=(), keep_sources=False):
+        """Record uploads renamed from old to new names, plus plain removals"""
+        return self.record(*self.rename_changes(renames, removed, keep_sources))
+
+    def count(self):
+        with self._connect() as conn:
+            return int(conn.execute("SELECT value FROM meta WHERE key = 'count'").fetchone()[0])
+
+    def entries(self, names):
+        """Map each of names that is a live upload to (size, sha256, mtime_ns)"""
+        with self._connect() as conn:
+            return self._lookup(conn, list(names))
+
+    def blobs(self, names):
+        """Map each of names that is a live upload to its content hash"""
+        return {name: sha256 for name, (_, sha256, _) in self.entries(names).items()}
+
+    def blob_hashes(self):
+        """Every content hash the manifest names, removed uploads included"""
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute('SELECT DISTINCT sha256 FROM files WHERE sha256 IS NOT NULL')}
+
+    def total_bytes(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COALESCE(SUM(size), 0) FROM files WHERE removed = 0').fetchone()[0]
+
+    def last_execute(self):
+        """Id of the execute whose changes were recorded last, or ''"""
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'execute'").fetchone()[0]
+
+    def get(self, name):
+        """Return (size, sha256, mtime_ns) for an upload, or None"""
+        with self._connect() as conn:
+            return conn.execute('SELECT size, sha256, mtime_ns FROM files WHERE name = ? AND removed = 0',
+                                (name,)).fetchone()
+
+    def snapshot(self):
+        """Return (seq, listing) with listing as (name, size, mtime_ns) tuples"""
+        with self._connect() as conn:
+            conn.execute('BEGIN')
+            seq = int(conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()[0])
+            listing = conn.execute('SELECT name, size, mtime_ns FROM files WHERE removed = 0').fetchall()
+            conn.execute('COMMIT')
+        return seq, listing
+
+    def listing(self):
+        return self.snapshot()[1]
+
+    def changes_since(self, seq):
+        """Return (seq, added, removed) for everything recorded after seq
+
+        added holds (name, size, mtime_ns) tuples and removed holds names.
+        """
+        with self._connect() as conn:
+            conn.execute('BEGIN')
+            current = int(conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()[0])
+            rows = conn.execute('SELECT name, size, mtime_ns, removed FROM files WHERE seq > ?', (seq,)).fetchall()
+            conn.execute('COMMIT')
+        added = [(name, size, mtime) for name, size, mtime, removed in rows if not removed]
+        removed = [name for name, _, _, removed in rows if removed]
+        return current, added, removed
+
+    def digest(self):
+        with self._connect() as conn:
+            return int(conn.execute("SELECT value FROM meta WHERE key = 'digest'").fetchone()[0], 16)
+
+    def fingerprint(self, mapping_path):
+        """Same value as rename_plan.listing_fingerprint over the manifest's listing"""
+        return plan_fingerprint(self.digest(), mapping_stat(mapping_path))
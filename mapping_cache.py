@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Mapping Cache
+Parsed mapping files shared across sessions, keyed by the upload's content hash
+
+Each entry is the cleaned binary mapping plus a small JSON file with its
+row counts. The mapping is hardlinked into the sessions that use it, so
+its mtime is left alone (it is part of their plan fingerprints); hits
+touch the JSON file instead, and the least recently used entries are
+evicted once the cache grows past its byte limit.
+"""
+
+import json
+import os
+import shutil
+import threading
+
+from mapping_reader import MAPPING_VERSION
+
+
+def _link_or_copy(src, dst):
+    """Hardlink src to dst, copying when links are not possible"""
+    tmp = dst + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class MappingCache:
+    """On-disk LRU cache of cleaned mappings"""
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, digest, extension):
+        # Parsing depends on the file type and the mapping format version
+        return f'{digest}.{extension.lower()}.v{MAPPING_VERSION}'
+
+    def _paths(self, key):
+        base = os.path.join(self.folder, key)
+        return base + '.pkl', base + '.json'
+
+    def get(self, key, dest_path):
+        """Place a cached mapping at dest_path and return its counts, or None"""
+        data_path, counts_path = self._paths(key)
+        try:
+            with open(counts_path) as f:
+                counts = json.load(f)
+            _link_or_copy(data_path, dest_path)
+            os.utime(counts_path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None
+        return counts
+
+    def put(self, key, mapping_path, counts):
+        """Store a freshly parsed mapping and evict old entries if needed"""
+        data_path, counts_path = self._paths(key)
+        with self._lock:
+            _link_or_copy(mapping_path, data_path)
+            with open(counts_path + '.tmp', 'w') as f:
+                json.dump(counts, f)
+            os.replace(counts_path + '.tmp', counts_path)
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.pkl'):
+                size = entry.stat().st_size
+                try:
+                    used = os.stat(entry.path[:-len('.pkl')] + '.json').st_mtime
+                except FileNotFoundError:
+                    used = 0  # Half written or half evicted; goes first
+                entries.append((used, size, entry.path))
+                total += size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for stale in (path, path[:-len('.pkl')] + '.json'):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            total -= size
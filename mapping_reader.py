@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Mapping Reader
+Streams rename mappings from Excel/CSV/TSV into the session mapping file
+
+Rows are read one at a time (openpyxl read-only mode for .xlsx, the csv
+module for .csv/.tsv), cleaned, counted and written out in fixed-size
+chunks, so memory use does not grow with the size of the sheet.
+"""
+
+import csv
+import os
+import pickle
+
+import pandas as pd
+
+MAPPING_FILENAME = 'mapping.pkl'
+MAPPING_VERSION = 1
+CHUNK_ROWS = 10000
+
+MAPPING_EXTENSIONS = {'xlsx', 'xls', 'csv', 'tsv'}
+MAPPING_COLUMNS = ['current', 'new', 'category']
+
+
+class MappingError(ValueError):
+    """The uploaded mapping cannot be used; the message is shown to the user"""
+
+
+def _iter_xlsx(path):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(max_col=3, values_only=True)
+    finally:
+        wb.close()
+
+
+def _iter_xls(path):
+    # Legacy .xls has no streaming reader; pandas loads it through xlrd
+    df = pd.read_excel(path, header=None, dtype=object)
+    for row in df.iloc[:, :3].itertuples(index=False):
+        yield tuple(None if pd.isna(v) else v for v in row)
+
+
+def _iter_delimited(path, delimiter):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.reader(f, delimiter=delimiter):
+            yield tuple(v if v != '' else None for v in row[:3])
+
+
+def iter_rows(path, extension):
+    """Yield raw (current, new, category) tuples, header row included"""
+    extension = extension.lower()
+    if extension == 'xlsx':
+        return _iter_xlsx(path)
+    if extension == 'xls':
+        return _iter_xls(path)
+    if extension == 'csv':
+        return _iter_delimited(path, ',')
+    if extension == 'tsv':
+        return _iter_delimited(path, '\t')
+    raise MappingError(f'Unsupported mapping file type: .{extension}')
+
+
+def _clean(value):
+    return '' if value is None else str(value).strip()
+
+
+class MappingWriter:
+    """Append cleaned rows to a mapping file as a series of pickled chunks"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        pickle.dump({'version': MAPPING_VERSION}, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._chunk = {col: [] for col in MAPPING_COLUMNS}
+
+    def append(self, current, new, category):
+        self._chunk['current'].append(current)
+        self._chunk['new'].append(new)
+        self._chunk['category'].append(category)
+        if len(self._chunk['current']) >= CHUNK_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self._chunk['current']:
+            pickle.dump(self._chunk, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._chunk = {col: [] for col in MAPPING_COLUMNS}
+
+    def close(self):
+        self._flush()
+        self._file.close()
+
+
+def ingest_mapping(source_path, extension, dest_path):
+    """Read, clean and validate a mapping sheet into dest_path
+
+    Returns the row counts. Raises MappingError when the sheet has fewer
+    than two columns or no usable rows.
+    """
+    counts = {'count': 0, 'active': 0, 'terminated': 0, 'uncategorized': 0}
+    width = 0
+    tmp_path = dest_path + '.tmp'
+    writer = MappingWriter(tmp_path)
+
+    try:
+        rows = iter_rows(source_path, extension)
+        next(rows, None)  # First row holds the column headers
+
+        for row in rows:
+            # Track the used width the same way a full sheet load would see it
+            filled = [i for i, v in enumerate(row) if v is not None]
+            if not filled:
+                continue
+            width = max(width, filled[-1] + 1)
+
+            values = list(row) + [None] * (3 - len(row))
+            current = _clean(values[0])
+            new = _clean(values[1])
+            if current in ('', 'nan') or new in ('', 'nan'):
+                continue
+
+            category = _clean(values[2]).upper()
+            writer.append(current, new, category)
+
+            counts['count'] += 1
+            if category == 'A':
+                counts['active'] += 1
+            elif category == 'T':
+                counts['terminated'] += 1
+            else:
+                counts['uncategorized'] += 1
+    except Exception:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+
+    writer.close()
+
+    if counts['count'] == 0:
+        os.remove(tmp_path)
+        if width < 2:
+            raise MappingError('Excel file must have at least 2 columns (Current names → New names)')
+        raise MappingError('No valid rename mappings found in Excel file')
+
+    os.replace(tmp_path, dest_path)
+    return counts
+
+
+def load_mapping(path):
+    """Load a mapping file written by ingest_mapping into a DataFrame"""
+    columns = {col: [] for col in MAPPING_COLUMNS}
+    with open(path, 'rb') as f:
+        header = pickle.load(f)
+        if header.get('version') != MAPPING_VERSION:
+            raise MappingError('Mapping file is from an older version, please upload it again')
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                break
+            for col in MAPPING_COLUMNS:
+                columns[col].extend(chunk[col])
+    return pd.DataFrame(columns, columns=MAPPING_COLUMNS, dtype=object)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Match Index
+Normalized filename keys and trigram-based suggestions for unmatched sources
+"""
+
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+_NON_ALNUM = re.compile(r'[\W_]+', re.UNICODE)
+
+# Trigrams that appear in more files than this carry little signal and are
+# skipped once rarer trigrams have produced candidates
+MAX_POSTINGS = 2000
+MAX_QUERY_GRAMS = 12  # Rarest query trigrams used to gather candidates
+RERANK_CANDIDATES = 50
+
+
+def normalize_name(name):
+    """Fold case, accents, Unicode forms, whitespace and punctuation
+
+    'Résumé  - John_SMITH' and 'resume john smith' normalize to the same key.
+    """
+    if not name.isascii():
+        name = unicodedata.normalize('NFKD', name)
+        name = ''.join(ch for ch in name if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(' ', name.casefold()).strip()
+
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestionIndex:
+    """Inverted trigram index over uploaded file stems
+
+    Lookups only touch the postings of a query's rarest trigrams, so the
+    cost depends on how distinctive the name is, not on the number of files.
+    """
+
+    def __init__(self, filenames):
+        self.files = sorted(filenames)
+        self.keys = [normalize_name(os.path.splitext(f)[0]) for f in self.files]
+        postings = defaultdict(list)
+        for i, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                postings[gram].append(i)
+        self.postings = dict(postings)
+
+    def suggest(self, name, k=3, min_score=0.3):
+        """Return up to k uploaded filenames most similar to name"""
+        query = trigrams(normalize_name(os.path.splitext(name)[0]))
+        grams = sorted((g for g in query if g in self.postings), key=lambda g: len(self.postings[g]))
+
+        counts = Counter()
+        for gram in grams[:MAX_QUERY_GRAMS]:
+            posting = self.postings[gram]
+            if len(posting) > MAX_POSTINGS and counts:
+                break
+            counts.update(posting[:MAX_POSTINGS])
+
+        # Rerank the best candidates by exact trigram Jaccard similarity
+        scored = []
+        for i, _ in counts.most_common(RERANK_CANDIDATES):
+            candidate = trigrams(self.keys[i])
+            shared = len(query & candidate)
+            score = shared / (len(query) + len(candidate) - shared)
+            if score >= min_score:
+                scored.append((score, self.files[i]))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [filename for _, filename in scored[:k]]
+
+
+def attach_suggestions(rows, index, k=3):
+    """Add 'suggestions' to result rows that have no matched upload"""
+    if index is None:
+        return rows
+    for row in rows:
+        if row.get('matched_file') is None:
+            row['suggestions'] = index.suggest(row['current'], k=k)
+    return rows
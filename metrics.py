@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Request Metrics
+Per-request timings and hot-path phase counters in Prometheus text format
+
+Each request is timed from before_request until its response is closed,
+so streamed ZIP and report bodies are included. Inside a request (or a
+background job bound with context), code wraps its expensive steps in
+phase(), which records the duration, rows and bytes of the step under
+the endpoint running it:
+
+    with metrics.phase('build_plan') as phase:
+        plan = build_plan(df, uploaded_files)
+        phase.rows = len(plan)
+
+render() returns everything as Prometheus counters and histograms. All
+state is in memory and per process; recording one phase costs a few
+microseconds.
+
+RequestProfiler is the opt-in profiling mode: it runs cProfile over one
+request at a time and keeps the output of slow (or explicitly requested)
+ones for snakeviz, flameprof or pstats.
+"""
+
+import contextvars
+import cProfile
+import io
+import math
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+METRIC_PREFIX = 'batchrename'
+# Seconds; covers a quick JSON poll up to a large execute or download
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, math.inf)
+BACKGROUND_ENDPOINT = 'background'  # Label for phases run outside any request or job
+
+METRIC_HELP = {
+    'http_requests_total': 'Requests handled, by endpoint, method and status',
+    'http_request_seconds': 'Request duration including any streamed body',
+    'http_request_bytes_total': 'Request body bytes received',
+    'http_response_bytes_total': 'Response body bytes sent',
+    'phase_seconds': 'Time spent in an instrumented step',
+    'phase_rows_total': 'Rows (mapping rows, files or entries) handled by a step',
+    'phase_bytes_total': 'Bytes read or written by a step',
+    'phase_errors_total': 'Steps that raised',
+    'mapping_cache_lookups_total': 'Mapping uploads served from the parsed mapping cache (hit) or parsed (miss)',
+}
+
+_current = contextvars.ContextVar('metrics_request', default=None)
+
+
+class Phase:
+    """Rows and bytes a running phase reports; set them before it ends"""
+
+    __slots__ = ('name', 'rows', 'bytes')
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.bytes = 0
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Thread-safe counters and histograms keyed by name and labels"""
+
+    def __init__(self, prefix=METRIC_PREFIX, buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = [[0] * len(self.buckets), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    # Requests and jobs
+
+    def start_request(self, endpoint):
+        """Begin timing a request on this thread; returns its state for finish_request"""
+        state = {'endpoint': endpoint, 'started': time.perf_counter(), 'phases': {}}
+        _current.set(state)
+        return state
+
+    def finish_request(self, state, method, status, request_bytes=0, response_bytes=0):
+        """Record a request; returns its duration, or None if it was already recorded"""
+        started = state.pop('started', None)
+        if started is None:
+            return None  # Servers may close a response more than once
+        elapsed = time.perf_counter() - started
+        endpoint = state['endpoint']
+        self.count('http_requests_total', endpoint=endpoint, method=method, status=status)
+        self.observe('http_request_seconds', elapsed, endpoint=endpoint)
+        if request_bytes:
+            self.count('http_request_bytes_total', request_bytes, endpoint=endpoint)
+        if response_bytes:
+            self.count('http_response_bytes_total', response_bytes, endpoint=endpoint)
+        if _current.get() is state:
+            _current.set(None)
+        return elapsed
+
+    @contextmanager
+    def context(self, endpoint):
+        """Attribute phases run inside to endpoint, e.g. for a background job"""
+        token = _current.set({'endpoint': endpoint, 'started': time.perf_counter(), 'phases': {}})
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+    def server_timing(self):
+        """Server-Timing header value for the phases of the current request so far"""
+        state = _current.get()
+        if not state:
+            return ''
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in state['phases'].items())
+
+    # Phases
+
+    @contextmanager
+    def phase(self, name):
+        """Time a step of the current request or job; yields a Phase for rows and bytes"""
+        phase = Phase(name)
+        started = time.perf_counter()
+        try:
+            yield phase
+        except BaseException:
+            self.count('phase_errors_total', endpoint=self._endpoint(), phase=name)
+            raise
+        finally:
+            self.record_phase(name, time.perf_counter() - started, phase.rows, phase.bytes)
+
+    def record_phase(self, name, seconds, rows=0, bytes_done=0):
+        state = _current.get()
+        endpoint = state['endpoint'] if state else BACKGROUND_ENDPOINT
+        if state:
+            state['phases'][name] = state['phases'].get(name, 0) + seconds
+        self.observe('phase_seconds', seconds, endpoint=endpoint, phase=name)
+        if rows:
+            self.count('phase_rows_total', rows, endpoint=endpoint, phase=name)
+        if bytes_done:
+            self.count('phase_bytes_total', bytes_done, endpoint=endpoint, phase=name)
+
+    def timed_iter(self, chunks, name, rows=None):
+        """Yield chunks, recording the time spent producing them (not sending them) as a phase
+
+        The phase's rows are the number of chunks unless rows is given.
+        """
+        seconds = 0.0
+        count = 0
+        size = 0
+        iterator = iter(chunks)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    seconds += time.perf_counter() - started
+                    return
+                seconds += time.perf_counter() - started
+                count += 1
+                size += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            self.record_phase(name, seconds, count if rows is None else rows, size)
+
+    @staticmethod
+    def _endpoint():
+        state = _current.get()
+        return state['endpoint'] if state else BACKGROUND_ENDPOINT
+
+    # Exposition
+
+    def render(self, gauges=None, counters=None):
+        """Everything recorded, in Prometheus text format
+
+        gauges and counters are extra {name: value} samples (without the
+        prefix) read from elsewhere at scrape time, e.g. the session sweeper.
+        """
+        lines = []
+        with self._lock:
+            counter_series = {name: dict(series) for name, series in self._counters.items()}
+            histogram_series = {
+                name: {key: (list(h[0]), h[1], h[2]) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+
+        for name in sorted(counter_series):
+            self._header(lines, name, 'counter')
+            for labels, value in sorted(counter_series[name].items()):
+                lines.append(f'{self.prefix}_{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for name in sorted(histogram_series):
+            self._header(lines, name, 'histogram')
+            for labels, (buckets, total, count) in sorted(histogram_series[name].items()):
+                cumulative = 0
+                for bound, hits in zip(self.buckets, buckets):
+                    cumulative += hits
+                    lines.append(f'{self.prefix}_{name}_bucket'
+                                 f'{_format_labels(labels, ("le", _format_value(float(bound))))} {cumulative}')
+                lines.append(f'{self.prefix}_{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                lines.append(f'{self.prefix}_{name}_count{_format_labels(labels)} {count}')
+
+        for kind, samples in (('counter', counters or {}), ('gauge', gauges or {})):
+            for name, value in sorted(samples.items()):
+                if value is None:
+                    continue
+                self._header(lines, name, kind)
+                lines.append(f'{self.prefix}_{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, name, kind):
+        if name in METRIC_HELP:
+            lines.append(f'# HELP {self.prefix}_{name} {METRIC_HELP[name]}')
+        lines.append(f'# TYPE {self.prefix}_{name} {kind}')
+
+
+class RequestProfiler:
+    """Runs cProfile over one request at a time and keeps the slow ones
+
+    A profile is saved when the request took at least slow_seconds, or
+    always when forced. Each is written as <name>.prof (for snakeviz,
+    flameprof or python -m pstats) and <name>.txt (the top functions by
+    cumulative time); only the newest keep pairs are kept.
+    """
+
+    def __init__(self, folder, slow_seconds=1.0, keep=20):
+        self.folder = folder
+        self.slow_seconds = slow_seconds
+        self.keep = keep
+        self._busy = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def start(self):
+        """Start profiling this thread; None when another request is being profiled"""
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except BaseException:
+            self._busy.release()
+            raise
+        return profile
+
+    def stop(self, profile, label, elapsed, force=False):
+        """Stop profile; returns the saved path or None"""
+        try:
+            profile.disable()
+            if elapsed < self.slow_seconds and not force:
+                return None
+            name = f'{time.strftime("%Y%m%d_%H%M%S")}_{label}_{int(elapsed * 1000)}ms'
+            path = os.path.join(self.folder, name)
+            profile.dump_stats(path + '.prof')
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(40)
+            with open(path + '.txt', 'w') as f:
+                f.write(summary.getvalue())
+            self._prune()
+            return path + '.prof'
+        finally:
+            self._busy.release()
+
+    def _prune(self):
+        profiles = sorted(entry.path for entry in os.scandir(self.folder) if entry.name.endswith('.prof'))
+        for path in profiles[:-self.keep]:
+            for extension in ('.prof', '.txt'):
+                try:
+                    os.remove(path[:-len('.prof')] + extension)
+                except FileNotFoundError:
+                    pass
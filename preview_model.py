@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Preview Model
+Keeps each session's preview plan in memory and updates it from deltas
+
+Uploading one more file or correcting a few spreadsheet rows only touches
+the rows such a change can affect: rows whose source could now match a
+different upload, the duplicate-name groups involved, and rows whose new
+name collides with a changed file. Lookups go through inverted indexes
+(normalized source key, and case-insensitive original new name and new
+name to rows), so a
+small edit to a 100k-row batch costs milliseconds instead of a rebuild.
+"""
+
+import os
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from match_index import SuggestionIndex, normalize_name
+from rename_plan import (
+    DIGEST_MODULUS, PLAN_COLUMNS, allocate_suffix, classify_rows, entry_digest, listing_digest,
+    mapping_columns, name_key, plan_fingerprint, save_plan, suffix_group, summarize_plan
+)
+
+# Above this share of changed mapping rows a full rebuild is just as fast
+MAX_DELTA_SHARE = 0.1
+
+# Match tiers, as in rename_plan.match_sources
+NO_MATCH, EXACT, BASE, NORMALIZED = 0, 1, 2, 3
+
+
+def _stem(name):
+    return os.path.splitext(name)[0]
+
+
+def _add(table, key, row):
+    table[key].add(row)
+
+
+def _discard(table, key, row):
+    rows = table.get(key)
+    if rows is not None:
+        rows.discard(row)
+        if not rows:
+            del table[key]
+
+
+def _rows(table, keys):
+    rows = set()
+    for key in keys:
+        rows.update(table.get(key, ()))
+    return rows
+
+
+def _decrement(counter, key):
+    """Decrement a Counter entry; return True if it dropped to zero"""
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+        return True
+    return False
+
+
+class PreviewModel:
+    """A session's plan plus the lookup tables needed to update it in place
+
+    The plan is held as one object array per column; .plan returns a
+    DataFrame built from them that later updates never modify.
+    """
+
+    def __init__(self, plan, listing, mapping_stat, listing_seq=0):
+        plan = plan.reset_index(drop=True)
+        self.columns = {col: plan[col].to_numpy(dtype=object, copy=True) for col in PLAN_COLUMNS}
+        matched = self.columns['matched_file']
+        matched[pd.isna(matched)] = None
+        self.files = {name: (size, mtime) for name, size, mtime in listing}
+        self.digest = listing_digest(listing)
+        self.listing_seq = listing_seq  # Upload manifest sequence number the files reflect
+        self.mapping_stat = mapping_stat
+        self.summary = summarize_plan(plan)
+        self.version = 0
+        self.saved_version = None
+        self.lock = threading.RLock()
+
+        self._plan = plan
+        self._added = {}
+        self._removed = set()
+        self._ready = False
+        self._suggestions = None
+
+    @property
+    def fingerprint(self):
+        return plan_fingerprint(self.digest, self.mapping_stat)
+
+    @property
+    def plan(self):
+        with self.lock:
+            if self._plan is None:
+                self._plan = pd.DataFrame(
+                    {col: pd.Series(values, dtype=object, copy=True) for col, values in self.columns.items()},
+                    columns=PLAN_COLUMNS)
+            return self._plan
+
+    def plan_for(self, fingerprint):
+        """The plan if it was built from inputs with this fingerprint, else None"""
+        with self.lock:
+            return self.plan if self.fingerprint == fingerprint else None
+
+    def __len__(self):
+        return len(self.columns['current'])
+
+    def note_files(self, added=(), removed=()):
+        """Record uploads (name, size, mtime_ns) or removed names for the next update"""
+        with self.lock:
+            for name, size, mtime in added:
+                self._added[name] = (size, mtime)
+                self._removed.discard(name)
+            for name in removed:
+                self._added.pop(name, None)
+                self._removed.add(name)
+
+    def note_changes(self, seq, added, removed):
+        """Record upload manifest changes up to sequence number seq"""
+        with self.lock:
+            self.note_files(added, removed)
+            self.listing_seq = max(self.listing_seq, seq)
+
+    def suggestion_index(self):
+        with self.lock:
+            if self._suggestions is None:
+                self._suggestions = SuggestionIndex(self.files)
+            return self._suggestions
+
+    def prepare(self):
+        """Build the row and file indexes updates rely on; idempotent"""
+        with self.lock:
+            if self._ready:
+                return
+            cols = self.columns
+            current, matched = cols['current'], cols['matched_file']
+            self.row_keys = np.empty(len(self), dtype=object)
+            self.tiers = np.zeros(len(self), dtype=np.int8)
+            self.ambiguous = np.zeros(len(self), dtype=bool)
+            self.claimed = Counter()
+            self.current_counts = Counter(current.tolist())
+            self.rows_by_key = defaultdict(set)
+            self.rows_by_onew = defaultdict(set)
+            self.rows_by_new = defaultdict(set)
+
+            for i, (name, match, note) in enumerate(zip(current, matched, cols['notes'])):
+                stem = _stem(name)
+                key = normalize_name(stem)
+                self.row_keys[i] = key
+                self.rows_by_key[key].add(i)
+                if match is None:
+                    self.ambiguous[i] = note.startswith('Ambiguous source')
+                elif match == name:
+                    self.tiers[i] = EXACT
+                elif _stem(match).lower() == stem.lower():
+                    self.tiers[i] = BASE
+                else:
+                    self.tiers[i] = NORMALIZED
+                if self.tiers[i] in (EXACT, BASE):
+                    self.claimed[match] += 1
+            for i, (onew, new) in enumerate(zip(cols['original_new'], cols['new'])):
+                self.rows_by_onew[name_key(onew)].add(i)
+                self.rows_by_new[name_key(new)].add(i)
+
+            self.base_map = defaultdict(set)
+            self.norm_map = defaultdict(set)
+            self.file_keys = defaultdict(set)
+            for name in self.files:
+                self._index_file(name)
+            self._ready = True
+
+    def _index_file(self, name):
+        stem = _stem(name)
+        self.base_map[stem.lower()].add(name)
+        self.norm_map[normalize_name(stem)].add(name)
+        self.file_keys[name_key(name)].add(name)
+
+    def _unindex_file(self, name):
+        stem = _stem(name)
+        _discard(self.base_map, stem.lower(), name)
+        _discard(self.norm_map, normalize_name(stem), name)
+        _discard(self.file_keys, name_key(name), name)
+
+    def _name_taken(self, key):
+        """Whether a mapping row's new name or an upload has this name key"""
+        return key in self.rows_by_onew or key in self.file_keys
+
+    def _conflicts(self, new):
+        """Whether new is, ignoring case, an upload that no row renames away"""
+        return any(name not in self.current_counts for name in self.file_keys.get(name_key(new), ()))
+
+    def _match_exact_or_base(self, current):
+        """Return (matched, tier, ambiguous) from the first two tiers"""
+        if current in self.files:
+            return current, EXACT, False
+        candidates = self.base_map.get(_stem(current).lower(), ())
+        if len(candidates) == 1:
+            return next(iter(candidates)), BASE, False
+        return None, NO_MATCH, len(candidates) > 1
+
+    def _match_normalized(self, key):
+        candidates = [name for name in self.norm_map.get(key, ()) if not self.claimed[name]]
+        if len(candidates) == 1:
+            return candidates[0], NORMALIZED, False
+        return None, NO_MATCH, len(candidates) > 1
+
+    def _extend(self, n):
+        """Grow every per-row array to n rows for rows appended to the mapping"""
+        extra = n - len(self)
+        for col, values in self.columns.items():
+            fill = None if col == 'matched_file' else ''
+            self.columns[col] = np.concatenate([values, np.full(extra, fill, dtype=object)])
+        self.row_keys = np.concatenate([self.row_keys, np.full(extra, '', dtype=object)])
+        self.tiers = np.concatenate([self.tiers, np.zeros(extra, dtype=self.tiers.dtype)])
+        self.ambiguous = np.concatenate([self.ambiguous, np.zeros(extra, dtype=bool)])
+
+    def update(self, mapping=None, mapping_stat=None):
+        """Apply noted file changes and, if given, a re-uploaded mapping
+
+        Returns the number of rows recomputed, or None when the change is too
+        large (or removes mapping rows) and the plan should be rebuilt; the
+        model must then be discarded.
+        """
+        with self.lock:
+            self.prepare()
+            cols = self.columns
+            n_old = len(self)
+
+            # Mapping delta: rows edited in place, plus rows appended at the end
+            changed_idx = np.empty(0, dtype=np.intp)
+            if mapping is not None:
+                current, original_new, category = mapping_columns(mapping)
+                n = len(current)
+                if n < n_old:
+                    return None
+                # Only read here, so the Series' own storage will do (no copies)
+                cur = np.asarray(current.array, dtype=object)
+                onew = np.asarray(original_new.array, dtype=object)
+                cat = np.asarray(category.array, dtype=object)
+                edited = ((cur[:n_old] != cols['current'])
+                          | (onew[:n_old] != cols['original_new'])
+                          | (cat[:n_old] != cols['category']))
+                changed_idx = np.concatenate([np.flatnonzero(edited), np.arange(n_old, n)])
+                if len(changed_idx) > MAX_DELTA_SHARE * n:
+                    return None
+
+            added = {name: stat for name, stat in self._added.items() if self.files.get(name) != stat}
+            removed = {name for name in self._removed if name in self.files}
+            self._added, self._removed = {}, set()
+            if len(added) + len(removed) > MAX_DELTA_SHARE * max(len(self.files), 1):
+                return None
+            if mapping_stat is not None and mapping_stat != self.mapping_stat:
+                # The fingerprint changes even if no row does
+                self.mapping_stat = mapping_stat
+                self.version += 1
+            if not len(changed_idx) and not added and not removed:
+                return 0
+
+            # Old values of every row about to change, to adjust the summary
+            old_rows = {}
+
+            def remember(rows):
+                for i in rows:
+                    if i < n_old and i not in old_rows:
+                        old_rows[i] = [cols[col][i] for col in PLAN_COLUMNS]
+
+            # Apply the mapping edits to the inputs and the row indexes
+            remember(changed_idx)
+            if mapping is not None and n > n_old:
+                self._extend(n)
+                cols = self.columns
+            groups = set()
+            current_flips = set()
+            for i in changed_idx:
+                if i < n_old:
+                    _discard(self.rows_by_key, self.row_keys[i], i)
+                    _discard(self.rows_by_onew, name_key(cols['original_new'][i]), i)
+                    groups.add(name_key(cols['original_new'][i]))
+                    if _decrement(self.current_counts, cols['current'][i]):
+                        current_flips.add(cols['current'][i])
+                if not self.current_counts[cur[i]]:
+                    current_flips.add(cur[i])
+                self.current_counts[cur[i]] += 1
+                cols['current'][i], cols['original_new'][i], cols['category'][i] = cur[i], onew[i], cat[i]
+                self.row_keys[i] = normalize_name(_stem(cur[i]))
+                _add(self.rows_by_key, self.row_keys[i], i)
+                _add(self.rows_by_onew, name_key(onew[i]), i)
+                groups.add(name_key(onew[i]))
+
+            # Apply the file delta to the listing digest and lookup maps
+            changed_names = set(removed) | {name for name in added if name not in self.files}
+            for name in removed:
+                self.digest -= entry_digest(name, *self.files.pop(name))
+                self._unindex_file(name)
+            for name, (size, mtime) in added.items():
+                if name in self.files:
+                    self.digest -= entry_digest(name, *self.files[name])
+                else:
+                    self._index_file(name)
+                self.files[name] = (size, mtime)
+                self.digest += entry_digest(name, size, mtime)
+            self.digest %= DIGEST_MODULUS
+            if changed_names:
+                self._suggestions = None
+
+            # Rows whose source match may change: edited rows and rows whose
+            # normalized key equals that of an added or removed upload
+            changed_keys = {normalize_name(_stem(name)) for name in changed_names}
+            rematch = set(changed_idx.tolist()) | _rows(self.rows_by_key, changed_keys)
+            remember(rematch)
+
+            # Tiers 1-2 first, since they decide which uploads are claimed
+            matched = cols['matched_file']
+            flipped = set()
+            for i in rematch:
+                if self.tiers[i] in (EXACT, BASE) and _decrement(self.claimed, matched[i]):
+                    flipped.add(matched[i])
+            for i in rematch:
+                matched[i], self.tiers[i], self.ambiguous[i] = self._match_exact_or_base(cols['current'][i])
+                if self.tiers[i] in (EXACT, BASE):
+                    if not self.claimed[matched[i]]:
+                        flipped.add(matched[i])
+                    self.claimed[matched[i]] += 1
+
+            # Uploads that became (un)claimed can change normalized matches of
+            # other rows, except rows already ambiguous at the base-name tier
+            normalized = {i for i in rematch if self.tiers[i] == NO_MATCH and not self.ambiguous[i]}
+            flip_keys = {normalize_name(_stem(name)) for name in flipped}
+            for i in _rows(self.rows_by_key, flip_keys) - rematch:
+                if self.tiers[i] in (EXACT, BASE):
+                    continue
+                if len(self.base_map.get(_stem(cols['current'][i]).lower(), ())) > 1:
+                    continue
+                normalized.add(i)
+            remember(normalized)
+            for i in normalized:
+                matched[i], self.tiers[i], self.ambiguous[i] = self._match_normalized(self.row_keys[i])
+
+            # Recompute duplicate suffixes for every group an edit touched,
+            # matching rename_plan.dedupe_new_names. A name taken or freed by
+            # an edited row or a changed upload also moves the suffixes of
+            # the group it is a suffixed name of.
+            changed_name_keys = {name_key(name) for name in changed_names}
+            groups.update(filter(None, map(suffix_group, groups | changed_name_keys)))
+            renamed = set()
+            for group in groups:
+                generated = set()
+                next_suffix = 1
+                for k, i in enumerate(sorted(self.rows_by_onew.get(group, ()))):
+                    new = cols['original_new'][i]
+                    if k:
+                        new, suffix = allocate_suffix(
+                            new, next_suffix, lambda key: self._name_taken(key) or key in generated)
+                        generated.add(name_key(new))
+                        next_suffix = suffix + 1
+                    if i >= n_old or cols['new'][i] != new:
+                        remember([i])
+                        if i < n_old:
+                            _discard(self.rows_by_new, name_key(cols['new'][i]), i)
+                        cols['new'][i] = new
+                        _add(self.rows_by_new, name_key(new), i)
+                        renamed.add(i)
+
+            # Rows whose new name is a changed upload or a changed mapping source
+            collide = _rows(self.rows_by_new, changed_name_keys | {name_key(name) for name in current_flips})
+            remember(collide)
+
+            idx = np.array(sorted(set(changed_idx.tolist()) | rematch | normalized | renamed | collide),
+                           dtype=np.intp)
+            conflict = [self._conflicts(name) for name in cols['new'][idx]]
+            rows = classify_rows(*(
+                pd.Series(cols[col][idx], index=idx, dtype=object)
+                for col in ('current', 'new', 'original_new', 'category', 'matched_file')
+            ), pd.Series(self.ambiguous[idx], index=idx), pd.Series(conflict, index=idx, dtype=bool))
+            for col in PLAN_COLUMNS:
+                cols[col][idx] = rows[col].to_numpy(dtype=object)
+
+            old = pd.DataFrame.from_dict(old_rows, orient='index', columns=PLAN_COLUMNS, dtype=object)
+            old_summary = summarize_plan(old)
+            new_summary = summarize_plan(rows)
+            for key in self.summary:
+                self.summary[key] += new_summary[key] - old_summary[key]
+            self.summary['total'] = len(self)
+
+            self._plan = None
+            self.version += 1
+            return len(idx)
+
+
+class PreviewModels:
+    """Preview models of recently active sessions, saved to disk in the background"""
+
+    def __init__(self, max_sessions=32):
+        self.max_sessions = max_sessions
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='plan-writer')
+
+    def get(self, session_id):
+        with self._lock:
+            model = self._models.get(session_id)
+            if model is not None:
+                self._models.move_to_end(session_id)
+            return model
+
+    def put(self, session_id, model):
+        with self._lock:
+            self._models[session_id] = model
+            self._models.move_to_end(session_id)
+            while len(self._models) > self.max_sessions:
+                self._models.popitem(last=False)
+
+    def drop(self, session_id):
+        with self._lock:
+            self._models.pop(session_id, None)
+
+    def persist(self, model, path):
+        """Save the model's plan to path off the request thread
+
+        Saves are queued on one writer thread and skipped when that version
+        is already on disk or a newer one is waiting, so only the latest
+        state is written. The writer also builds the model's indexes.
+        """
+        with model.lock:
+            if model.saved_version == model.version:
+                return
+            state = (model.version, model.plan, model.fingerprint, dict(model.summary), list(model.files))
+        self._writer.submit(self._save, model, path, *state)
+
+    def _save(self, model, path, version, plan, fingerprint, summary, files):
+        if model.version != version:
+            return
+        save_plan(path, plan, fingerprint, summary, files)
+        model.saved_version = version
+        model.prepare()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Rename CLI
+Renames files in a local folder from a mapping sheet, with no web server
+
+    python rename_cli.py mapping.xlsx /path/to/files --dry-run
+    python rename_cli.py mapping.csv /path/to/files --workers 16 --jsonl > results.jsonl
+
+Uses the same matching, duplicate suffixing and conflict checks as the web
+preview (see batch_rename.py). Category A/T files move into Active/ and
+Terminated/ inside the folder; the rest are renamed in place. Exit status
+is 0 when every ready row was renamed, 1 when any failed and 2 when the
+mapping or folder cannot be read.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+
+from batch_rename import DIRECTORY_MODES, plan_directory, read_mapping, run_directory
+from mapping_reader import MappingError
+from rename_executor import DEFAULT_WORKERS
+from rename_plan import summarize_plan
+
+
+class Progress:
+    """Rows done so far, redrawn on one stderr line"""
+
+    def __init__(self, total, enabled):
+        self.total = total
+        self.enabled = enabled and total > 0
+        self.done = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, count):
+        with self._lock:
+            self.done += count
+            if self.enabled and (self.done == self.total or self.done % 100 == 0):
+                sys.stderr.write(f'\r{self.done}/{self.total} files')
+                sys.stderr.flush()
+
+    def finish(self):
+        if self.enabled and self.done:
+            sys.stderr.write('\n')
+
+
+def output_rows(plan, results):
+    """One dict per plan row: execute results for ready rows, the preview's verdict for the rest"""
+    executed = iter(results)
+    for row in plan.itertuples(index=False):
+        if row.status == 'ready':
+            yield next(executed)
+        else:
+            yield {
+                'status': row.status,
+                'current': row.current,
+                'new': row.new,
+                'category': row.category,
+                'folder': '',
+                'notes': row.notes
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[2])
+    parser.add_argument('mapping', help='Mapping sheet (.xlsx, .xls, .csv or .tsv)')
+    parser.add_argument('directory', help='Folder holding the files to rename')
+    parser.add_argument('--dry-run', action='store_true', help='Check and report without renaming anything')
+    parser.add_argument('--mode', choices=DIRECTORY_MODES, default='move',
+                        help='move renames the files; link keeps them and adds the new names')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Files renamed in parallel')
+    parser.add_argument('--jsonl', action='store_true', help='Print one JSON object per row, then the summary')
+    args = parser.parse_args(argv)
+
+    try:
+        mapping = read_mapping(args.mapping)
+        plan, files = plan_directory(mapping, args.directory)
+    except (MappingError, OSError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 2
+
+    ready = int((plan['status'] == 'ready').sum())
+    progress = Progress(ready, enabled=sys.stderr.isatty() and not args.dry_run)
+    results, summary = run_directory(plan, args.directory, files, mode=args.mode,
+                                     max_workers=max(1, args.workers), dry_run=args.dry_run,
+                                     on_done=progress)
+    progress.finish()
+
+    for row in output_rows(plan, results):
+        if args.jsonl:
+            print(json.dumps(row, ensure_ascii=False))
+        elif row['status'] != 'success':
+            print(f"{row['status'].upper():8} {row['current']} -> {row['new']}: {row['notes']}")
+    if args.jsonl:
+        print(json.dumps({'summary': summary, 'plan': summarize_plan(plan), 'dry_run': args.dry_run}))
+    else:
+        verb = 'would be renamed' if args.dry_run else 'renamed'
+        print(f"{summary['success']} {verb}, {summary['failed']} failed, "
+              f"{len(plan) - ready} skipped (Active: {summary['active']}, "
+              f"Terminated: {summary['terminated']}) in {os.path.abspath(args.directory)}")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
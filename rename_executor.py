@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Rename Executor
+Runs file moves on a bounded thread pool while keeping results in plan order
+"""
+
+import errno
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 8
+
+# move: rename uploads into place; link: hardlink/reflink (or copy) outputs and
+# keep the uploads; virtual: only record the plan, downloads rename on the fly
+EXECUTE_MODES = ('move', 'link', 'virtual')
+
+
+def move_file(src, dst, same_device=False):
+    """Move src to dst, using a plain rename when both are on one filesystem"""
+    if same_device:
+        try:
+            os.rename(src, dst)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    shutil.move(src, dst)
+
+
+def _device(path, cache):
+    if path not in cache:
+        cache[path] = os.stat(path).st_dev
+    return cache[path]
+
+
+def run_moves(moves, max_workers=DEFAULT_WORKERS, queue_size=None, on_done=None, move=None,
+              unique_sources=True, before_batch=None, batch_size=1000):
+    """Run (src, dst) moves in parallel and return one error (or None) per move
+
+    At most queue_size moves are queued at once so huge batches do not build
+    a future per file up front. When several moves share a source, only the
+    first one runs; the rest fail the same way they would have sequentially.
+    Pass unique_sources=False when move leaves the source in place.
+    on_done(index) is called from the worker thread after each move.
+    move(src, dst) replaces the local filesystem move, e.g. with a storage
+    backend's own move. before_batch(moves) is called with each run of
+    batch_size moves and returns before any of them starts, e.g. to journal
+    them; the next run is handed over on a separate thread while the
+    current one executes, so a slow fsync does not stall the workers.
+    """
+    errors = [None] * len(moves)
+    if not moves:
+        return errors
+
+    queue_size = queue_size or max_workers * 4
+    slots = threading.BoundedSemaphore(queue_size)
+    devices = {}
+    claimed = set()
+    pending = None
+
+    def work(index, src, dst, same_device):
+        try:
+            if move:
+                move(src, dst)
+            else:
+                move_file(src, dst, same_device)
+        except Exception as e:
+            errors[index] = e
+        finally:
+            slots.release()
+            if on_done:
+                on_done(index)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool, ThreadPoolExecutor(max_workers=1) as ahead:
+        for index, (src, dst) in enumerate(moves):
+            if before_batch and index % batch_size == 0:
+                if pending is None:
+                    before_batch(moves[index:index + batch_size])
+                else:
+                    pending.result()
+                if index + batch_size < len(moves):
+                    pending = ahead.submit(before_batch, moves[index + batch_size:index + 2 * batch_size])
+
+            if unique_sources and src in claimed:
+                errors[index] = FileNotFoundError(
+                    errno.ENOENT, 'Source already moved by an earlier row', src)
+                if on_done:
+                    on_done(index)
+                continue
+            claimed.add(src)
+
+            same_device = False
+            if move is None:
+                try:
+                    same_device = (_device(os.path.dirname(src) or '.', devices) ==
+                                   _device(os.path.dirname(dst) or '.', devices))
+                except OSError:
+                    pass
+
+            slots.acquire()
+            pool.submit(work, index, src, dst, same_device)
+
+    return errors
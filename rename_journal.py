@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Rename Journal
+Write-ahead log of one execute, used to roll it back after a crash or undo it
+
+Before execute touches storage it appends what it is about to do to
+<session_folder>/journal.jsonl, one JSON record per line, fsynced in
+batches so the log never trails the storage operations it describes:
+
+    begin     {"id", "mode", "time"}                 a new execute; replaces the last journal
+    preserve  {"key", "saved"}                       an output about to be overwritten, moved aside
+    links     {"keys"}                               outputs about to be linked from blobs
+    manifest  {"added", "restore"}                   upload names the manifest update adds, and
+                                                     the (name, size, sha256, mtime_ns) it removes
+    files     {"keys"}                               other storage files written (backup log)
+    commit / undo / undone / rolled_back
+
+The manifest update itself is tagged with the execute id in the same
+SQLite transaction, so after a crash the journal can tell whether the
+execute took effect (finish it) or not (roll its storage changes back).
+Undo replays the records in reverse; every step is idempotent, so an
+interrupted undo is simply run again.
+
+An execute or undo holds an flock on <session_folder>/journal.lock from
+start to finish, so recovery in another process (a second worker, or one
+just restarted) can tell a journal that is still being written from one a
+crash left behind. On Windows, without fcntl, every journal looks unlocked.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from rename_executor import DEFAULT_WORKERS, run_moves
+
+JOURNAL_FILENAME = 'journal.jsonl'
+LOCK_FILENAME = 'journal.lock'  # Separate from the journal, which begin() replaces
+JOURNAL_BATCH = 1000  # Moves journaled per fsync
+UNDO_PREFIX = 'undo'  # Session storage folder holding outputs an execute overwrote
+
+
+class RenameJournal:
+    """The journal of a session's last execute"""
+
+    def __init__(self, path, lock_path=None):
+        self.path = path
+        self.lock_path = lock_path
+
+    @classmethod
+    def for_session(cls, session_folder):
+        return cls(os.path.join(session_folder, JOURNAL_FILENAME),
+                   os.path.join(session_folder, LOCK_FILENAME))
+
+    @contextmanager
+    def locked(self, blocking=True):
+        """Hold the journal's lock across processes; yields False if it is busy and not blocking"""
+        if self.lock_path is None:
+            yield True
+            return
+        try:
+            import fcntl  # Not available on Windows, where no lock is taken
+        except ImportError:
+            yield True
+            return
+        with open(self.lock_path, 'a') as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            yield True  # Closing the file releases the lock
+
+    def begin(self, execute_id, mode):
+        """Start a new journal, replacing the previous execute's"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({'op': 'begin', 'id': execute_id, 'mode': mode, 'time': time.time()}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def append(self, records):
+        """Durably append records (dicts with an 'op') with one fsync"""
+        data = ''.join(json.dumps(record) + '\n' for record in records).encode()
+        with open(self.path, 'ab+') as f:
+            # Start a fresh line after one a crash left half written
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b'\n':
+                    data = b'\n' + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def records(self):
+        """Every complete record, skipping a line torn by a crash"""
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    def state(self, records=None):
+        """Return (execute id, mode, last op) or (None, None, None) without a journal"""
+        records = self.records() if records is None else records
+        if not records or records[0]['op'] != 'begin':
+            return None, None, None
+        return records[0]['id'], records[0]['mode'], records[-1]['op']
+
+
+def revert(records, storage, manifest=None, max_workers=DEFAULT_WORKERS):
+    """Undo the storage (and, given a manifest, upload) changes in records
+
+    Runs in the reverse order of execute: the backup log and linked outputs
+    are deleted (outputs in parallel), preserved outputs are moved back,
+    then the manifest gets back the uploads the execute removed or renamed.
+    Returns (number of outputs removed, list of errors).
+    """
+    written = [key for record in records if record['op'] == 'files' for key in record['keys']]
+    linked = [key for record in records if record['op'] == 'links' for key in record['keys']]
+    preserved = [(record['saved'], record['key']) for record in records if record['op'] == 'preserve']
+
+    for key in written:
+        storage.delete(key)
+    errors = run_moves([(key, None) for key in linked], max_workers=max_workers,
+                       move=lambda key, _: storage.delete(key), unique_sources=False)
+
+    def restore(saved, key):
+        if storage.size(saved) is not None:
+            storage.move(saved, key)
+
+    errors += run_moves(preserved, max_workers=max_workers, move=restore, unique_sources=False)
+
+    if manifest is not None:
+        for record in records:
+            if record['op'] == 'manifest':
+                manifest.record([tuple(entry) for entry in record['restore']], removed=record['added'])
+    return len(linked), [error for error in errors if error is not None]
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Rename Planning
+Column-wise matching, duplicate suffixing and conflict detection shared by
+the preview and execute steps
+"""
+
+import hashlib
+import os
+import pickle
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from match_index import SuggestionIndex, normalize_name
+
+FOLDERS = {'A': 'Active', 'T': 'Terminated'}
+ROOT_FOLDER = 'Root'
+
+# Bump when the plan layout or matching rules change so stale files are ignored
+PLAN_VERSION = 3
+PLAN_FILENAME = 'plan.pkl'
+DIGEST_MODULUS = 1 << 160
+
+PLAN_COLUMNS = ['current', 'new', 'original_new', 'category', 'folder',
+                'matched_file', 'status', 'notes']
+
+_SUFFIXED = re.compile(r'(.*) \((\d+)\)', re.DOTALL)
+
+
+def split_ext(names):
+    """Split a Series of names into (base, ext) Series like os.path.splitext"""
+    # map() over the raw values is several times faster than str.extract here
+    if len(names) == 0:
+        empty = pd.Series([], index=names.index, dtype=object)
+        return empty, empty.copy()
+    base, ext = zip(*map(os.path.splitext, names.to_numpy(dtype=object)))
+    return (pd.Series(base, index=names.index, dtype=object),
+            pd.Series(ext, index=names.index, dtype=object))
+
+
+def normalize_categories(category):
+    """Upper-case categories and blank out anything that is not A or T"""
+    # A column holds a handful of distinct values, so clean each one once
+    category = category.fillna('').astype(str)
+    cleaned = {value: value.strip().upper() for value in category.unique()}
+    return category.map({value: c if c in FOLDERS else '' for value, c in cleaned.items()})
+
+
+def name_key(name):
+    """Key under which two names are the same file on a case-insensitive volume"""
+    return name.casefold()
+
+
+def suffix_group(key):
+    """The name key whose duplicates are suffixed to key ('a (2).pdf' -> 'a.pdf'), or None"""
+    base, ext = os.path.splitext(key)
+    match = _SUFFIXED.fullmatch(base)
+    return match.group(1) + ext if match else None
+
+
+def allocate_suffix(name, start, taken):
+    """First 'base (k).ext' for k >= start whose key is not taken; returns (name, k)"""
+    base, ext = os.path.splitext(name)
+    k = start
+    while True:
+        candidate = f'{base} ({k}){ext}'
+        if not taken(name_key(candidate)):
+            return candidate, k
+        k += 1
+
+
+def dedupe_new_names(new, existing=()):
+    """Append (1), (2), ... to repeated new names, keeping the first as-is
+
+    Names that differ only in case are repeats. A suffixed name skips any
+    number that would give another row's new name or an existing file's
+    name, so every output is unique. Each name's counter only moves
+    forward, so this is one pass over the rows.
+    """
+    names = new.to_numpy(dtype=object)
+    keys = np.array([name.casefold() for name in names], dtype=object)
+    dup = pd.Series(keys).duplicated().to_numpy()
+    if not dup.any():
+        return new.copy()
+    taken = set(keys.tolist())
+    taken.update(map(name_key, existing))
+    next_suffix = {}
+    suffixed = []
+    for name, key in zip(names[dup].tolist(), keys[dup].tolist()):
+        name, k = allocate_suffix(name, next_suffix.get(key, 1), taken.__contains__)
+        taken.add(name_key(name))
+        next_suffix[key] = k + 1
+        suffixed.append(name)
+    unique = new.copy()
+    unique[dup] = suffixed
+    return unique
+
+
+def match_sources(current, uploaded_files):
+    """Match each current name to an uploaded file
+
+    Tries the exact name, then the case-insensitive base name (without
+    extension), then the normalized base name (see match_index). Returns
+    (matched, ambiguous): a base name shared by several uploads is never
+    guessed at, it is flagged as ambiguous instead.
+    """
+    files = pd.Series(sorted(uploaded_files), dtype=object)
+    is_exact = current.isin(files)
+    # Object dtype so unmatched rows can hold NaN (pandas 3 str columns cannot)
+    matched = current.astype(object).where(is_exact)
+    ambiguous = pd.Series(False, index=current.index)
+    if is_exact.all():
+        return matched, ambiguous
+
+    file_base, _ = split_ext(files)
+    current_base, _ = split_ext(current[~is_exact])
+
+    # Case-insensitive base name lookup; colliding stems count as ambiguous
+    base_key = file_base.str.lower()
+    base_counts = current_base.str.lower().map(base_key.value_counts()).fillna(0)
+    unique_base = pd.Series(files.values, index=base_key.values)
+    unique_base = unique_base[~unique_base.index.duplicated(keep=False)]
+    matched[~is_exact] = current_base.str.lower().map(unique_base)
+    ambiguous[~is_exact] = base_counts > 1
+
+    # Normalized (case, accents, spacing, punctuation) lookup for the rest,
+    # among uploads that no earlier tier has claimed
+    rest = matched.isna() & ~ambiguous
+    unclaimed = ~files.isin(matched.dropna())
+    if rest.any() and unclaimed.any():
+        norm_key = file_base[unclaimed].map(normalize_name)
+        rest_key = current_base[rest[~is_exact]].map(normalize_name)
+        norm_counts = rest_key.map(norm_key.value_counts()).fillna(0)
+        unique_norm = pd.Series(files[unclaimed].values, index=norm_key.values)
+        unique_norm = unique_norm[~unique_norm.index.duplicated(keep=False)]
+        matched[rest] = rest_key.map(unique_norm)
+        ambiguous[rest] = norm_counts > 1
+
+    return matched, ambiguous
+
+
+def mapping_columns(mapping):
+    """Return the (current, original_new, category) Series a plan is built from"""
+    current = mapping['current'].astype(str).reset_index(drop=True)
+    original_new = mapping['new'].astype(str).reset_index(drop=True)
+    if 'category' in mapping:
+        category = normalize_categories(mapping['category'].reset_index(drop=True))
+    else:
+        category = pd.Series('', index=current.index, dtype=object)
+    return current, original_new, category
+
+
+def build_plan(mapping, uploaded_files):
+    """Resolve every mapping row into a plan DataFrame
+
+    Returns a DataFrame with PLAN_COLUMNS, one row per mapping row in order.
+    """
+    current, original_new, category = mapping_columns(mapping)
+    new = dedupe_new_names(original_new, uploaded_files)
+    matched_file, ambiguous = match_sources(current, uploaded_files)
+    # Uploads no row renames away stay, and block any new name equal to theirs
+    sources = set(current)
+    staying = {name_key(name) for name in uploaded_files if name not in sources}
+    conflict = new.map(name_key).isin(staying)
+    return classify_rows(current, new, original_new, category, matched_file, ambiguous, conflict)
+
+
+def classify_rows(current, new, original_new, category, matched_file, ambiguous, conflict):
+    """Assign status, notes and folder to rows whose match and new name are known
+
+    conflict marks rows whose new name is, ignoring case, an upload that no
+    row renames away.
+    Returns plan rows with the same index as the inputs.
+    """
+    was_renamed = new != original_new
+    missing = matched_file.isna() & ~ambiguous
+    same = current == new
+
+    status = np.select([ambiguous, missing, same, conflict],
+                       ['error', 'error', 'warning', 'error'], 'ready')
+
+    # Notes for ready rows, then overridden by problems in priority order
+    folder_note = category.map({c: f'→ {f} folder' for c, f in FOLDERS.items()}).fillna('')
+    notes = ('Ready to rename ' + folder_note).str.rstrip()
+    renamed_note = ('Auto-renamed to avoid duplicate (was: ' + original_new + ')'
+                    + ('; ' + folder_note).where(folder_note != '', ''))
+    notes = notes.where(~was_renamed, renamed_note)
+    notes = notes.mask(conflict, 'Target name already exists (not in mapping)')
+    notes = notes.mask(same, 'Same name - no change needed')
+    notes = notes.mask(missing, 'Source file not found in uploads')
+    notes = notes.mask(ambiguous, 'Ambiguous source: several uploaded files share this name')
+
+    return pd.DataFrame({
+        'current': current,
+        'new': new,
+        'original_new': original_new,
+        'category': category,
+        'folder': category.map(FOLDERS).fillna(ROOT_FOLDER),
+        'matched_file': matched_file,
+        'status': status,
+        'notes': notes,
+    }, columns=PLAN_COLUMNS)
+
+
+def summarize_plan(plan):
+    """Count statuses and categories for the preview summary"""
+    ready = plan['status'] == 'ready'
+    error = plan['status'] == 'error'
+    ambiguous = int(plan['notes'].str.startswith('Ambiguous source').sum())
+    return {
+        'ready': int(ready.sum()),
+        'warning': int((plan['status'] == 'warning').sum()),
+        'error': int(error.sum()),
+        'total': len(plan),
+        'active': int((ready & (plan['category'] == 'A')).sum()),
+        'terminated': int((ready & (plan['category'] == 'T')).sum()),
+        'auto_renamed': int((plan['new'] != plan['original_new']).sum()),
+        'not_found': int((error & plan['matched_file'].isna()).sum()) - ambiguous,
+        'ambiguous': ambiguous,
+        'target_exists': int((error & plan['matched_file'].notna()).sum())
+    }
+
+
+def plan_results(plan):
+    """Convert plan rows to the per-row dicts returned by /preview"""
+    results = plan[['status', 'current', 'new', 'category', 'notes', 'matched_file']]
+    results = results.astype(object).where(results.notna(), None)
+    return results.to_dict('records')
+
+
+def entry_digest(name, size, mtime_ns):
+    """Hash of one upload listing entry, as an integer"""
+    data = f'{name}\0{size}\0{mtime_ns}'.encode('utf-8', 'surrogateescape')
+    return int.from_bytes(hashlib.sha1(data).digest(), 'big')
+
+
+def listing_digest(listing):
+    """Order-independent hash of (name, size, mtime_ns) entries
+
+    A sum of per-entry hashes, so it can be kept up to date as files are
+    added or removed without rehashing the whole listing.
+    """
+    return sum(entry_digest(*entry) for entry in listing) % DIGEST_MODULUS
+
+
+def mapping_stat(mapping_path):
+    st = os.stat(mapping_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def plan_fingerprint(digest, mapping_stat):
+    """Fingerprint of a listing digest together with the mapping file's (size, mtime_ns)"""
+    size, mtime_ns = mapping_stat
+    return hashlib.sha1(f'{digest:040x}\0mapping\0{size}\0{mtime_ns}'.encode()).hexdigest()
+
+
+def listing_fingerprint(listing, mapping_path):
+    """Hash the upload listing (name, size, mtime_ns) together with the mapping file"""
+    return plan_fingerprint(listing_digest(listing), mapping_stat(mapping_path))
+
+
+def save_plan(path, plan, fingerprint, summary=None, files=None):
+    """Write the plan with its fingerprint, summary and upload names; replaced atomically"""
+    payload = {
+        'version': PLAN_VERSION,
+        'fingerprint': fingerprint,
+        'summary': summary,
+        'files': sorted(files or []),
+        'columns': {col: plan[col].to_numpy(dtype=object) for col in PLAN_COLUMNS}
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _read_plan_payload(path):
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if payload.get('version') != PLAN_VERSION:
+        return None
+    return payload
+
+
+def load_plan(path, fingerprint):
+    """Load a saved plan, or None if it is missing, outdated or for other inputs"""
+    payload = _read_plan_payload(path)
+    if payload is None or payload.get('fingerprint') != fingerprint:
+        return None
+    return pd.DataFrame(payload['columns'], columns=PLAN_COLUMNS)
+
+
+@lru_cache(maxsize=16)
+def _cached_plan(path, mtime_ns):
+    payload = _read_plan_payload(path)
+    if payload is None:
+        return None, None, []
+    plan = pd.DataFrame(payload['columns'], columns=PLAN_COLUMNS)
+    return plan, payload.get('summary'), payload.get('files', [])
+
+
+def load_saved_plan(path):
+    """Return (plan, summary) as last saved, reusing it in memory between pages"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None, None
+    return _cached_plan(path, mtime_ns)[:2]
+
+
+@lru_cache(maxsize=4)
+def _cached_index(path, mtime_ns):
+    return SuggestionIndex(_cached_plan(path, mtime_ns)[2])
+
+
+def load_suggestion_index(path):
+    """Suggestion index over the uploads the saved plan was built from"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _cached_index(path, mtime_ns)
+
+
+def query_plan(plan, status='', category='', search='', offset=0, limit=100):
+    """Filter the plan and return (matching row count, one page of rows)"""
+    mask = pd.Series(True, index=plan.index)
+    if status:
+        mask &= plan['status'] == status
+    if category:
+        mask &= plan['category'] == ('' if category == 'none' else category)
+    if search:
+        mask &= (plan['current'].str.contains(search, case=False, regex=False)
+                 | plan['new'].str.contains(search, case=False, regex=False)
+                 | plan['notes'].str.contains(search, case=False, regex=False))
+    matched = plan[mask]
+    return len(matched), plan_results(matched.iloc[offset:offset + limit])
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Rename Reports
+Builds text, CSV and XLSX reports from results stored on the server
+"""
+
+import csv
+import io
+import os
+import pickle
+from datetime import datetime
+
+import pandas as pd
+
+from rename_plan import PLAN_FILENAME, load_saved_plan
+
+RESULTS_FILENAME = 'execute_results.pkl'
+REPORT_COLUMNS = ['status', 'current', 'new', 'category', 'folder', 'notes']
+REPORT_FORMATS = {'txt', 'csv', 'xlsx'}
+
+BATCH_LINES = 1000  # Lines joined per yielded chunk
+
+
+def save_execute_results(session_folder, results):
+    """Store execute results for later reports"""
+    columns = {col: [r.get(col, '') for r in results] for col in REPORT_COLUMNS}
+    path = os.path.join(session_folder, RESULTS_FILENAME)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(columns, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def load_report_rows(session_folder, source='preview', plan=None):
+    """Load stored rows for a report as a DataFrame with REPORT_COLUMNS
+
+    source is 'preview' (the last preview, as the UI has always reported
+    on) or 'execute' (the outcome of the last execute). plan is the
+    preview plan still held in memory, if any, which may be newer than the
+    saved one. Returns None when there is nothing to report on.
+    """
+    if source == 'execute':
+        results_path = os.path.join(session_folder, RESULTS_FILENAME)
+        if not os.path.exists(results_path):
+            return None
+        with open(results_path, 'rb') as f:
+            return pd.DataFrame(pickle.load(f), columns=REPORT_COLUMNS)
+
+    if plan is None:
+        plan, _ = load_saved_plan(os.path.join(session_folder, PLAN_FILENAME))
+    if plan is None:
+        return None
+    return plan[REPORT_COLUMNS].fillna('')
+
+
+def _split_rows(rows):
+    status = rows['status'].str.lower()
+    successful = rows[status.isin(['success', 'ready'])]
+    warnings = rows[status == 'warning']
+    errors = rows[status.isin(['error', 'failed'])]
+    return successful, warnings, errors
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= BATCH_LINES:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def _text_lines(rows):
+    successful, warnings, errors = _split_rows(rows)
+
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    yield "=" * 80 + "\n"
+    yield "FILE RENAME REPORT\n"
+    yield "=" * 80 + "\n\n"
+    yield f"Generated: {timestamp}\n\n"
+
+    # Summary section
+    yield "SUMMARY\n"
+    yield "-" * 80 + "\n"
+    yield f"Total Files: {len(rows)}\n"
+    yield f"✓ Successful: {len(successful)}\n"
+    yield f"⚠ Warnings: {len(warnings)}\n"
+    yield f"✗ Errors: {len(errors)}\n"
+    yield "\n\n"
+
+    # Successful renames mapping table
+    if len(successful):
+        yield "=" * 80 + "\n"
+        yield "SUCCESSFUL RENAMES - MAPPING TABLE\n"
+        yield "=" * 80 + "\n\n"
+
+        # Column widths in one vectorized pass each
+        max_old = max(int(successful['current'].str.len().max()), 20)
+        max_new = max(int(successful['new'].str.len().max()), 20)
+
+        yield f"{'ORIGINAL NAME':<{max_old}}  →  {'NEW NAME':<{max_new}}  FOLDER\n"
+        yield f"{'-' * max_old}     {'-' * max_new}  {'-' * 15}\n"
+
+        folders = successful['folder'].where(successful['folder'] != '', 'Root')
+        for current, new, folder in zip(successful['current'], successful['new'], folders):
+            yield f"{current:<{max_old}}  →  {new:<{max_new}}  {folder}\n"
+
+        yield "\n"
+
+    # Warnings section
+    if len(warnings):
+        yield "=" * 80 + "\n"
+        yield "WARNINGS\n"
+        yield "=" * 80 + "\n\n"
+
+        for idx, (current, notes) in enumerate(zip(warnings['current'], warnings['notes']), 1):
+            yield f"{idx}. {current}\n   Reason: {notes or 'No details'}\n\n"
+
+    # Errors section
+    if len(errors):
+        yield "=" * 80 + "\n"
+        yield "ERRORS (Files Not Renamed)\n"
+        yield "=" * 80 + "\n\n"
+
+        for idx, (current, new, notes) in enumerate(zip(errors['current'], errors['new'], errors['notes']), 1):
+            yield f"{idx}. {current} → {new}\n   Issue: {notes or 'No details'}\n\n"
+
+    # Footer
+    yield "\n"
+    yield "=" * 80 + "\n"
+    yield "End of Report\n"
+    yield "=" * 80 + "\n"
+
+
+def iter_text_report(rows):
+    """Yield the plain-text report in batches of lines"""
+    return _batched(_text_lines(rows))
+
+
+def iter_csv_report(rows):
+    """Yield the report as CSV, one batch of rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_COLUMNS)
+    for start in range(0, len(rows), BATCH_LINES):
+        writer.writerows(rows.iloc[start:start + BATCH_LINES].itertuples(index=False))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_xlsx_report(rows, path):
+    """Write the report rows to an .xlsx file using openpyxl's streaming writer"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Report')
+    ws.append([col.title() for col in REPORT_COLUMNS])
+    for row in rows.itertuples(index=False):
+        ws.append(list(row))
+    wb.save(path)
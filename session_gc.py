@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Session Garbage Collection
+Background sweeper that expires idle sessions and keeps disk use under quota
+
+Sessions are tracked in <TEMP_FOLDER>/sessions.db with their last activity
+and byte size. Requests only mark a session as seen or dirty; the sweeper
+re-measures dirty sessions alone, so a pass costs the same whether there
+are ten sessions or ten thousand on disk. Each pass removes sessions idle
+longer than the TTL, then evicts the least recently used idle sessions
+while the total is over the global quota, then (after any removal)
+collects blobs no session references any more.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+INDEX_FILENAME = 'sessions.db'
+SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')  # secrets.token_hex(16)
+TOUCH_INTERVAL = 30  # Seconds between last-seen writes for a busy session
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    last_seen REAL NOT NULL,
+    dirty INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen);
+CREATE INDEX IF NOT EXISTS sessions_dirty ON sessions (dirty) WHERE dirty > 0;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT OR IGNORE INTO meta VALUES ('bootstrapped', '0'), ('lease', '0'), ('blob_sweep_due', '0');
+'''
+
+
+class SessionIndex:
+    """Last activity and byte size of every session, stored in sessions.db
+
+    dirty counts changes since the size was last measured, so a
+    measurement taken while the session changed again is not trusted.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, INDEX_FILENAME)
+        self._touched = {}
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def touch(self, session_id, dirty=False, added_bytes=0):
+        """Note activity on a session; dirty when it may have changed size
+
+        added_bytes is added to the indexed size right away, so quota checks
+        see uploads before the sweeper measures the session again.
+        """
+        now = time.time()
+        if not dirty and not added_bytes and now - self._touched.get(session_id, 0) < TOUCH_INTERVAL:
+            return
+        self._touched[session_id] = now
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO sessions (id, bytes, last_seen, dirty) VALUES (?, ?, ?, 1) '
+                'ON CONFLICT (id) DO UPDATE SET last_seen = excluded.last_seen, '
+                'bytes = bytes + ?, dirty = dirty + ?',
+                (session_id, added_bytes, now, added_bytes, int(dirty or bool(added_bytes))))
+
+    def size(self, session_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT bytes FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def bootstrap(self):
+        """Add session folders that predate the index, once; returns how many"""
+        with self._transaction() as conn:
+            if conn.execute("SELECT value FROM meta WHERE key = 'bootstrapped'").fetchone()[0] == '1':
+                return 0
+            rows = []
+            for entry in os.scandir(self.folder):
+                if entry.is_dir() and SESSION_ID_PATTERN.match(entry.name):
+                    rows.append((entry.name, entry.stat().st_mtime))
+            conn.executemany('INSERT OR IGNORE INTO sessions (id, last_seen) VALUES (?, ?)', rows)
+            conn.execute("UPDATE meta SET value = '1' WHERE key = 'bootstrapped'")
+        return len(rows)
+
+    def acquire_lease(self, seconds):
+        """Claim the next pass for this process; False if another holds it"""
+        now = time.time()
+        with self._transaction() as conn:
+            if float(conn.execute("SELECT value FROM meta WHERE key = 'lease'").fetchone()[0]) > now:
+                return False
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'lease'", (str(now + seconds),))
+        return True
+
+    def release_lease(self):
+        with self._connect() as conn:
+            conn.execute("UPDATE meta SET value = '0' WHERE key = 'lease'")
+
+    def dirty(self):
+        """Return (session_id, dirty count) for sessions to re-measure"""
+        with self._connect() as conn:
+            return conn.execute('SELECT id, dirty FROM sessions WHERE dirty > 0').fetchall()
+
+    def set_size(self, session_id, size, dirty):
+        """Store a measured size unless the session changed while it was measured"""
+        with self._connect() as conn:
+            conn.execute('UPDATE sessions SET bytes = ?, dirty = 0 WHERE id = ? AND dirty = ?',
+                         (size, session_id, dirty))
+
+    def remove(self, session_id):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+            conn.execute("UPDATE meta SET value = '1' WHERE key = 'blob_sweep_due'")
+        self._touched.pop(session_id, None)
+
+    def lru(self, cutoff):
+        """(session_id, bytes) of sessions idle since cutoff, least recently seen first"""
+        with self._connect() as conn:
+            return conn.execute('SELECT id, bytes FROM sessions WHERE last_seen < ? ORDER BY last_seen',
+                                (cutoff,)).fetchall()
+
+    def totals(self):
+        """Return (session count, total bytes)"""
+        with self._connect() as conn:
+            count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM sessions').fetchone()
+        return count, total
+
+    def take_blob_sweep(self):
+        """True once after any session was removed since the last call"""
+        with self._transaction() as conn:
+            due = conn.execute("SELECT value FROM meta WHERE key = 'blob_sweep_due'").fetchone()[0] == '1'
+            conn.execute("UPDATE meta SET value = '0' WHERE key = 'blob_sweep_due'")
+        return due
+
+
+class SessionSweeper:
+    """Runs sweep passes over a SessionIndex on a daemon thread
+
+    measure(session_id) returns a session's size in bytes (None once it is
+    gone), remove(session_id) deletes everything it stored and
+    sweep_blobs() returns the (count, bytes) of blobs it collected.
+    ttl is in seconds; max_bytes (None for no limit) caps the total.
+    Sessions seen within active_grace seconds are never evicted for quota.
+    """
+
+    def __init__(self, index, measure, remove, sweep_blobs=None, ttl=24 * 60 * 60,
+                 max_bytes=None, interval=5 * 60, active_grace=10 * 60, stale_folders=()):
+        self.index = index
+        self.measure = measure
+        self.remove = remove
+        self.sweep_blobs = sweep_blobs
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.active_grace = active_grace
+        self.stale_folders = stale_folders
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'passes': 0,
+            'last_pass_at': None,
+            'last_pass_seconds': None,
+            'sessions_measured': 0,
+            'sessions_expired': 0,
+            'sessions_evicted': 0,
+            'session_bytes_reclaimed': 0,
+            'blobs_removed': 0,
+            'blob_bytes_reclaimed': 0,
+            'stale_files_removed': 0,
+            'stale_bytes_reclaimed': 0,
+            'errors': 0,
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='session-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_pass()
+            except Exception:
+                self._count('errors')
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def run_pass(self):
+        """Measure dirty sessions, expire idle ones and enforce the quota
+
+        Returns False when another process is already sweeping.
+        """
+        if not self.index.acquire_lease(self.interval):
+            return False
+        started = time.time()
+        try:
+            self.index.bootstrap()
+
+            for session_id, dirty in self.index.dirty():
+                size = self.measure(session_id)
+                if size is None:
+                    self.index.remove(session_id)
+                else:
+                    self.index.set_size(session_id, size, dirty)
+                self._count('sessions_measured')
+
+            for session_id, size in self.index.lru(started - self.ttl):
+                self._remove(session_id, size, 'sessions_expired')
+
+            if self.max_bytes is not None:
+                _, total = self.index.totals()
+                for session_id, size in self.index.lru(started - self.active_grace):
+                    if total <= self.max_bytes:
+                        break
+                    self._remove(session_id, size, 'sessions_evicted')
+                    total -= size
+
+            self._sweep_stale(started - self.ttl)
+            if self.sweep_blobs and self.index.take_blob_sweep():
+                count, size = self.sweep_blobs()
+                self._count('blobs_removed', count)
+                self._count('blob_bytes_reclaimed', size)
+        finally:
+            self.index.release_lease()
+            with self._lock:
+                self.stats['passes'] += 1
+                self.stats['last_pass_at'] = started
+                self.stats['last_pass_seconds'] = round(time.time() - started, 3)
+        return True
+
+    def _remove(self, session_id, size, reason):
+        self.remove(session_id)
+        self.index.remove(session_id)
+        self._count(reason)
+        self._count('session_bytes_reclaimed', size)
+
+    def _sweep_stale(self, cutoff):
+        # Top-level files left in folders nothing writes to any more
+        for folder in self.stale_folders:
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                try:
+                    st = entry.stat()
+                    if entry.is_file() and st.st_mtime < cutoff:
+                        os.remove(entry.path)
+                        self._count('stale_files_removed')
+                        self._count('stale_bytes_reclaimed', st.st_size)
+                except OSError:
+                    pass
+
+    def metrics(self):
+        """Counters since startup plus the indexed session count and size"""
+        sessions, total = self.index.totals()
+        with self._lock:
+            return dict(self.stats, sessions_tracked=sessions, bytes_tracked=total,
+                        max_bytes=self.max_bytes, ttl=self.ttl)
@@ -1,6 +1,7 @@
 // Global state
 let excelUploaded = false;
 let filesUploaded = false;
+let filesInBatch = 0;
 let previewData = null;
 
 // Initialize on page load
@@ -62,8 +63,8 @@ async function handleExcelUpload(files) {
     
     const file = files[0];
     
-    if (!file.name.match(/\.(xlsx|xls)$/i)) {
-        showToast('Please upload an Excel file (.xlsx or .xls)', 'error');
+    if (!file.name.match(/\.(xlsx|xls|csv|tsv)$/i)) {
+        showToast('Please upload an Excel or CSV file (.xlsx, .xls, .csv or .tsv)', 'error');
         return;
     }
     
@@ -99,37 +100,72 @@ async function handleExcelUpload(files) {
     }
 }
 
+// Chunked upload settings
+const FILE_CONCURRENCY = 3;
+const CHUNK_CONCURRENCY = 3;
+const CHUNK_RETRIES = 3;
+
+// Hash-first settings: files up to this size are hashed in the browser so
+// the server can skip bytes this session already sent
+const HASH_MAX_BYTES = 256 * 1024 * 1024;
+const KNOWN_BATCH = 500;
+
 // Handle files upload
 async function handleFilesUpload(files) {
     if (!files || files.length === 0) return;
     
+    files = Array.from(files);
+    const totalBytes = files.reduce((sum, file) => sum + file.size, 0);
+    let sentBytes = 0;
+    
     showLoading('Uploading files...');
     
-    const formData = new FormData();
-    Array.from(files).forEach(file => {
-        formData.append('files[]', file);
-    });
+    const onProgress = (bytes) => {
+        sentBytes += bytes;
+        const percent = totalBytes ? Math.floor(sentBytes / totalBytes * 100) : 100;
+        document.getElementById('loadingText').textContent = `Uploading files... ${percent}%`;
+    };
     
     try {
-        const response = await fetch('/upload_files', {
-            method: 'POST',
-            body: formData
-        });
+        const uploaded = [];
+        const failed = [];
         
-        const data = await response.json();
+        // Add files the server already has by hash, then send only the rest
+        const known = await addKnownFiles(files);
+        for (const file of files) {
+            if (known.has(file)) {
+                uploaded.push(file.name);
+                onProgress(file.size);
+            }
+        }
+        files = files.filter((file) => !known.has(file));
+        
+        await runPool(files, FILE_CONCURRENCY, async (file) => {
+            try {
+                const data = await uploadFileChunked(file, onProgress);
+                uploaded.push(data.filename);
+                filesInBatch = Math.max(filesInBatch, data.total);
+            } catch (error) {
+                failed.push(file.name);
+            }
+        });
         
         hideLoading();
         
-        if (data.success) {
+        if (uploaded.length > 0) {
             filesUploaded = true;
-            document.getElementById('filesDropZone').style.display = 'none';
+            const message = `${uploaded.length} file(s) uploaded successfully`;
+            // The drop zone stays open so more files can be added to the batch
+            document.querySelector('#filesDropZone .upload-hint').textContent = 'Drop more files to add them to this batch';
             document.getElementById('filesStatus').style.display = 'flex';
-            document.getElementById('filesCount').textContent = `${data.count} files uploaded`;
-            document.getElementById('filesDetail').textContent = data.message;
-            showToast(data.message, 'success');
+            document.getElementById('filesCount').textContent = `${filesInBatch} files in batch`;
+            document.getElementById('filesDetail').textContent = message;
+            showToast(message, failed.length > 0 ? 'warning' : 'success');
             checkReadyState();
-        } else {
-            showToast(data.error, 'error');
+        }
+        
+        if (failed.length > 0) {
+            showToast(`${failed.length} file(s) failed to upload. Drop them again to resume.`, 'error');
         }
     } catch (error) {
         hideLoading();
@@ -137,6 +173,122 @@ async function handleFilesUpload(files) {
     }
 }
 
+// Offer SHA-256 hashes of files to the server; returns the set this session already sent
+async function addKnownFiles(files) {
+    const known = new Set();
+    if (!window.crypto || !crypto.subtle) return known;
+    
+    const candidates = files.filter((file) => file.size <= HASH_MAX_BYTES);
+    for (let start = 0; start < candidates.length; start += KNOWN_BATCH) {
+        const batch = candidates.slice(start, start + KNOWN_BATCH);
+        try {
+            const entries = [];
+            await runPool(batch, FILE_CONCURRENCY, async (file) => {
+                entries.push({ file, sha256: await sha256Hex(file) });
+            });
+            const response = await fetch('/uploads/known', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    files: entries.map(({ file, sha256 }) => ({ filename: file.name, size: file.size, sha256 }))
+                })
+            });
+            const data = await response.json();
+            if (!data.success) break;
+            const names = new Set(data.known);
+            for (const { file } of entries) {
+                if (names.has(file.name)) known.add(file);
+            }
+            filesInBatch = Math.max(filesInBatch, data.total);
+        } catch (error) {
+            // Hashing is only a shortcut; anything not confirmed is uploaded
+            break;
+        }
+    }
+    return known;
+}
+
+async function sha256Hex(file) {
+    const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Run worker(item) over items with at most `limit` in flight
+async function runPool(items, limit, worker) {
+    let next = 0;
+    const runners = Array.from({ length: Math.min(limit, items.length) }, async () => {
+        while (next < items.length) {
+            await worker(items[next++]);
+        }
+    });
+    await Promise.all(runners);
+}
+
+// Upload one file in chunks, resuming a previous attempt when possible
+async function uploadFileChunked(file, onProgress) {
+    const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    let upload = null;
+    
+    const savedId = localStorage.getItem(resumeKey);
+    if (savedId) {
+        const response = await fetch(`/uploads/${savedId}`);
+        const data = await response.json();
+        if (data.success) upload = data;
+    }
+    
+    if (!upload) {
+        const response = await fetch('/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        });
+        upload = await response.json();
+        if (!upload.success) throw new Error(upload.error);
+        localStorage.setItem(resumeKey, upload.upload_id);
+    }
+    
+    const received = new Set(upload.received);
+    const offsets = [];
+    for (let offset = 0; offset < file.size; offset += upload.chunk_size) {
+        if (received.has(offset)) {
+            onProgress(Math.min(upload.chunk_size, file.size - offset));
+        } else {
+            offsets.push(offset);
+        }
+    }
+    
+    await runPool(offsets, CHUNK_CONCURRENCY, async (offset) => {
+        const chunk = file.slice(offset, offset + upload.chunk_size);
+        await sendChunk(upload.upload_id, offset, chunk);
+        onProgress(chunk.size);
+    });
+    
+    const response = await fetch(`/uploads/${upload.upload_id}/complete`, { method: 'POST' });
+    const data = await response.json();
+    if (!data.success) throw new Error(data.error);
+    
+    localStorage.removeItem(resumeKey);
+    return data;
+}
+
+// Send one chunk, retrying with backoff on network errors
+async function sendChunk(uploadId, offset, chunk) {
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await fetch(`/uploads/${uploadId}?offset=${offset}`, {
+                method: 'PUT',
+                body: chunk
+            });
+            const data = await response.json();
+            if (data.success) return;
+            throw new Error(data.error);
+        } catch (error) {
+            if (attempt >= CHUNK_RETRIES) throw error;
+            await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+        }
+    }
+}
+
 // Remove Excel
 function removeExcel() {
     excelUploaded = false;
@@ -147,10 +299,19 @@ function removeExcel() {
 }
 
 // Remove files
-function removeFiles() {
+async function removeFiles() {
+    try {
+        const response = await fetch('/files', { method: 'DELETE' });
+        const data = await response.json();
+        if (!data.success) throw new Error(data.error);
+    } catch (error) {
+        showToast('Error removing files: ' + error.message, 'error');
+        return;
+    }
     filesUploaded = false;
+    filesInBatch = 0;
     document.getElementById('filesStatus').style.display = 'none';
-    document.getElementById('filesDropZone').style.display = 'block';
+    document.querySelector('#filesDropZone .upload-hint').textContent = 'Select multiple files to rename';
     document.getElementById('filesInput').value = '';
     checkReadyState();
 }
@@ -170,11 +331,12 @@ async function previewRenames() {
     showLoading('Analyzing rename operations...');
     
     try {
-        const response = await fetch('/preview', {
+        const response = await fetch('/preview?layout=columnar', {
             method: 'POST'
         });
         
         const data = await response.json();
+        if (data.success) data.results = decodeResults(data.results);
         
         hideLoading();
         
@@ -196,11 +358,36 @@ async function previewRenames() {
     }
 }
 
+// Rebuild result row objects from the columnar layout (see responses.py)
+function decodeResults(results) {
+    if (!results || Array.isArray(results)) return results;
+    const { columns, codes, count } = results;
+    const keys = Object.keys(columns).filter(key => key !== 'notes');
+    const rows = new Array(count);
+    for (let i = 0; i < count; i++) {
+        const row = {};
+        for (const key of keys) {
+            const value = columns[key][i];
+            row[key] = codes[key] && value !== null ? codes[key][value] : value;
+        }
+        if (columns.notes) {
+            const code = columns.notes[i];
+            row.notes = code === null ? null : fillTemplate(codes.notes[code], row);
+        }
+        rows[i] = row;
+    }
+    return rows;
+}
+
+// Fill {field} placeholders from the row; doubled braces are literal
+function fillTemplate(template, row) {
+    return template.replace(/\{\{|\}\}|\{(\w+)\}/g, (match, field) => field ? String(row[field] ?? '') : match[0]);
+}
+
 // Display preview
 function displayPreview(data) {
     const container = document.getElementById('previewContainer');
     const summary = document.getElementById('previewSummary');
-    const tbody = document.getElementById('previewTableBody');
     const acknowledgeSection = document.getElementById('acknowledgeErrorsSection');
     const acknowledgeText = document.getElementById('acknowledgeErrorsText');
     const acknowledgeCheckbox = document.getElementById('acknowledgeErrorsCheckbox');
@@ -247,18 +434,11 @@ function displayPreview(data) {
         acknowledgeSection.style.display = 'none';
     }
     
-    // Clear and populate table
-    tbody.innerHTML = '';
-    data.results.forEach(result => {
-        const row = document.createElement('tr');
-        row.innerHTML = `
-            <td><span class="status-badge ${result.status}">${result.status.toUpperCase()}</span></td>
-            <td>${escapeHtml(result.current)}</td>
-            <td>${escapeHtml(result.new)}</td>
-            <td>${escapeHtml(result.notes)}</td>
-        `;
-        tbody.appendChild(row);
-    });
+    // Reset filters and show the first page; the rest loads on scroll
+    document.getElementById('filterStatus').value = '';
+    document.getElementById('filterCategory').value = '';
+    document.getElementById('filterSearch').value = '';
+    initPreviewTable(data.results, data.summary.total);
     
     // Update execute button state
     updateExecuteButton();
@@ -267,6 +447,134 @@ function displayPreview(data) {
     container.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
 }
 
+// Virtualized preview table
+const PREVIEW_PAGE_SIZE = 200;
+const OVERSCAN_ROWS = 20;
+let tableView = null;
+let rowHeight = 0;
+let filterTimer = null;
+
+// Start a fresh table view with the rows already received
+function initPreviewTable(firstPage, total) {
+    const scroller = document.getElementById('previewTableContainer');
+    tableView = {
+        filters: getPreviewFilters(),
+        total: total,
+        pages: new Map([[0, firstPage]]),
+        pending: new Set()
+    };
+    scroller.scrollTop = 0;
+    if (!scroller.dataset.virtual) {
+        scroller.dataset.virtual = 'true';
+        scroller.addEventListener('scroll', () => requestAnimationFrame(renderVisibleRows));
+    }
+    renderVisibleRows();
+}
+
+function getPreviewFilters() {
+    return {
+        status: document.getElementById('filterStatus').value,
+        category: document.getElementById('filterCategory').value,
+        q: document.getElementById('filterSearch').value.trim()
+    };
+}
+
+// Reload the table from the server with the current filters
+function applyPreviewFilters() {
+    clearTimeout(filterTimer);
+    tableView = {
+        filters: getPreviewFilters(),
+        total: 0,
+        pages: new Map(),
+        pending: new Set()
+    };
+    document.getElementById('previewTableContainer').scrollTop = 0;
+    fetchPreviewPage(0);
+}
+
+// Debounce typing in the search box
+function schedulePreviewFilter() {
+    clearTimeout(filterTimer);
+    filterTimer = setTimeout(applyPreviewFilters, 300);
+}
+
+async function fetchPreviewPage(pageIndex) {
+    const view = tableView;
+    if (!view || view.pages.has(pageIndex) || view.pending.has(pageIndex)) return;
+    view.pending.add(pageIndex);
+    
+    const params = new URLSearchParams({
+        ...view.filters,
+        offset: pageIndex * PREVIEW_PAGE_SIZE,
+        limit: PREVIEW_PAGE_SIZE
+    });
+    
+    try {
+        const response = await fetch(`/preview/results?${params}&layout=columnar`);
+        const data = await response.json();
+        if (!data.success) throw new Error(data.error);
+        data.results = decodeResults(data.results);
+        if (tableView !== view) return;  // Filters changed while loading
+        
+        view.total = data.total;
+        view.pages.set(pageIndex, data.results);
+        renderVisibleRows();
+    } catch (error) {
+        showToast('Error loading preview rows: ' + error.message, 'error');
+    } finally {
+        view.pending.delete(pageIndex);
+    }
+}
+
+// Render only the rows in (or near) the visible part of the scroller
+function renderVisibleRows() {
+    if (!tableView) return;
+    
+    const scroller = document.getElementById('previewTableContainer');
+    const tbody = document.getElementById('previewTableBody');
+    const height = rowHeight || 50;
+    const total = tableView.total;
+    
+    const first = Math.max(0, Math.floor(scroller.scrollTop / height) - OVERSCAN_ROWS);
+    const last = Math.min(total, Math.ceil((scroller.scrollTop + scroller.clientHeight) / height) + OVERSCAN_ROWS);
+    
+    let html = `<tr class="spacer" style="height: ${first * height}px"><td colspan="4"></td></tr>`;
+    for (let i = first; i < last; i++) {
+        const pageIndex = Math.floor(i / PREVIEW_PAGE_SIZE);
+        const page = tableView.pages.get(pageIndex);
+        
+        if (!page) {
+            fetchPreviewPage(pageIndex);
+            html += '<tr class="loading-row"><td colspan="4">Loading...</td></tr>';
+            continue;
+        }
+        
+        const result = page[i % PREVIEW_PAGE_SIZE];
+        const notes = result.suggestions && result.suggestions.length
+            ? `${result.notes} (did you mean: ${result.suggestions.join(', ')}?)`
+            : result.notes;
+        html += `
+            <tr>
+                <td><span class="status-badge ${result.status}">${result.status.toUpperCase()}</span></td>
+                <td title="${escapeHtml(result.current)}">${escapeHtml(result.current)}</td>
+                <td title="${escapeHtml(result.new)}">${escapeHtml(result.new)}</td>
+                <td title="${escapeHtml(notes)}">${escapeHtml(notes)}</td>
+            </tr>
+        `;
+    }
+    html += `<tr class="spacer" style="height: ${(total - last) * height}px"><td colspan="4"></td></tr>`;
+    tbody.innerHTML = html;
+    
+    document.getElementById('filterCount').textContent = `${total} row(s)`;
+    
+    // Measure the real row height once rows are on screen
+    const sample = tbody.querySelector('tr:not(.spacer)');
+    if (!rowHeight && sample) {
+        rowHeight = sample.getBoundingClientRect().height;
+        if (rowHeight) renderVisibleRows();
+    }
+}
+
 // Update execute button state
 function updateExecuteButton() {
     const executeBtn = document.getElementById('executeBtn');
@@ -286,31 +594,129 @@ function updateExecuteButton() {
 
 // Execute renames
 async function executeRenames() {
-    if (!confirm(`About to rename ${previewData.summary.ready} file(s). This operation cannot be undone. Continue?`)) {
+    if (!confirm(`About to rename ${previewData.summary.ready} file(s). Continue?`)) {
         return;
     }
     
-    showLoading('Renaming files...');
+    document.getElementById('executeBtn').disabled = true;
+    const mode = document.getElementById('executeMode').value;
     
     try {
-        const response = await fetch('/execute', {
-            method: 'POST'
-        });
-        
-        const data = await response.json();
-        
-        hideLoading();
+        const job = await runJob('/jobs/execute', 'Renaming files', { mode });
+        const data = job.result;
+        if (data && data.results) data.results = decodeResults(data.results);
         
-        if (data.success) {
+        if (data && data.success) {
             displayResults(data);
             showToast(`Successfully renamed ${data.summary.success} file(s)!`, 'success');
         } else {
-            showToast(data.error, 'error');
+            showToast(job.error || (data && data.error) || 'Rename failed', 'error');
+            updateExecuteButton();
         }
     } catch (error) {
-        hideLoading();
         showToast('Error during rename: ' + error.message, 'error');
+        updateExecuteButton();
+    }
+}
+
+// Start a background job and wait for it while showing live progress
+async function runJob(url, label, body = {}) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    });
+    const data = await response.json();
+    if (!data.success) throw new Error(data.error);
+    
+    showProgress(label, null);
+    try {
+        return await watchJob(data.job_id, (job) => showProgress(label, job));
+    } finally {
+        hideProgress();
+    }
+}
+
+// Follow job progress over Server-Sent Events, falling back to polling
+function watchJob(jobId, onUpdate) {
+    return new Promise((resolve, reject) => {
+        const finish = (job) => {
+            onUpdate(job);
+            if (job.status === 'done' || job.status === 'failed') {
+                resolve(job);
+                return true;
+            }
+            return false;
+        };
+        
+        const poll = async () => {
+            try {
+                const response = await fetch(`/jobs/${jobId}?layout=columnar`);
+                const data = await response.json();
+                if (!data.success) throw new Error(data.error);
+                if (!finish(data.job)) setTimeout(poll, 1000);
+            } catch (error) {
+                reject(error);
+            }
+        };
+        
+        if (!window.EventSource) {
+            poll();
+            return;
+        }
+        
+        const source = new EventSource(`/jobs/${jobId}/events?layout=columnar`);
+        source.onmessage = (event) => {
+            if (finish(JSON.parse(event.data))) source.close();
+        };
+        source.onerror = () => {
+            source.close();
+            poll();
+        };
+    });
+}
+
+// Show the progress panel for a running job
+function showProgress(label, job) {
+    const panel = document.getElementById('jobProgress');
+    const bar = document.getElementById('jobProgressBar');
+    const text = document.getElementById('jobProgressText');
+    
+    panel.style.display = 'block';
+    
+    if (!job || !job.files_total) {
+        bar.style.width = '0%';
+        text.textContent = `${label}...`;
+        return;
     }
+    
+    const fraction = job.bytes_total ? job.bytes_done / job.bytes_total : job.files_done / job.files_total;
+    bar.style.width = `${Math.floor(fraction * 100)}%`;
+    
+    let detail = `${label}: ${job.files_done} / ${job.files_total} files`;
+    if (job.bytes_total) {
+        detail += ` • ${formatBytes(job.bytes_done)} of ${formatBytes(job.bytes_total)}`;
+    }
+    if (job.eta !== null && job.eta !== undefined) {
+        detail += ` • ~${Math.ceil(job.eta)}s left`;
+    }
+    text.textContent = detail;
+}
+
+// Hide the progress panel
+function hideProgress() {
+    document.getElementById('jobProgress').style.display = 'none';
+}
+
+// Format a byte count for display
+function formatBytes(bytes) {
+    const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+    let i = 0;
+    while (bytes >= 1024 && i < units.length - 1) {
+        bytes /= 1024;
+        i++;
+    }
+    return `${bytes.toFixed(i === 0 ? 0 : 1)} ${units[i]}`;
 }
 
 // Display results
@@ -321,6 +727,7 @@ function displayResults(data) {
     
     // Hide preview container
     document.getElementById('previewContainer').style.display = 'none';
+    tableView = null;
     
     // Show results container
     container.style.display = 'block';
@@ -354,71 +761,62 @@ function displayResults(data) {
 
 // Download renamed files
 async function downloadFiles() {
-    showLoading('Preparing download...');
-    
     try {
-        const response = await fetch('/download');
+        const job = await runJob('/jobs/download', 'Preparing download');
         
-        if (response.ok) {
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
+        if (job.status === 'done') {
             const a = document.createElement('a');
-            a.href = url;
-            a.download = `renamed_files_${Date.now()}.zip`;
+            a.href = `/jobs/${job.id}/download`;
             document.body.appendChild(a);
             a.click();
-            window.URL.revokeObjectURL(url);
             document.body.removeChild(a);
-            
-            hideLoading();
             showToast('Download started!', 'success');
         } else {
-            hideLoading();
-            showToast('Error downloading files', 'error');
+            showToast(job.error || 'Error downloading files', 'error');
         }
     } catch (error) {
-        hideLoading();
         showToast('Error downloading files: ' + error.message, 'error');
     }
 }
 
-// Download report
-async function downloadReport() {
+// Download report, generated on the server from the stored results
+function downloadReport() {
     if (!previewData) return;
     
-    showLoading('Generating report...');
+    const format = document.getElementById('reportFormat').value;
+    const a = document.createElement('a');
+    a.href = `/download_report?format=${encodeURIComponent(format)}`;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+    
+    showToast('Report download started!', 'success');
+}
+
+// Undo the last rename, putting uploads and outputs back as they were
+async function undoRenames() {
+    if (!confirm('Undo the last rename? Renamed files will be removed and the uploads restored.')) {
+        return;
+    }
+    
+    showLoading('Undoing rename...');
     
     try {
-        const response = await fetch('/download_report', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                results: previewData.results
-            })
-        });
+        const response = await fetch('/undo', { method: 'POST' });
+        const data = await response.json();
         
-        if (response.ok) {
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = `rename_report_${Date.now()}.txt`;
-            document.body.appendChild(a);
-            a.click();
-            window.URL.revokeObjectURL(url);
-            document.body.removeChild(a);
-            
-            hideLoading();
-            showToast('Report downloaded!', 'success');
+        hideLoading();
+        
+        if (data.success) {
+            document.getElementById('resultsContainer').style.display = 'none';
+            showToast('Rename undone', 'success');
+            await previewRenames();
         } else {
-            hideLoading();
-            showToast('Error downloading report', 'error');
+            showToast(data.error, 'error');
         }
     } catch (error) {
         hideLoading();
-        showToast('Error downloading report: ' + error.message, 'error');
+        showToast('Error undoing rename: ' + error.message, 'error');
     }
 }
 
@@ -572,21 +970,14 @@ function generateAIResponse(userMessage) {
     
     // Context-aware responses based on preview data
     if (previewData && previewData.summary.error > 0) {
-        const errorFiles = previewData.results.filter(r => r.status === 'error');
-        
         if (lowerMsg.includes('error') || lowerMsg.includes('fix') || lowerMsg.includes('why') || lowerMsg.includes('wrong')) {
             const errorTypes = {
-                notFound: 0,
-                duplicate: 0,
-                exists: 0
+                notFound: previewData.summary.not_found || 0,
+                ambiguous: previewData.summary.ambiguous || 0,
+                duplicate: previewData.summary.auto_renamed || 0,
+                exists: previewData.summary.target_exists || 0
             };
             
-            errorFiles.forEach(f => {
-                if (f.notes.includes('not found')) errorTypes.notFound++;
-                if (f.notes.includes('Duplicate')) errorTypes.duplicate++;
-                if (f.notes.includes('already exists')) errorTypes.exists++;
-            });
-            
             response = "I can help you fix these errors! Here's what I found:\n\n";
             
             if (errorTypes.notFound > 0) {
@@ -595,7 +986,15 @@ function generateAIResponse(userMessage) {
                 response += "How to fix:\n";
                 response += "• Check spelling and capitalization (case-sensitive)\n";
                 response += "• Verify file extensions match (.pdf, .jpg, etc.)\n";
-                response += "• Make sure you uploaded all files from Column A\n\n";
+                response += "• Make sure you uploaded all files from Column A\n";
+                response += "• Hover a row's notes to see similarly named uploads\n\n";
+            }
+            
+            if (errorTypes.ambiguous > 0) {
+                response += `🔀 ${errorTypes.ambiguous} ambiguous source(s):\n`;
+                response += "Several uploaded files share the same name with different extensions.\n\n";
+                response += "How to fix:\n";
+                response += "• Include the file extension in Column A\n\n";
             }
             
             if (errorTypes.duplicate > 0) {
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Session Storage
+Backends holding uploaded and renamed files, addressed by '/'-separated keys
+
+Keys look like '<session_id>/files/report.pdf'. The local backends map them
+onto a directory tree (the same layout as TEMP_FOLDER always had); the S3
+backend maps them onto object keys, so every app instance sees the same
+files. Session state (mapping, plan, manifest, journal) is not stored
+here and stays in the local TEMP_FOLDER, so each session is still served
+by one instance.
+"""
+
+import errno
+import os
+import shutil
+import tempfile
+
+COPY_BUFFER = 1024 * 1024
+FICLONE = 0x40049409  # Linux ioctl that reflinks one file into another (Btrfs, XFS)
+S3_DELETE_BATCH = 1000  # Most keys one DeleteObjects call accepts
+
+
+def _reflink(src_path, dst_path):
+    import fcntl  # Not available on Windows, which then falls back to copying
+
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def clone_file(src_path, dst_path):
+    """Make dst_path share src_path's data without moving any bytes if possible
+
+    Tries a hardlink, then a copy-on-write reflink, then a plain copy. dst_path
+    is replaced atomically, like a rename would.
+    """
+    tmp_path = f'{dst_path}.{os.getpid()}.tmp'
+    try:
+        os.link(src_path, tmp_path)
+    except OSError:
+        try:
+            _reflink(src_path, tmp_path)
+        except (OSError, ImportError):
+            shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, dst_path)
+
+
+class LocalStorage:
+    """Files in a directory on this machine"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def local_path(self, key):
+        """Filesystem path for key; None for backends without one"""
+        return os.path.join(self.root, *key.split('/'))
+
+    def _prepare(self, key):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def save(self, key, stream):
+        """Copy a readable stream to key and return the byte count"""
+        path = self._prepare(key)
+        size = 0
+        with open(path, 'wb') as f:
+            while True:
+                data = stream.read(COPY_BUFFER)
+                if not data:
+                    break
+                f.write(data)
+                size += len(data)
+        return size
+
+    def save_file(self, key, path):
+        """Move a finished local file into storage under key"""
+        os.replace(path, self._prepare(key))
+
+    def size(self, key):
+        """Byte size of key, or None if it does not exist"""
+        try:
+            return os.stat(self.local_path(key)).st_size
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def iter_chunks(self, key, chunk_size=COPY_BUFFER):
+        with open(self.local_path(key), 'rb') as f:
+            yield from iter(lambda: f.read(chunk_size), b'')
+
+    def list(self, prefix):
+        """Return (name, size, mtime_ns) for each file directly under prefix"""
+        try:
+            entries = list(os.scandir(self.local_path(prefix)))
+        except FileNotFoundError:
+            return []
+        listing = []
+        for entry in entries:
+            if entry.is_file():
+                st = entry.stat()
+                listing.append((entry.name, st.st_size, st.st_mtime_ns))
+        return listing
+
+    def move(self, src, dst):
+        """Rename src to dst, copying only when they are on different devices"""
+        src_path = self.local_path(src)
+        dst_path = self._prepare(dst)
+        try:
+            os.rename(src_path, dst_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(src_path, dst_path)
+
+    def link(self, src, dst):
+        """Expose src under dst as well, keeping src in place"""
+        clone_file(self.local_path(src), self._prepare(dst))
+
+    def delete_prefix(self, prefix):
+        shutil.rmtree(self.local_path(prefix), ignore_errors=True)
+
+
+class SharedStorage(LocalStorage):
+    """Files in a directory mounted by every app instance (NFS, SMB, ...)
+
+    Writes land in a temporary file that is flushed and renamed into place,
+    so other instances never observe a partially written upload.
+    """
+
+    def save(self, key, stream):
+        path = self._prepare(key)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.upload-')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    data = stream.read(COPY_BUFFER)
+                    if not data:
+                        break
+                    f.write(data)
+                    size += len(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return size
+
+    def list(self, prefix):
+        return [entry for entry in super().list(prefix) if not entry[0].startswith('.upload-')]
+
+
+class _CountingReader:
+    def __init__(self, stream):
+        self.stream = stream
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.size += len(data)
+        return data
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket (AWS S3, MinIO, Ceph, ...)
+
+    Moves use server-side copies, so renaming never streams file bytes
+    through the app. boto3 is only needed when this backend is used; any
+    client with the same interface (such as one pointed at a local MinIO
+    via endpoint_url) can be passed in instead.
+    """
+
+    def __init__(self, bucket, prefix='', client=None, **client_kwargs):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError('S3 storage requires boto3 (pip install boto3)')
+            client = boto3.client('s3', **client_kwargs)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+
+    def _key(self, key):
+        return f'{self.prefix}/{key}' if self.prefix else key
+
+    def local_path(self, key):
+        return None
+
+    def save(self, key, stream):
+        reader = _CountingReader(stream)
+        self.client.upload_fileobj(reader, self.bucket, self._key(key))
+        return reader.size
+
+    def save_file(self, key, path):
+        self.client.upload_file(path, self.bucket, self._key(key))
+        os.remove(path)
+
+    def size(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))['ContentLength']
+        except self.client.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def iter_chunks(self, key, chunk_size=COPY_BUFFER):
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+        try:
+            yield from iter(lambda: body.read(chunk_size), b'')
+        finally:
+            body.close()
+
+    def list(self, prefix):
+        base = self._key(prefix).rstrip('/') + '/'
+        listing = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=base, Delimiter='/'):
+            for obj in page.get('Contents', []):
+                mtime_ns = int(obj['LastModified'].timestamp() * 1_000_000_000)
+                listing.append((obj['Key'][len(base):], obj['Size'], mtime_ns))
+        return listing
+
+    def move(self, src, dst):
+        # Managed copy falls back to multipart UploadPartCopy for large
+        # objects; either way the bytes stay inside the object store
+        source = {'Bucket': self.bucket, 'Key': self._key(src)}
+        self.client.copy(source, self.bucket, self._key(dst))
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(src))
+
+    def link(self, src, dst):
+        # Object stores have no links; a server-side copy is the cheap equivalent
+        source = {'Bucket': self.bucket, 'Key': self._key(src)}
+        self.client.copy(source, self.bucket, self._key(dst))
+
+    def delete_prefix(self, prefix):
+        base = self._key(prefix).rstrip('/') + '/'
+        paginator = self.client.get_paginator('list_objects_v2')
+        keys = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=base):
+            keys.extend({'Key': obj['Key']} for obj in page.get('Contents', []))
+        for start in range(0, len(keys), S3_DELETE_BATCH):
+            self.client.delete_objects(
+                Bucket=self.bucket, Delete={'Objects': keys[start:start + S3_DELETE_BATCH]})
+
+
+def create_storage(config):
+    """Build the backend named by config['STORAGE_BACKEND']"""
+    backend = config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(config['TEMP_FOLDER'])
+    if backend == 'shared':
+        return SharedStorage(config.get('STORAGE_ROOT') or config['TEMP_FOLDER'])
+    if backend == 's3':
+        client_kwargs = {}
+        if config.get('S3_ENDPOINT_URL'):
+            client_kwargs['endpoint_url'] = config['S3_ENDPOINT_URL']
+        return S3Storage(config['S3_BUCKET'], config.get('S3_PREFIX', ''), **client_kwargs)
+    raise ValueError(f'Unknown storage backend: {backend}')
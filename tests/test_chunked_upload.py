@@ -0,0 +1,73 @@
+import hashlib
+import io
+
+import pytest
+
+import chunked_upload
+from chunked_upload import ChunkedUpload, RunningHashes
+
+DATA = bytes(range(256)) * 40  # 10240 bytes, in 1024-byte chunks
+CHUNK = 1024
+
+
+def upload_in_order(tmp_path, hashes, offsets):
+    upload = ChunkedUpload.create(str(tmp_path), 'a.pdf', len(DATA), chunk_size=CHUNK, hashes=hashes)
+    for offset in offsets:
+        upload.write_chunk(offset, io.BytesIO(DATA[offset:offset + CHUNK]), hashes)
+    return upload
+
+
+@pytest.fixture
+def read_back(monkeypatch):
+    """Bytes finish reads back from disk per call"""
+    reads = []
+    hash_file = chunked_upload.hash_file
+
+    def recording(path, start=0, digest=None):
+        reads.append(len(DATA) - start)
+        return hash_file(path, start, digest)
+    monkeypatch.setattr(chunked_upload, 'hash_file', recording)
+    return reads
+
+
+@pytest.mark.parametrize('offsets', [
+    list(range(0, len(DATA), CHUNK)),
+    list(range(0, len(DATA), CHUNK))[::-1],
+    [1024, 0, 3072, 2048, 5120, 4096, 7168, 6144, 9216, 8192],
+])
+def test_hash_is_taken_while_chunks_are_written(tmp_path, read_back, offsets):
+    hashes = RunningHashes()
+    upload = upload_in_order(tmp_path, hashes, offsets)
+    assert hashes.finish(upload.upload_id, upload.part_path) == hashlib.sha256(DATA).hexdigest()
+    assert read_back == [0]
+    assert hashes.pending_bytes == 0
+
+
+def test_chunks_over_the_memory_limit_are_read_back(tmp_path, read_back):
+    hashes = RunningHashes(pending_limit=CHUNK)
+    offsets = list(range(0, len(DATA), CHUNK))[::-1]
+    upload = upload_in_order(tmp_path, hashes, offsets)
+    assert hashes.finish(upload.upload_id, upload.part_path) == hashlib.sha256(DATA).hexdigest()
+    assert hashes.pending_bytes == 0
+
+
+def test_rewritten_chunk_falls_back_to_reading_the_file(tmp_path, read_back):
+    hashes = RunningHashes()
+    upload = upload_in_order(tmp_path, hashes, [0, 1024])
+    upload.write_chunk(0, io.BytesIO(b'x' * CHUNK), hashes)
+    for offset in range(2048, len(DATA), CHUNK):
+        upload.write_chunk(offset, io.BytesIO(DATA[offset:offset + CHUNK]), hashes)
+    expected = hashlib.sha256(b'x' * CHUNK + DATA[CHUNK:]).hexdigest()
+    assert hashes.finish(upload.upload_id, upload.part_path) == expected
+    assert read_back == [len(DATA)]
+
+
+def test_failed_chunk_can_be_retried(tmp_path, read_back):
+    hashes = RunningHashes()
+    upload = ChunkedUpload.create(str(tmp_path), 'a.pdf', len(DATA), chunk_size=CHUNK, hashes=hashes)
+    with pytest.raises(ValueError):
+        upload.write_chunk(0, io.BytesIO(DATA[:100]), hashes)
+    for offset in range(0, len(DATA), CHUNK):
+        upload.write_chunk(offset, io.BytesIO(DATA[offset:offset + CHUNK]), hashes)
+    assert hashes.finish(upload.upload_id, upload.part_path) == hashlib.sha256(DATA).hexdigest()
+    assert read_back == [0]
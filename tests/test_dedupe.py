@@ -0,0 +1,102 @@
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from preview_model import PreviewModel
+from rename_plan import PLAN_COLUMNS, build_plan, dedupe_new_names, name_key, suffix_group
+
+
+def dedupe(names, existing=()):
+    return dedupe_new_names(pd.Series(names, dtype=object), existing).tolist()
+
+
+def random_names(rng, count, stems):
+    """Names over a few stems, with case variants and names already suffixed"""
+    names = []
+    for _ in range(count):
+        stem = f'WD_{rng.randrange(stems)}'
+        roll = rng.random()
+        if roll < 0.25:
+            stem = stem.lower()
+        elif roll < 0.5:
+            stem = f'{stem} ({rng.randint(1, 3)})'
+        names.append(stem + rng.choice(['.pdf', '.PDF', '']))
+    return names
+
+
+def check(original, existing, unique):
+    """Assert unique is a valid dedupe of original next to existing files"""
+    keys = [name_key(name) for name in unique]
+    assert len(set(keys)) == len(keys), 'two outputs share a name'
+    existing_keys = {name_key(name) for name in existing}
+    taken = existing_keys | {name_key(name) for name in original}
+    seen = set()
+    next_suffix = {}
+    for before, after in zip(original, unique):
+        key = name_key(before)
+        if key not in seen:
+            assert after == before, f'first {before!r} was renamed to {after!r}'
+            seen.add(key)
+            continue
+        assert suffix_group(name_key(after)) == key, f'{after!r} is not a suffixed {before!r}'
+        assert name_key(after) not in existing_keys, f'{after!r} takes an existing file'
+        # Every lower suffix not used before for this name was taken
+        base, ext = os.path.splitext(before)
+        k = int(after[len(base) + 2:len(after) - len(ext) - 1])
+        for j in range(next_suffix.get(key, 1), k):
+            assert name_key(f'{base} ({j}){ext}') in taken, f'{after!r} skipped free ({j})'
+        next_suffix[key] = k + 1
+        taken.add(name_key(after))
+
+
+def test_names_differing_in_case_are_repeats():
+    assert dedupe(['Report.pdf', 'report.PDF', 'REPORT.pdf']) == ['Report.pdf', 'report (1).PDF', 'REPORT (2).pdf']
+
+
+def test_suffix_skips_other_rows_and_existing_files():
+    names = ['a.pdf', 'a.pdf', 'A (1).pdf', 'a.pdf']
+    assert dedupe(names, existing=['a (2).PDF']) == ['a.pdf', 'a (3).pdf', 'A (1).pdf', 'a (4).pdf']
+
+
+def test_names_without_extension_and_dotfiles():
+    assert dedupe(['notes', 'Notes', '.env', '.ENV']) == ['notes', 'Notes (1)', '.env', '.ENV (1)']
+
+
+def test_unique_names_are_unchanged():
+    assert dedupe(['a.pdf', 'b.pdf'], existing=['a.pdf']) == ['a.pdf', 'b.pdf']
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_colliding_mappings(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        stems = rng.randint(1, 6)
+        original = random_names(rng, rng.randint(1, 40), stems)
+        existing = random_names(rng, rng.randint(0, 10), stems)
+        check(original, existing, dedupe(original, existing))
+
+
+def test_target_differing_in_case_from_a_staying_upload_conflicts():
+    mapping = pd.DataFrame({'current': ['a.pdf', 'b.pdf'], 'new': ['KEEP.pdf', 'B.pdf']})
+    plan = build_plan(mapping, {'a.pdf', 'b.pdf', 'keep.pdf'})
+    assert plan['status'].tolist() == ['error', 'ready']  # b.pdf is renamed away, keep.pdf stays
+
+
+def test_incremental_update_matches_rebuild():
+    # Padded so the edits stay under the share that forces a full rebuild
+    new = ['x.pdf', 'X.pdf', 'y.pdf', 'x (1).pdf', 'z.pdf'] + [f'other_{i}.pdf' for i in range(30)]
+    mapping = pd.DataFrame({'current': [f'f{i}.pdf' for i in range(len(new))], 'new': new})
+    files = set(mapping['current'])
+    model = PreviewModel(build_plan(mapping, files), [(name, 1, 0) for name in files], (0, 0))
+
+    # An upload and an edited row each take a suffix of the x.pdf group
+    model.note_files(added=[('x (2).PDF', 1, 0)])
+    files.add('x (2).PDF')
+    mapping.loc[4, 'new'] = 'X (3).pdf'
+    assert model.update(mapping, (1, 1)) is not None
+
+    expected = build_plan(mapping, files)
+    assert model.plan[PLAN_COLUMNS].astype(object).equals(expected[PLAN_COLUMNS].astype(object))
+    assert model.plan['new'].tolist()[:2] == ['x.pdf', 'X (4).pdf']
@@ -0,0 +1,29 @@
+import hashlib
+import io
+
+
+def known(client, filename, data):
+    item = {'filename': filename, 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+    return client.post('/uploads/known', json={'files': [item]}).get_json()
+
+
+def test_known_uploads_only_match_the_sessions_own_content(app_module):
+    data = b'private document'
+    owner = app_module.app.test_client()
+    owner.get('/')
+    owner.post('/upload_files', data={'files[]': [(io.BytesIO(data), 'a.pdf')]})
+
+    other = app_module.app.test_client()
+    other.get('/')
+    assert known(other, 'b.pdf', data)['known'] == []
+    assert known(owner, 'copy.pdf', data)['known'] == ['copy.pdf']
+
+
+def test_known_upload_of_a_removed_file(app_module, client):
+    data = b'uploaded, removed and added again'
+    client.get('/')
+    client.post('/upload_files', data={'files[]': [(io.BytesIO(data), 'a.pdf')]})
+    client.delete('/files')
+    result = known(client, 'a.pdf', data)
+    assert result['known'] == ['a.pdf']
+    assert result['total'] == 1
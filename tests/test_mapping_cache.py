@@ -0,0 +1,42 @@
+import os
+import time
+
+from mapping_cache import MappingCache
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_hit_leaves_linked_mapping_mtime_alone(tmp_path):
+    cache = MappingCache(str(tmp_path / 'cache'), max_bytes=1 << 20)
+    first = str(tmp_path / 'first.pkl')
+    write(first, b'mapping')
+    key = cache.key('abc', 'csv')
+    cache.put(key, first, {'rows': 1})
+    before = os.stat(first).st_mtime_ns
+
+    time.sleep(0.01)
+    second = str(tmp_path / 'second.pkl')
+    assert cache.get(key, second) == {'rows': 1}
+    assert os.stat(first).st_mtime_ns == before
+    assert os.stat(second).st_mtime_ns == before
+
+
+def test_evicts_least_recently_hit(tmp_path):
+    cache = MappingCache(str(tmp_path / 'cache'), max_bytes=25)
+    source = str(tmp_path / 'source.pkl')
+    for name in ('old', 'new'):
+        write(source, b'x' * 10)
+        cache.put(cache.key(name, 'csv'), source, {})
+        os.remove(source)
+        time.sleep(0.01)
+    # A hit makes the older entry the most recently used one
+    assert cache.get(cache.key('old', 'csv'), str(tmp_path / 'hit.pkl')) == {}
+    time.sleep(0.01)
+    write(source, b'x' * 10)
+    cache.put(cache.key('third', 'csv'), source, {})
+
+    assert cache.get(cache.key('new', 'csv'), str(tmp_path / 'a.pkl')) is None
+    assert cache.get(cache.key('old', 'csv'), str(tmp_path / 'b.pkl')) == {}
@@ -0,0 +1,15 @@
+import rename_cli
+
+
+def test_case_only_clash_with_an_existing_output_fails_the_row(tmp_path):
+    directory = tmp_path / 'files'
+    (directory / 'Active').mkdir(parents=True)
+    (directory / 'Active' / 'Report.pdf').write_bytes(b'kept')
+    (directory / 'x.pdf').write_bytes(b'new')
+    mapping = tmp_path / 'mapping.csv'
+    mapping.write_text('Current,New,Category\nx.pdf,report.pdf,A\n')
+
+    assert rename_cli.main([str(mapping), str(directory)]) == 1
+    assert sorted(path.name for path in (directory / 'Active').iterdir()) == ['Report.pdf']
+    assert (directory / 'Active' / 'Report.pdf').read_bytes() == b'kept'
+    assert (directory / 'x.pdf').read_bytes() == b'new'
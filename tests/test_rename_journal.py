@@ -0,0 +1,73 @@
+import io
+import os
+import secrets
+
+from rename_journal import RenameJournal
+
+
+def test_lock_is_exclusive(tmp_path):
+    journal = RenameJournal.for_session(str(tmp_path))
+    with journal.locked() as held:
+        assert held
+        with RenameJournal.for_session(str(tmp_path)).locked(blocking=False) as other:
+            assert not other
+    with journal.locked(blocking=False) as held:
+        assert held
+
+
+def test_recovery_skips_locked_journal(app_module):
+    session_id = secrets.token_hex(16)
+    folder = os.path.join(app_module.app.config['TEMP_FOLDER'], session_id)
+    os.makedirs(folder)
+    output = app_module.session_key(session_id, 'Active', 'new.pdf')
+    app_module.storage.save(output, io.BytesIO(b'data'))
+    journal = RenameJournal.for_session(folder)
+    journal.begin('e1', 'link')
+    journal.append([{'op': 'links', 'keys': [output]}])
+
+    # An execute still running in another process holds the lock
+    with RenameJournal.for_session(folder).locked():
+        app_module.recover_executes()
+        assert journal.state()[2] == 'links'
+        assert app_module.storage.size(output) == 4
+
+    # Once its owner is gone, the execute is rolled back
+    app_module.recover_executes()
+    assert journal.state()[2] == 'rolled_back'
+    assert app_module.storage.size(output) is None
+
+
+def execute(client, mapping, files):
+    client.post('/upload_excel', data={'excel': (io.BytesIO(mapping), 'mapping.csv')})
+    client.post('/upload_files', data={'files[]': [(io.BytesIO(data), name) for name, data in files]})
+    assert client.post('/preview').get_json()['success']
+    result = client.post('/execute?mode=move').get_json()
+    assert result['success'], result
+
+
+def test_undo_restores_an_output_overwritten_by_a_case_only_variant(app_module, client):
+    client.get('/')
+    execute(client, b'Current,New,Category\nx.pdf,Report.pdf,A\n', [('x.pdf', b'first')])
+    execute(client, b'Current,New,Category\ny.pdf,report.pdf,A\n', [('y.pdf', b'second')])
+    with client.session_transaction() as session:
+        session_id = session['session_id']
+    active = app_module.session_key(session_id, 'Active')
+    assert [name for name, _, _ in app_module.storage.list(active)] == ['report.pdf']
+
+    assert client.post('/undo').get_json()['success']
+    assert [name for name, _, _ in app_module.storage.list(active)] == ['Report.pdf']
+    assert b''.join(app_module.storage.iter_chunks(f'{active}/Report.pdf')) == b'first'
+
+
+def test_previous_execute_is_not_undoable_once_its_copies_are_purged(app_module, client, monkeypatch):
+    client.get('/')
+    execute(client, b'Current,New,Category\nx.pdf,kept.pdf,A\n', [('x.pdf', b'first')])
+    with client.session_transaction() as session:
+        folder = os.path.join(app_module.app.config['TEMP_FOLDER'], session['session_id'])
+
+    def purge_fails(prefix):
+        raise OSError('crash while purging undo copies')
+    monkeypatch.setattr(app_module.storage, 'delete_prefix', purge_fails)
+    client.post('/upload_files', data={'files[]': [(io.BytesIO(b'second'), 'y.pdf')]})
+    assert not client.post('/execute?mode=move').get_json()['success']
+    assert RenameJournal.for_session(folder).state()[2] == 'begin'
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from rename_plan import build_plan, mapping_columns, match_sources
+
+
+def mapping(current, new=None):
+    return pd.DataFrame({'current': current, 'new': new or [f'new_{i}.pdf' for i in range(len(current))]})
+
+
+def test_unmatched_row_with_uploads_sharing_a_stem():
+    # mapping_columns gives pandas 3 'str' columns, which cannot hold NaN
+    plan = build_plan(mapping(['zzz.pdf']), {'scan.pdf', 'scan.txt'})
+    row = plan.iloc[0]
+    assert row['status'] == 'error'
+    assert pd.isna(row['matched_file'])
+    assert row['notes'] == 'Source file not found in uploads'
+
+
+def test_stem_shared_by_uploads_is_ambiguous():
+    plan = build_plan(mapping(['report', 'zzz.pdf']), {'report.pdf', 'report.docx'})
+    assert plan['notes'].tolist() == [
+        'Ambiguous source: several uploaded files share this name',
+        'Source file not found in uploads',
+    ]
+
+
+def test_match_tiers():
+    current, _, _ = mapping_columns(mapping(['a.pdf', 'B.PDF', 'Café Menu.pdf', 'missing.pdf']))
+    matched, ambiguous = match_sources(current, {'a.pdf', 'b.pdf', 'cafe_menu.pdf'})
+    assert matched.tolist()[:3] == ['a.pdf', 'b.pdf', 'cafe_menu.pdf']
+    assert pd.isna(matched.iloc[3])
+    assert not ambiguous.any()
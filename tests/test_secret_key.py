@@ -0,0 +1,15 @@
+import os
+
+
+def test_local_secret_key_is_created_once(app_module, tmp_path):
+    path = str(tmp_path / 'secret_key')
+    key = app_module.local_secret_key(path)
+    assert len(key) == 64
+    assert app_module.local_secret_key(path) == key
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.listdir(tmp_path) == ['secret_key']
+
+
+def test_app_key_is_shared_through_temp_folder(app_module):
+    path = os.path.join(app_module.app.config['TEMP_FOLDER'], app_module.SECRET_KEY_FILENAME)
+    assert app_module.app.secret_key == app_module.local_secret_key(path)
@@ -0,0 +1,18 @@
+import io
+import zipfile
+
+
+def test_virtual_download_renames_uncategorized_files(client):
+    client.get('/')
+    mapping = b'Current,New,Category\na.pdf,active.pdf,A\nb.pdf,renamed.pdf,\n'
+    client.post('/upload_excel', data={'excel': (io.BytesIO(mapping), 'mapping.csv')})
+    client.post('/upload_files', data={'files[]': [(io.BytesIO(b'first'), 'a.pdf'),
+                                                   (io.BytesIO(b'second'), 'b.pdf')]})
+    assert client.post('/preview').get_json()['success']
+    result = client.post('/execute?mode=virtual').get_json()
+    assert result['success'], result
+
+    archive = zipfile.ZipFile(io.BytesIO(client.get('/download').data))
+    names = [name for name in archive.namelist() if not name.startswith('rename_backup_')]
+    assert sorted(names) == ['Active/active.pdf', 'renamed.pdf']
+    assert archive.read('renamed.pdf') == b'second'
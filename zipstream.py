@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Streaming ZIP Writer
+Builds ZIP archives incrementally so downloads start before compression finishes
+"""
+
+import itertools
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+CHUNK_SIZE = 1024 * 1024  # 1MB read size per file chunk
+
+# Entries whose size is near the 4GB limit get ZIP64 headers up front, since the
+# compressed size is only known after the data has been streamed out
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_THRESHOLD = ZIP64_LIMIT - (16 * 1024 * 1024)
+
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+DATA_DESCRIPTOR = struct.Struct('<4sIII')
+DATA_DESCRIPTOR64 = struct.Struct('<4sIQQ')
+CENTRAL_HEADER = struct.Struct('<4sHHHHHHIIIHHHHHII')
+END_RECORD = struct.Struct('<4sHHHHIIH')
+END_RECORD64 = struct.Struct('<4sQHHIIQQQQ')
+END_LOCATOR64 = struct.Struct('<4sIQI')
+
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+
+# Formats that are already compressed; deflating them costs CPU for ~0% gain
+STORED_EXTENSIONS = frozenset({
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.tif', '.tiff',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.epub',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.zst', '.br',
+    '.mp3', '.m4a', '.aac', '.ogg', '.flac', '.mp4', '.m4v', '.mov', '.avi', '.mkv', '.webm',
+})
+SAMPLE_SIZE = 64 * 1024  # Bytes of the first block test-compressed per entry
+MIN_SAVING = 0.05  # Store entries whose sample shrinks by less than this
+
+# Entries up to this size are compressed whole on worker threads; bigger
+# ones are streamed on the writer thread so memory stays bounded
+PARALLEL_MAX_ENTRY = 4 * 1024 * 1024
+
+
+def _dos_datetime(timestamp):
+    """Convert a POSIX timestamp to the (time, date) pair stored in ZIP headers"""
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (0 << 9) | (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class CompressionPolicy:
+    """Decide per entry whether to deflate or store
+
+    Known-compressed extensions are always stored. Other entries have their
+    first block test-compressed at the fastest level and are stored when it
+    barely shrinks. level 0 stores everything.
+    """
+
+    def __init__(self, level=6, stored_extensions=STORED_EXTENSIONS,
+                 sample_size=SAMPLE_SIZE, min_saving=MIN_SAVING):
+        self.level = level
+        self.stored_extensions = frozenset(ext.lower() for ext in stored_extensions)
+        self.sample_size = sample_size
+        self.min_saving = min_saving
+
+    def method_for(self, arcname, first_block=b''):
+        if self.level == 0:
+            return ZIP_STORED
+        if os.path.splitext(arcname)[1].lower() in self.stored_extensions:
+            return ZIP_STORED
+        if self.sample_size and first_block:
+            sample = first_block[:self.sample_size]
+            if len(zlib.compress(sample, 1)) > len(sample) * (1 - self.min_saving):
+                return ZIP_STORED
+        return ZIP_DEFLATED
+
+
+def compress_entry(chunks, method, level=6):
+    """Compress a whole entry in memory; returns (data, crc, file_size)"""
+    crc = 0
+    file_size = 0
+    parts = []
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if method == ZIP_DEFLATED else None
+    for chunk in chunks:
+        file_size += len(chunk)
+        crc = zlib.crc32(chunk, crc)
+        parts.append(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        parts.append(compressor.flush())
+    return b''.join(parts), crc, file_size
+
+
+class ZipStream:
+    """Write a ZIP archive as a sequence of byte chunks
+
+    Each entry is written with a data descriptor, so nothing has to be seeked
+    back and rewritten. Only the per-entry metadata for the central directory
+    is kept in memory. With a CompressionPolicy, each entry is deflated or
+    stored as the policy decides and the policy's level is used.
+    """
+
+    def __init__(self, compression=ZIP_DEFLATED, level=6, chunk_size=CHUNK_SIZE, policy=None):
+        self.compression = compression
+        self.level = policy.level if policy else level
+        self.chunk_size = chunk_size
+        self.policy = policy
+        self._entries = []
+        self._offset = 0
+
+    def _emit(self, data):
+        self._offset += len(data)
+        return data
+
+    def add_file(self, path, arcname):
+        """Yield the archive bytes for a file on disk"""
+        st = os.stat(path)
+        with open(path, 'rb') as f:
+            chunks = iter(lambda: f.read(self.chunk_size), b'')
+            yield from self._write_entry(arcname, chunks, st.st_mtime, st.st_size)
+
+    def add_chunks(self, chunks, arcname, mtime=None, size_hint=0):
+        """Yield the archive bytes for data read from any iterable of chunks
+
+        size_hint is the expected size; entries near 4GB need it to get ZIP64
+        headers, since those have to be chosen before any data is written.
+        """
+        yield from self._write_entry(arcname, chunks, time.time() if mtime is None else mtime, size_hint)
+
+    def add_bytes(self, data, arcname):
+        """Yield the archive bytes for an in-memory payload"""
+        yield from self._write_entry(arcname, [data], time.time(), len(data))
+
+    def add_compressed(self, arcname, data, method, crc, file_size, mtime=None):
+        """Yield the archive bytes for an entry already run through compress_entry"""
+        entry = self._new_entry(arcname, mtime, max(file_size, len(data)), method)
+        yield self._emit(self._local_header(entry))
+        yield self._emit(data)
+        yield from self._end_entry(entry, crc, len(data), file_size)
+
+    def _new_entry(self, arcname, mtime, size_hint, method):
+        zip64 = size_hint >= ZIP64_THRESHOLD
+        dos_time, dos_date = _dos_datetime(time.time() if mtime is None else mtime)
+        return {
+            'arcname': arcname,
+            'name': arcname.encode('utf-8'),
+            'zip64': zip64,
+            'version': 45 if zip64 else 20,
+            'flags': FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            'method': method,
+            'time': dos_time,
+            'date': dos_date,
+            'offset': self._offset,
+        }
+
+    def _local_header(self, entry):
+        extra = b''
+        placeholder = 0
+        if entry['zip64']:
+            extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0)
+            placeholder = ZIP64_LIMIT
+        return LOCAL_HEADER.pack(
+            b'PK\x03\x04', entry['version'], entry['flags'], entry['method'],
+            entry['time'], entry['date'], 0, placeholder, placeholder,
+            len(entry['name']), len(extra)
+        ) + entry['name'] + extra
+
+    def _end_entry(self, entry, crc, compress_size, file_size):
+        if not entry['zip64'] and max(file_size, compress_size) >= ZIP64_LIMIT:
+            raise RuntimeError(f"{entry['arcname']} grew past the ZIP64 limit while streaming")
+
+        if entry['zip64']:
+            yield self._emit(DATA_DESCRIPTOR64.pack(b'PK\x07\x08', crc, compress_size, file_size))
+        else:
+            yield self._emit(DATA_DESCRIPTOR.pack(b'PK\x07\x08', crc, compress_size, file_size))
+
+        self._entries.append({
+            'name': entry['name'],
+            'version': entry['version'],
+            'flags': entry['flags'],
+            'method': entry['method'],
+            'time': entry['time'],
+            'date': entry['date'],
+            'crc': crc,
+            'compress_size': compress_size,
+            'file_size': file_size,
+            'offset': entry['offset'],
+        })
+
+    def _write_entry(self, arcname, chunks, mtime, size_hint):
+        method = self.compression
+        if self.policy:
+            # Peek at the first block so the policy can sample it
+            chunks = iter(chunks)
+            first = next(chunks, b'')
+            method = self.policy.method_for(arcname, first)
+            chunks = itertools.chain([first], chunks)
+
+        entry = self._new_entry(arcname, mtime, size_hint, method)
+        yield self._emit(self._local_header(entry))
+
+        crc = 0
+        file_size = 0
+        compress_size = 0
+        compressor = None
+        if method == ZIP_DEFLATED:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+
+        for chunk in chunks:
+            file_size += len(chunk)
+            crc = zlib.crc32(chunk, crc)
+            out = compressor.compress(chunk) if compressor else chunk
+            if out:
+                compress_size += len(out)
+                yield self._emit(out)
+
+        if compressor:
+            out = compressor.flush()
+            compress_size += len(out)
+            yield self._emit(out)
+
+        yield from self._end_entry(entry, crc, compress_size, file_size)
+
+    def finish(self):
+        """Yield the central directory and end-of-archive records"""
+        cd_offset = self._offset
+        for entry in self._entries:
+            yield self._emit(self._central_header(entry))
+        cd_size = self._offset - cd_offset
+        count = len(self._entries)
+
+        if count >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+            end64_offset = self._offset
+            yield self._emit(END_RECORD64.pack(
+                b'PK\x06\x06', END_RECORD64.size - 12, 45, 45, 0, 0,
+                count, count, cd_size, cd_offset
+            ))
+            yield self._emit(END_LOCATOR64.pack(b'PK\x06\x07', 0, end64_offset, 1))
+
+        yield self._emit(END_RECORD.pack(
+            b'PK\x05\x06', 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(cd_size, ZIP64_LIMIT), min(cd_offset, ZIP64_LIMIT), 0
+        ))
+
+    def _central_header(self, entry):
+        # ZIP64 extra field carries only the values that overflow 32 bits, in spec order
+        zip64_fields = []
+        file_size = entry['file_size']
+        compress_size = entry['compress_size']
+        offset = entry['offset']
+        if file_size >= ZIP64_LIMIT:
+            zip64_fields.append(file_size)
+            file_size = ZIP64_LIMIT
+        if compress_size >= ZIP64_LIMIT:
+            zip64_fields.append(compress_size)
+            compress_size = ZIP64_LIMIT
+        if offset >= ZIP64_LIMIT:
+            zip64_fields.append(offset)
+            offset = ZIP64_LIMIT
+
+        extra = b''
+        version = entry['version']
+        if zip64_fields:
+            extra = struct.pack(f'<HH{len(zip64_fields)}Q', 0x0001, 8 * len(zip64_fields), *zip64_fields)
+            version = 45
+
+        return CENTRAL_HEADER.pack(
+            b'PK\x01\x02', version | (3 << 8), version, entry['flags'], entry['method'],
+            entry['time'], entry['date'], entry['crc'], compress_size, file_size,
+            len(entry['name']), len(extra), 0, 0, 0, (0o100644 << 16), offset
+        ) + entry['name'] + extra
+
+
+def stream_zip(entries, compression=ZIP_DEFLATED, level=6):
+    """Yield a complete ZIP archive for (path, arcname) pairs"""
+    zs = ZipStream(compression=compression, level=level)
+    for path, arcname in entries:
+        yield from zs.add_file(path, arcname)
+    yield from zs.finish()
+
+
+def stream_zip_parallel(entries, policy=None, workers=None, max_entry=PARALLEL_MAX_ENTRY,
+                        on_entry=None):
+    """Yield a ZIP archive, compressing independent entries on several cores
+
+    entries are (open_chunks, arcname, size, mtime) tuples, where open_chunks()
+    returns an iterable of the entry's bytes. Entries up to max_entry bytes
+    are read and compressed whole on a thread pool (zlib releases the GIL),
+    a bounded window ahead of the writer; larger ones are streamed in place.
+    Output order always follows entries. on_entry(size) is called after each
+    entry has been written.
+    """
+    policy = policy or CompressionPolicy()
+    workers = workers or os.cpu_count() or 1
+    zs = ZipStream(policy=policy)
+
+    def compress(open_chunks, arcname):
+        chunks = iter(open_chunks())
+        first = next(chunks, b'')
+        method = policy.method_for(arcname, first)
+        return (method,) + compress_entry(itertools.chain([first], chunks), method, policy.level)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        entries = iter(entries)
+
+        def fill():
+            while len(window) < workers * 2:
+                entry = next(entries, None)
+                if entry is None:
+                    return
+                open_chunks, arcname, size, _ = entry
+                future = pool.submit(compress, open_chunks, arcname) if size <= max_entry else None
+                window.append((entry, future))
+
+        fill()
+        while window:
+            (open_chunks, arcname, size, mtime), future = window.popleft()
+            fill()
+            if future is None:
+                yield from zs.add_chunks(open_chunks(), arcname, mtime, size)
+            else:
+                method, data, crc, file_size = future.result()
+                yield from zs.add_compressed(arcname, data, method, crc, file_size, mtime)
+            if on_entry:
+                on_entry(size)
+
+    yield from zs.finish()